@@ -0,0 +1,529 @@
+"""
+Async-engine versions of the messaging, conversation, agent-listing and
+profile endpoints.
+
+Enabled with DATABASE_ASYNC=true: `install_async_routes` swaps these handlers
+in for their threadpool counterparts in `app.main`, so the request/response
+contracts stay identical while the handlers await the database instead of
+occupying an AnyIO worker thread.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi.routing import APIRoute
+from sqlalchemy import Integer, func, select
+from sqlalchemy import cast as sql_cast
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import (
+    Principal,
+    get_current_active_principal_async,
+    get_current_active_user_async,
+)
+from app.database import get_async_db
+from app import persistence
+from app.models import (
+    User,
+    UserProfile,
+    TravelAgentProfile,
+    Conversation,
+    Message,
+    UserRole,
+)
+from app.schemas import (
+    UserProfileUpdate,
+    UserProfileResponse,
+    TravelAgentListItem,
+    ConversationCreate,
+    ConversationResponse,
+    MessageCreate,
+    MessageResponse,
+)
+
+router = APIRouter()
+
+
+def _agent_names(onboarding: Optional[dict], fallback_name: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return (business_name, full_name, primary_name) for an agent."""
+    onboarding = onboarding or {}
+    business_name = onboarding.get("business_name")
+    full_name = onboarding.get("full_name") or fallback_name
+    # Primary name is business_name if available, otherwise full_name
+    return business_name, full_name, business_name or full_name
+
+
+def _agent_list_item(profile: TravelAgentProfile, user: User) -> TravelAgentListItem:
+    onboarding = profile.onboarding_data or {}
+    business_name, full_name, primary_name = _agent_names(onboarding, user.name)
+    return TravelAgentListItem(
+        id=profile.id,
+        user_id=user.id,
+        name=primary_name,
+        owner_name=full_name if business_name else None,  # Only show if business_name exists
+        business_name=business_name,
+        email=user.email,
+        profile_photo_url=onboarding.get("profile_photo_url"),
+        country_of_operation=onboarding.get("country_of_operation"),
+        cities_covered=onboarding.get("cities_covered", []),
+        years_of_experience=onboarding.get("years_of_experience"),
+        specializations=onboarding.get("specializations", []),
+        supported_destination_countries=onboarding.get("supported_destination_countries", []),
+        languages_spoken=onboarding.get("languages_spoken", []),
+        availability_status=onboarding.get("availability_status", "unavailable"),
+        is_verified=profile.is_verified,
+        bio=onboarding.get("bio")
+    )
+
+
+async def _get_agent_profile(db: AsyncSession, agent_id: int) -> Optional[TravelAgentProfile]:
+    result = await db.execute(
+        select(TravelAgentProfile).where(TravelAgentProfile.user_id == agent_id)
+    )
+    return result.scalars().first()
+
+
+async def _get_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    result = await db.execute(select(User).where(User.id == user_id))
+    return result.scalars().first()
+
+
+async def _last_message_and_unread(
+    db: AsyncSession, conversation_id: int, viewer_id: int
+) -> Tuple[Optional[Message], int]:
+    last_message = (await db.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc())
+        .limit(1)
+    )).scalars().first()
+    unread_count = (await db.execute(
+        select(func.count(Message.id)).where(
+            Message.conversation_id == conversation_id,
+            Message.sender_id != viewer_id,
+            Message.is_read == False
+        )
+    )).scalar_one()
+    return last_message, unread_count
+
+
+async def _get_accessible_conversation(
+    db: AsyncSession, conversation_id: int, current_user: Principal
+) -> Conversation:
+    conversation = (await db.execute(
+        select(Conversation).where(Conversation.id == conversation_id)
+    )).scalars().first()
+
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+
+    # Verify user is part of conversation
+    if current_user.role == UserRole.USER and conversation.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    elif current_user.role == UserRole.TRAVEL_AGENT and conversation.agent_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    return conversation
+
+
+# User Profile endpoints
+@router.get("/profile", response_model=UserProfileResponse)
+async def get_user_profile(
+    current_user: Principal = Depends(get_current_active_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get user profile with onboarding data"""
+    profile = (await db.execute(
+        select(UserProfile).where(UserProfile.user_id == current_user.id)
+    )).scalars().first()
+    if not profile:
+        # Create empty profile if it doesn't exist
+        profile = UserProfile(user_id=current_user.id, onboarding_data=None)
+        db.add(profile)
+        await db.commit()
+        await db.refresh(profile)
+    return profile
+
+
+@router.put("/profile", response_model=UserProfileResponse)
+async def update_user_profile(
+    profile_data: UserProfileUpdate,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update user profile onboarding data"""
+    profile = await db.run_sync(
+        persistence.upsert_onboarding_profile, UserProfile, current_user.id, profile_data.onboarding_data
+    )
+    await db.commit()
+    return profile
+
+
+# Travel agent listing endpoints
+@router.get("/travel-agents/list", response_model=List[TravelAgentListItem])
+async def list_travel_agents(
+    country: Optional[str] = None,
+    destination_expertise: Optional[str] = None,
+    availability: Optional[str] = None,
+    experience_level: Optional[str] = None,
+    specialization: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = 0,
+    limit: int = 50
+):
+    """List travel agents with optional filtering"""
+    onboarding = TravelAgentProfile.onboarding_data
+    query = select(TravelAgentProfile, User).join(
+        User, TravelAgentProfile.user_id == User.id
+    ).where(
+        User.role == UserRole.TRAVEL_AGENT,
+        User.is_active == True
+    )
+
+    if country:
+        query = query.where(onboarding["country_of_operation"].astext == country)
+    if availability:
+        query = query.where(onboarding["availability_status"].astext == availability)
+    if destination_expertise:
+        query = query.where(
+            onboarding["supported_destination_countries"].astext.contains(destination_expertise)
+        )
+    if specialization:
+        query = query.where(onboarding["specializations"].astext.contains(specialization))
+
+    if experience_level:
+        years = sql_cast(onboarding["years_of_experience"].astext, Integer)
+        if experience_level == "junior":
+            query = query.where(years < 5)
+        elif experience_level == "mid":
+            query = query.where(years.between(5, 10))
+        elif experience_level == "senior":
+            query = query.where(years > 10)
+
+    # Only show verified agents (or agents with completed onboarding)
+    query = query.where(onboarding.isnot(None)).offset(skip).limit(limit)
+
+    results = (await db.execute(query)).all()
+    return [_agent_list_item(profile, user) for profile, user in results]
+
+
+@router.get("/travel-agents/{agent_id}", response_model=TravelAgentListItem)
+async def get_travel_agent(
+    agent_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific travel agent's public profile"""
+    profile = await _get_agent_profile(db, agent_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Travel agent not found"
+        )
+
+    user = await _get_user(db, agent_id)
+    if not user or user.role != UserRole.TRAVEL_AGENT or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Travel agent not found"
+        )
+
+    return _agent_list_item(profile, user)
+
+
+# Messaging endpoints
+@router.post("/conversations", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
+async def create_conversation(
+    conversation_data: ConversationCreate,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create a new conversation between user and agent"""
+    if current_user.role != UserRole.USER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only regular users can initiate conversations"
+        )
+
+    # Verify agent exists and is a travel agent
+    agent = (await db.execute(
+        select(User).where(
+            User.id == conversation_data.agent_id,
+            User.role == UserRole.TRAVEL_AGENT,
+            User.is_active == True
+        )
+    )).scalars().first()
+
+    if not agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Travel agent not found"
+        )
+
+    agent_profile = await _get_agent_profile(db, agent.id)
+    agent_business_name, agent_full_name, agent_primary_name = _agent_names(
+        agent_profile.onboarding_data if agent_profile else {}, agent.name
+    )
+
+    # Check if conversation already exists
+    existing_conv = (await db.execute(
+        select(Conversation).where(
+            Conversation.user_id == current_user.id,
+            Conversation.agent_id == conversation_data.agent_id
+        )
+    )).scalars().first()
+
+    if existing_conv:
+        last_message, unread_count = await _last_message_and_unread(
+            db, existing_conv.id, current_user.id
+        )
+        return ConversationResponse(
+            id=existing_conv.id,
+            user_id=existing_conv.user_id,
+            agent_id=existing_conv.agent_id,
+            last_message_at=existing_conv.last_message_at,
+            created_at=existing_conv.created_at,
+            updated_at=existing_conv.updated_at,
+            user_name=current_user.name,
+            agent_name=agent_primary_name,
+            agent_owner_name=agent_full_name if agent_business_name else None,
+            agent_business_name=agent_business_name,
+            last_message_preview=last_message.content[:100] if last_message else None,
+            unread_count=unread_count
+        )
+
+    # Create new conversation
+    conversation = Conversation(
+        user_id=current_user.id,
+        agent_id=conversation_data.agent_id
+    )
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+
+    # Create initial message if provided
+    if conversation_data.initial_message:
+        db.add(Message(
+            conversation_id=conversation.id,
+            sender_id=current_user.id,
+            content=conversation_data.initial_message,
+            is_read=False
+        ))
+        conversation.last_message_at = datetime.utcnow()
+        await db.commit()
+        await db.refresh(conversation)
+
+    return ConversationResponse(
+        id=conversation.id,
+        user_id=conversation.user_id,
+        agent_id=conversation.agent_id,
+        last_message_at=conversation.last_message_at,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        user_name=current_user.name,
+        agent_name=agent_primary_name,
+        agent_owner_name=agent_full_name if agent_business_name else None,
+        agent_business_name=agent_business_name,
+        last_message_preview=conversation_data.initial_message[:100] if conversation_data.initial_message else None,
+        unread_count=0
+    )
+
+
+@router.get("/conversations", response_model=List[ConversationResponse])
+async def get_conversations(
+    current_user: Principal = Depends(get_current_active_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all conversations for current user"""
+    if current_user.role == UserRole.USER:
+        owner_filter = Conversation.user_id == current_user.id
+    elif current_user.role == UserRole.TRAVEL_AGENT:
+        owner_filter = Conversation.agent_id == current_user.id
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid user role"
+        )
+
+    conversations = (await db.execute(
+        select(Conversation).where(owner_filter).order_by(Conversation.last_message_at.desc())
+    )).scalars().all()
+
+    result = []
+    for conv in conversations:
+        agent_business_name = agent_full_name = agent_primary_name = None
+        user_name = None
+        if current_user.role == UserRole.USER:
+            other_party = await _get_user(db, conv.agent_id)
+            agent_profile = await _get_agent_profile(db, conv.agent_id)
+            agent_business_name, agent_full_name, agent_primary_name = _agent_names(
+                agent_profile.onboarding_data if agent_profile else {},
+                other_party.name if other_party else None,
+            )
+        else:
+            other_party = await _get_user(db, conv.user_id)
+            user_name = other_party.name if other_party else None
+
+        last_message, unread_count = await _last_message_and_unread(db, conv.id, current_user.id)
+
+        result.append(ConversationResponse(
+            id=conv.id,
+            user_id=conv.user_id,
+            agent_id=conv.agent_id,
+            last_message_at=conv.last_message_at,
+            created_at=conv.created_at,
+            updated_at=conv.updated_at,
+            user_name=user_name,
+            agent_name=agent_primary_name if current_user.role == UserRole.USER else None,
+            agent_owner_name=agent_full_name if (current_user.role == UserRole.USER and agent_business_name) else None,
+            agent_business_name=agent_business_name if current_user.role == UserRole.USER else None,
+            last_message_preview=last_message.content[:100] if last_message else None,
+            unread_count=unread_count
+        ))
+
+    return result
+
+
+@router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
+async def get_conversation(
+    conversation_id: int,
+    current_user: Principal = Depends(get_current_active_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific conversation"""
+    conversation = await _get_accessible_conversation(db, conversation_id, current_user)
+
+    user = await _get_user(db, conversation.user_id)
+    agent = await _get_user(db, conversation.agent_id)
+
+    # Get agent profile for business name (if user is viewing as USER)
+    agent_business_name = agent_full_name = agent_primary_name = None
+    if current_user.role == UserRole.USER and agent:
+        agent_profile = await _get_agent_profile(db, agent.id)
+        agent_business_name, agent_full_name, agent_primary_name = _agent_names(
+            agent_profile.onboarding_data if agent_profile else {}, agent.name
+        )
+
+    last_message, unread_count = await _last_message_and_unread(db, conversation.id, current_user.id)
+
+    return ConversationResponse(
+        id=conversation.id,
+        user_id=conversation.user_id,
+        agent_id=conversation.agent_id,
+        last_message_at=conversation.last_message_at,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        user_name=user.name if user else None,
+        agent_name=agent_primary_name if current_user.role == UserRole.USER else None,
+        agent_owner_name=agent_full_name if (current_user.role == UserRole.USER and agent_business_name) else None,
+        agent_business_name=agent_business_name if current_user.role == UserRole.USER else None,
+        last_message_preview=last_message.content[:100] if last_message else None,
+        unread_count=unread_count
+    )
+
+
+@router.post("/messages", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
+async def create_message(
+    message_data: MessageCreate,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send a message in a conversation"""
+    # Bump the conversation timestamp only if it exists and the user is part of it
+    now = datetime.utcnow()
+    criteria = [Conversation.id == message_data.conversation_id]
+    if current_user.role == UserRole.USER:
+        criteria.append(Conversation.user_id == current_user.id)
+    elif current_user.role == UserRole.TRAVEL_AGENT:
+        criteria.append(Conversation.agent_id == current_user.id)
+    conversation = await db.run_sync(
+        persistence.update_returning, Conversation, criteria, {"last_message_at": now, "updated_at": now}
+    )
+    if conversation is None:
+        # Raises the matching 404 / 403
+        await _get_accessible_conversation(db, message_data.conversation_id, Principal.from_user(current_user))
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+
+    message = await db.run_sync(persistence.insert_returning, Message, {
+        "conversation_id": message_data.conversation_id,
+        "sender_id": current_user.id,
+        "content": message_data.content,
+        "is_read": False,
+    })
+    await db.commit()
+
+    return MessageResponse(**message, sender_name=current_user.name)
+
+
+@router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
+async def get_messages(
+    conversation_id: int,
+    current_user: Principal = Depends(get_current_active_principal_async),
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = 0,
+    limit: int = 100
+):
+    """Get messages in a conversation"""
+    await _get_accessible_conversation(db, conversation_id, current_user)
+
+    messages = list((await db.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )).scalars().all())
+
+    # Mark messages as read if viewing as recipient
+    for msg in messages:
+        if msg.sender_id != current_user.id and not msg.is_read:
+            msg.is_read = True
+    await db.commit()
+
+    # Reverse to show oldest first
+    messages.reverse()
+
+    sender_ids = {msg.sender_id for msg in messages}
+    sender_names: Dict[int, Any] = {}
+    if sender_ids:
+        rows = await db.execute(select(User.id, User.name).where(User.id.in_(sender_ids)))
+        sender_names = {row.id: row.name for row in rows}
+
+    return [
+        MessageResponse(
+            id=msg.id,
+            conversation_id=msg.conversation_id,
+            sender_id=msg.sender_id,
+            content=msg.content,
+            is_read=msg.is_read,
+            created_at=msg.created_at,
+            sender_name=sender_names.get(msg.sender_id)
+        )
+        for msg in messages
+    ]
+
+
+def install_async_routes(app: FastAPI) -> None:
+    """Replace the threadpool handlers in `app` with the async ones above."""
+    overridden = {
+        (route.path, method)
+        for route in router.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    app.router.routes = [
+        route
+        for route in app.router.routes
+        if not (
+            isinstance(route, APIRoute)
+            and any((route.path, method) in overridden for method in route.methods)
+        )
+    ]
+    app.include_router(router)
@@ -1,20 +1,30 @@
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+import threading
+import time
+import secrets
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from app.config import Settings, get_settings
+from app.database import get_async_db, get_db, release_connection
+from app.models import User, UserRole
+from app.passwords import (
+    get_password_hash,
+    verify_password,
+    verify_and_update_password_async,
+)
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
@@ -23,14 +33,229 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+class PrincipalCache:
+    """
+    In-process LRU of user rows keyed by JWT subject (the user's email).
+
+    Entries are plain column snapshots rather than ORM instances, so nothing
+    is shared between sessions or threads. Each entry lives for at most
+    `ttl_seconds`; the least recently used entry is evicted once
+    `max_entries` is reached.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation; see put()
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, subject: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, subject: str, row: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """
+        Cache `row`. Pass the `generation` read before the row was loaded: if
+        any invalidation happened since, the row may predate a committed
+        write and is not cached.
+        """
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[subject] = (expires_at, row)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: Optional[str]) -> None:
+        if not subject:
+            return
+        with self._lock:
+            self.generation += 1
+            if self._entries.pop(subject, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_settings = get_settings()
+principal_cache = PrincipalCache(
+    ttl_seconds=_settings.principal_cache_ttl_seconds,
+    max_entries=_settings.principal_cache_max_entries,
+)
+
+
+def _snapshot_user(user: User) -> Dict[str, Any]:
+    """Copy the loaded column values of a user row into a plain dict."""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def _user_from_snapshot(db: Session, row: Dict[str, Any]) -> User:
+    """Attach a cached user snapshot to `db` without issuing a query."""
+    user = User(**row)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+class TokenRevocations:
+    """
+    Compact in-memory record of the lowest token_version still accepted per
+    user id.
+
+    Stateless tokens carry the user's token_version at issue time; bumping the
+    version on the row (email change, deactivation) and recording it here
+    rejects every older token without a DB lookup. Versions seen on loaded
+    user rows are recorded too, so a process that has ever loaded a user
+    enforces its current version.
+    """
+
+    def __init__(self) -> None:
+        self._min_version: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, user_id: Optional[int], version: Optional[int]) -> None:
+        if user_id is None or version is None:
+            return
+        with self._lock:
+            if version > self._min_version.get(user_id, 0):
+                self._min_version[user_id] = version
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        with self._lock:
+            return version < self._min_version.get(user_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._min_version)
+
+
+token_revocations = TokenRevocations()
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Identity resolved from token claims, without a loaded User row."""
+
+    id: int
+    email: str
+    role: UserRole
+    is_active: bool
+    token_version: int = 0
 
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=UserRole(user.role),
+            is_active=bool(user.is_active),
+            token_version=user.token_version or 0,
+        )
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+
+def token_claims_for(user: User) -> Dict[str, Any]:
+    """Claims to embed in an access token for `user`."""
+    claims: Dict[str, Any] = {"sub": user.email}
+    if get_settings().stateless_tokens:
+        role = user.role.value if isinstance(user.role, UserRole) else user.role
+        claims.update({
+            "uid": user.id,
+            "role": role,
+            "act": bool(user.is_active),
+            "ver": user.token_version or 0,
+        })
+    return claims
+
+
+def invalidate_principal(email: Optional[str]) -> None:
+    """Drop the cached principal for `email` after its user row changed."""
+    principal_cache.invalidate(email)
+
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target: User) -> None:
+    # Stateless tokens embed email, role and active flag; changing any of them
+    # (PUT /auth/me, role changes, deactivation) retires older tokens.
+    state = inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in ("email", "role", "is_active")):
+        target.token_version = (target.token_version or 0) + 1
+
+
+_PENDING_PRINCIPAL_WRITES = "pending_principal_writes"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _queue_principal_invalidation(mapper, connection, target: User) -> None:
+    # Any write to a user row (profile edits, role changes, deactivation) must
+    # evict it, including the previous email when the email itself changed.
+    # This fires at flush, before the write is visible to other requests, so
+    # the eviction waits for the commit (and is dropped on rollback).
+    emails = {target.email, *(inspect(target).attrs.email.history.deleted or ())}
+    session = object_session(target)
+    if session is None:
+        _apply_principal_writes(emails, {target.id: target.token_version or 0})
+        return
+    emails_pending, versions_pending = session.info.setdefault(_PENDING_PRINCIPAL_WRITES, (set(), {}))
+    emails_pending.update(emails)
+    versions_pending[target.id] = target.token_version or 0
+
+
+def _apply_principal_writes(emails, versions: Dict[int, int]) -> None:
+    for email in emails:
+        invalidate_principal(email)
+    for user_id, version in versions.items():
+        token_revocations.observe(user_id, version)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_PRINCIPAL_WRITES, None)
+    if pending is not None:
+        _apply_principal_writes(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_writes(session: Session) -> None:
+    session.info.pop(_PENDING_PRINCIPAL_WRITES, None)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -50,39 +275,129 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    """Authenticate a user"""
+def _fetch_user_snapshot(db: Session, email: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a user row and return its pooled connection straight away, so the
+    auth lookup does not keep a connection checked out for the whole request.
+    """
     user = get_user_by_email(db, email)
+    row = _snapshot_user(user) if user is not None else None
+    release_connection(db)
+    return row
+
+
+def _store_rehashed_password(db: Session, user: User, new_hash: str) -> None:
+    user.hashed_password = new_hash
+    db.commit()
+    db.refresh(user)
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    """
+    Authenticate a user.
+
+    bcrypt runs on the dedicated password pool; if the stored hash was made
+    with a different cost than BCRYPT_ROUNDS it is transparently replaced.
+    """
+    user = await run_in_threadpool(get_user_by_email, db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        await run_in_threadpool(_store_rehashed_password, db, user, new_hash)
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(token: str) -> Dict[str, Any]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+async def _load_user_for_payload(db: Session, payload: Dict[str, Any]) -> User:
+    email: str = payload["sub"]
+    cached = principal_cache.get(email)
+    if cached is not None:
+        user = _user_from_snapshot(db, cached)
+    else:
+        # The lookup is a blocking DB round trip; run it on the threadpool so a slow
+        # query never stalls the event loop for every other in-flight request.
+        generation = principal_cache.generation
+        row = await run_in_threadpool(_fetch_user_snapshot, db, email)
+        if row is None:
+            raise _credentials_exception()
+        principal_cache.put(email, row, generation)
+        user = _user_from_snapshot(db, row)
+    _check_token_version(payload, user)
     return user
 
 
+def _check_token_version(payload: Dict[str, Any], user: User) -> None:
+    token_revocations.observe(user.id, user.token_version or 0)
+    if "ver" in payload and payload["ver"] < (user.token_version or 0):
+        raise _credentials_exception()
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current authenticated user from JWT token"""
+    payload = _decode_token(token)
+    return await _load_user_for_payload(db, payload)
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    Resolve the caller from token claims alone when the token carries them.
+
+    Tokens issued without the stateless claims (or with STATELESS_TOKENS off)
+    fall back to loading the user row.
+    """
+    payload = _decode_token(token)
+    principal = _principal_from_claims(payload)
+    if principal is not None:
+        return principal
+    user = await _load_user_for_payload(db, payload)
+    return Principal.from_user(user)
+
+
+def _principal_from_claims(payload: Dict[str, Any]) -> Optional[Principal]:
+    """The principal carried by a stateless token, or None for email-only tokens."""
+    if not all(key in payload for key in ("uid", "role", "act", "ver")):
+        return None
+    if token_revocations.is_revoked(payload["uid"], payload["ver"]):
+        raise _credentials_exception()
+    try:
+        role = UserRole(payload["role"])
+    except ValueError:
+        raise _credentials_exception()
+    return Principal(
+        id=payload["uid"],
+        email=payload["sub"],
+        role=role,
+        is_active=bool(payload["act"]),
+        token_version=payload["ver"],
+    )
+
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -90,3 +405,94 @@ async def get_current_active_user(
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_current_active_principal(
+    current_principal: Principal = Depends(get_current_principal)
+) -> Principal:
+    """Get the current active principal (claims-only for read-only endpoints)"""
+    if not current_principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_principal
+
+
+# Async-session variants for the DATABASE_ASYNC routes (app/async_routes.py).
+# They share the request's AsyncSession with the handler, so an async request
+# never takes a threadpool slot or a connection from the sync pool.
+
+
+def _detached_user(row: Dict[str, Any]) -> User:
+    """A detached User carrying a snapshot's column values (no session needed)."""
+    user = User(**row)
+    make_transient_to_detached(user)
+    return user
+
+
+async def _load_user_for_payload_async(db: AsyncSession, payload: Dict[str, Any]) -> User:
+    email: str = payload["sub"]
+    row = principal_cache.get(email)
+    if row is None:
+        generation = principal_cache.generation
+        found = (await db.execute(select(User).where(User.email == email))).scalars().first()
+        if found is None:
+            raise _credentials_exception()
+        row = _snapshot_user(found)
+        principal_cache.put(email, row, generation)
+    user = _detached_user(row)
+    _check_token_version(payload, user)
+    return user
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user on the async session"""
+    return await _load_user_for_payload_async(db, _decode_token(token))
+
+
+async def get_current_principal_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """get_current_principal on the async session"""
+    payload = _decode_token(token)
+    principal = _principal_from_claims(payload)
+    if principal is not None:
+        return principal
+    user = await _load_user_for_payload_async(db, payload)
+    return Principal.from_user(user)
+
+
+async def get_current_active_user_async(
+    current_user: User = Depends(get_current_user_async)
+) -> User:
+    """Get the current active user (async session)"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_principal_async(
+    current_principal: Principal = Depends(get_current_principal_async)
+) -> Principal:
+    """Get the current active principal (async session; claims-only for read-only endpoints)"""
+    if not current_principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_principal
+
+
+def require_internal_token(
+    x_internal_token: Optional[str] = Header(default=None),
+    settings: Settings = Depends(get_settings),
+) -> None:
+    """
+    Guard for /internal/* metrics endpoints.
+
+    Callers must send the INTERNAL_API_TOKEN in an X-Internal-Token header.
+    Without a configured token the endpoints are not served at all.
+    """
+    if not settings.internal_api_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not secrets.compare_digest(x_internal_token, settings.internal_api_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
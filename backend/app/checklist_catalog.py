@@ -0,0 +1,83 @@
+"""
+Curated checklists for well-known visa programs.
+
+app/data/checklist_catalog.json holds vetted step-by-step checklists. At
+import time every program code and alias is normalized and indexed in a
+dict, so resolving a visa type is a single hash lookup. /checklist and
+/recommendations/checklist consult the catalog before calling the model,
+which is then only needed for long-tail programs.
+"""
+import copy
+import json
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+CATALOG_PATH = Path(__file__).parent / "data" / "checklist_catalog.json"
+
+# Words that do not distinguish programs ("UK Skilled Worker Visa" == "UK Skilled Worker").
+# Not "permit": "Study Permit" is the program's name in Canada.
+_NOISE_WORDS = {"visa", "the", "program", "programme", "route", "scheme"}
+
+
+def normalize_code(value: str) -> str:
+    """Canonical lookup key for a visa type, code or alias."""
+    words = re.sub(r"[^a-z0-9]+", " ", value.casefold()).split()
+    kept = [word for word in words if word not in _NOISE_WORDS]
+    return "-".join(kept or words)
+
+
+class ChecklistCatalog:
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.version = data.get("version", 1)
+        self._programs: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, str] = {}
+        for program in data["programs"]:
+            code = program["code"]
+            self._programs[code] = program
+            for name in (code, program.get("name", ""), *program.get("aliases", [])):
+                if name:
+                    self._index[normalize_code(name)] = code
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, names: Iterable[Optional[str]]) -> Optional[str]:
+        """Catalog code of the first name that matches a program, if any."""
+        for name in names:
+            if not name:
+                continue
+            code = self._index.get(normalize_code(name))
+            if code is not None:
+                return code
+        return None
+
+    def lookup(self, *names: Optional[str]) -> Optional[Tuple[str, List[dict]]]:
+        """Code and a copy of the curated checklist for the first matching name."""
+        code = self.resolve(names)
+        with self._lock:
+            if code is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return code, copy.deepcopy(self._programs[code]["checklist"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "programs": len(self._programs),
+                "keys": len(self._index),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+@lru_cache
+def get_catalog() -> ChecklistCatalog:
+    with open(CATALOG_PATH, encoding="utf-8") as handle:
+        return ChecklistCatalog(json.load(handle))
@@ -0,0 +1,169 @@
+"""
+Content-deduplicated checklist store shared across users.
+
+A checklist depends only on the visa option it was generated for, so its JSON
+is stored once in checklist_contents under compute_option_hash() of the option
+(catalog checklists under "catalog:<code>:v<version>"). Per-user
+checklist_cache rows reference the shared content; users whose options hash
+the same reuse it instead of paying for another generation.
+
+Two-phase checklists are stored as an outline whose steps carry
+"detail_pending": true; update_step() fills in one step at a time.
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import ChecklistCache, ChecklistContent
+
+
+class StoredContent(NamedTuple):
+    """Session-independent view of a checklist_contents row."""
+    id: int
+    option_hash: str
+    checklist: List[dict]
+    source: str
+
+
+def catalog_content_key(code: str, version: int) -> str:
+    return f"catalog:{code}:v{version}"
+
+
+class StoreCounters:
+    """In-process lookup counters; persistent hit counts live on the rows."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+counters = StoreCounters()
+
+
+def _stored(entry: ChecklistContent) -> StoredContent:
+    return StoredContent(entry.id, entry.option_hash, entry.checklist_json, entry.source)
+
+
+def lookup(db: Session, option_hash: str) -> Optional[StoredContent]:
+    """Return the shared checklist for `option_hash`, counting the hit."""
+    entry = db.query(ChecklistContent).filter(ChecklistContent.option_hash == option_hash).first()
+    if entry is None:
+        counters.incr("misses")
+        return None
+    stored = _stored(entry)
+    db.query(ChecklistContent).filter(ChecklistContent.id == entry.id).update(
+        {
+            ChecklistContent.hit_count: ChecklistContent.hit_count + 1,
+            ChecklistContent.last_hit_at: datetime.now(timezone.utc),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    counters.incr("hits")
+    return stored
+
+
+def store(db: Session, option_hash: str, checklist: List[dict], source: str) -> StoredContent:
+    """Insert the shared checklist for `option_hash`, or return the one stored first."""
+    entry = ChecklistContent(option_hash=option_hash, checklist_json=checklist, source=source)
+    db.add(entry)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker stored this option's checklist first; keep theirs
+        db.rollback()
+        existing = db.query(ChecklistContent).filter(ChecklistContent.option_hash == option_hash).first()
+        if existing is None:
+            raise
+        return _stored(existing)
+    db.refresh(entry)
+    counters.incr("stores")
+    return _stored(entry)
+
+
+def step_id(item: Any, idx: int) -> str:
+    """Id of the step at `idx`; positional when the model did not give one."""
+    if isinstance(item, dict) and item.get("id"):
+        return str(item["id"])
+    return f"step-{idx + 1}"
+
+
+def pending_step_ids(checklist: List[dict]) -> List[str]:
+    """Steps of a two-phase checklist whose details have not been generated yet."""
+    return [
+        step_id(item, idx)
+        for idx, item in enumerate(checklist or [])
+        if isinstance(item, dict) and item.get("detail_pending")
+    ]
+
+
+def update_step(db: Session, content_id: int, step: str, detail: Dict[str, Any]) -> Optional[dict]:
+    """
+    Merge generated details into one step of the shared checklist.
+
+    The row is locked while its JSON is rewritten so concurrent fills of
+    different steps do not overwrite each other. Returns the updated step, or
+    None if the content or step no longer exists.
+    """
+    entry = (
+        db.query(ChecklistContent)
+        .filter(ChecklistContent.id == content_id)
+        .with_for_update()
+        .first()
+    )
+    if entry is None:
+        db.rollback()
+        return None
+    checklist = [dict(item) if isinstance(item, dict) else item for item in entry.checklist_json]
+    for idx, item in enumerate(checklist):
+        if step_id(item, idx) != step:
+            continue
+        if isinstance(item, dict) and item.get("detail_pending"):
+            item.update(detail)
+            item.pop("detail_pending", None)
+            entry.checklist_json = checklist
+            if not pending_step_ids(checklist) and entry.source == "outline":
+                entry.source = "ai"
+        db.commit()
+        return item
+    db.rollback()
+    return None
+
+
+def stats(db: Session) -> Dict[str, Any]:
+    """Lookup counters plus shared entries and how many user rows reference them."""
+    entries, total_hits = db.query(
+        func.count(ChecklistContent.id),
+        func.coalesce(func.sum(ChecklistContent.hit_count), 0),
+    ).one()
+    linked, inline = db.query(
+        func.count(ChecklistCache.content_id),
+        func.count(ChecklistCache.checklist_json),
+    ).one()
+    return {
+        **counters.snapshot(),
+        "entries": entries,
+        "lifetime_hits": int(total_hits),
+        "linked_user_rows": linked,
+        "inline_user_rows": inline,
+    }
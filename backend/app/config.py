@@ -13,11 +13,173 @@ class Settings(BaseModel):
     environment: str = Field(default_factory=lambda: os.getenv("ENV", "local"))
     openai_api_key: str = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY", ""))
     openai_model: str = Field(default_factory=lambda: os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    # Optional override, e.g. a local stand-in for the OpenAI API
+    openai_base_url: str = Field(default_factory=lambda: os.getenv("OPENAI_BASE_URL", ""))
+    openai_max_connections: int = Field(
+        default_factory=lambda: int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    )
+    openai_max_keepalive_connections: int = Field(
+        default_factory=lambda: int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    )
+    openai_keepalive_expiry: float = Field(
+        default_factory=lambda: float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+    )
     
     # Google OAuth
     google_client_id: str = Field(default_factory=lambda: os.getenv("GOOGLE_CLIENT_ID", ""))
     google_client_secret: str = Field(default_factory=lambda: os.getenv("GOOGLE_CLIENT_SECRET", ""))
 
+    # Serve the messaging, conversation, agent-listing and profile endpoints
+    # from an async engine (asyncpg / aiosqlite) instead of the threadpool
+    database_async: bool = Field(
+        default_factory=lambda: os.getenv("DATABASE_ASYNC", "false").lower() in ("1", "true", "yes")
+    )
+
+    # Upper bound on the estimated prompt size of a generation (0 disables)
+    prompt_token_budget: int = Field(
+        default_factory=lambda: int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+    )
+
+    # Rank visa programs locally (app/eligibility.py) and hand the model the
+    # candidates instead of having it judge every program from scratch
+    eligibility_prefilter_enabled: bool = Field(
+        default_factory=lambda: os.getenv("ELIGIBILITY_PREFILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+    )
+    eligibility_max_candidates: int = Field(
+        default_factory=lambda: int(os.getenv("ELIGIBILITY_MAX_CANDIDATES", "8"))
+    )
+
+    # Serve curated checklists (app/data/checklist_catalog.json) for
+    # well-known programs before asking the model
+    checklist_catalog_enabled: bool = Field(
+        default_factory=lambda: os.getenv("CHECKLIST_CATALOG_ENABLED", "true").lower() in ("1", "true", "yes")
+    )
+    # Serve a checklist whose option_hash no longer matches the visa option
+    # right away and regenerate it through the job queue
+    checklist_stale_refresh_enabled: bool = Field(
+        default_factory=lambda: os.getenv("CHECKLIST_STALE_REFRESH_ENABLED", "true").lower() in ("1", "true", "yes")
+    )
+
+    # Generate checklists as an outline (titles and timing) first; step details
+    # are generated on POST /checklist/step and, optionally, by a background job
+    checklist_two_phase_enabled: bool = Field(
+        default_factory=lambda: os.getenv("CHECKLIST_TWO_PHASE_ENABLED", "false").lower() in ("1", "true", "yes")
+    )
+    checklist_background_detail_enabled: bool = Field(
+        default_factory=lambda: os.getenv("CHECKLIST_BACKGROUND_DETAIL_ENABLED", "true").lower() in ("1", "true", "yes")
+    )
+
+    # PATCH /checklist/progress toggles for one checklist arriving within this
+    # window are merged and written in one upsert (0 writes each immediately)
+    checklist_progress_coalesce_ms: int = Field(
+        default_factory=lambda: int(os.getenv("CHECKLIST_PROGRESS_COALESCE_MS", "300"))
+    )
+
+    # Generate the checklists of the top recommended options in the
+    # background right after a recommendation (see app/warming.py)
+    checklist_warm_enabled: bool = Field(
+        default_factory=lambda: os.getenv("CHECKLIST_WARM_ENABLED", "false").lower() in ("1", "true", "yes")
+    )
+    checklist_warm_max_options: int = Field(
+        default_factory=lambda: int(os.getenv("CHECKLIST_WARM_MAX_OPTIONS", "3"))
+    )
+    checklist_warm_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("CHECKLIST_WARM_CONCURRENCY", "2"))
+    )
+    # Warm generations per user per hour, across regenerations (already warm options are free)
+    checklist_warm_per_user_per_hour: int = Field(
+        default_factory=lambda: int(os.getenv("CHECKLIST_WARM_PER_USER_PER_HOUR", "6"))
+    )
+
+    # Generate one completion per preferred destination, concurrently, and
+    # merge the ranked options (see app/fanout.py)
+    recommendation_fanout_enabled: bool = Field(
+        default_factory=lambda: os.getenv("RECOMMENDATION_FANOUT_ENABLED", "false").lower() in ("1", "true", "yes")
+    )
+    recommendation_fanout_max_destinations: int = Field(
+        default_factory=lambda: int(os.getenv("RECOMMENDATION_FANOUT_MAX_DESTINATIONS", "4"))
+    )
+    recommendation_fanout_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("RECOMMENDATION_FANOUT_CONCURRENCY", "4"))
+    )
+    recommendation_fanout_max_options: int = Field(
+        default_factory=lambda: int(os.getenv("RECOMMENDATION_FANOUT_MAX_OPTIONS", "5"))
+    )
+
+    # Cross-user recommendation cache keyed by normalized intake
+    recommendation_cache_enabled: bool = Field(
+        default_factory=lambda: os.getenv("RECOMMENDATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    )
+    recommendation_cache_ttl_seconds: int = Field(
+        default_factory=lambda: int(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    )
+
+    # Coalesce concurrent identical generations; across workers via
+    # Postgres advisory locks
+    single_flight_distributed: bool = Field(
+        default_factory=lambda: os.getenv("SINGLE_FLIGHT_DISTRIBUTED", "true").lower() in ("1", "true", "yes")
+    )
+    single_flight_wait_seconds: float = Field(
+        default_factory=lambda: float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "90"))
+    )
+    single_flight_poll_seconds: float = Field(
+        default_factory=lambda: float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "0.25"))
+    )
+    # Connections holding advisory locks (one per leading generation); a
+    # leader that cannot get one generates without the cross-worker lock
+    single_flight_lock_pool_size: int = Field(
+        default_factory=lambda: int(os.getenv("SINGLE_FLIGHT_LOCK_POOL_SIZE", "5"))
+    )
+
+    # Background generation jobs (see app/jobs.py). JOB_WORKERS polling loops
+    # run inside each API process; set it to 0 and use run_worker.py to run
+    # them separately.
+    job_workers: int = Field(default_factory=lambda: int(os.getenv("JOB_WORKERS", "1")))
+    job_poll_seconds: float = Field(default_factory=lambda: float(os.getenv("JOB_POLL_SECONDS", "1")))
+    job_visibility_timeout_seconds: float = Field(
+        default_factory=lambda: float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    )
+    job_max_attempts: int = Field(default_factory=lambda: int(os.getenv("JOB_MAX_ATTEMPTS", "3")))
+    job_retry_backoff_seconds: float = Field(
+        default_factory=lambda: float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
+    )
+
+    # Database connection pool
+    db_pool_size: int = Field(default_factory=lambda: int(os.getenv("DB_POOL_SIZE", "5")))
+    db_max_overflow: int = Field(default_factory=lambda: int(os.getenv("DB_MAX_OVERFLOW", "10")))
+    db_pool_timeout: float = Field(default_factory=lambda: float(os.getenv("DB_POOL_TIMEOUT", "30")))
+    db_pool_recycle: int = Field(default_factory=lambda: int(os.getenv("DB_POOL_RECYCLE", "1800")))
+    db_pool_pre_ping: bool = Field(
+        default_factory=lambda: os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    )
+
+    # Authenticated principal cache (JWT subject -> user row)
+    principal_cache_ttl_seconds: float = Field(
+        default_factory=lambda: float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    )
+    principal_cache_max_entries: int = Field(
+        default_factory=lambda: int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "1024"))
+    )
+
+    # Embed id/role/active/token_version claims so read-only endpoints can
+    # authorize without loading the user row
+    stateless_tokens: bool = Field(
+        default_factory=lambda: os.getenv("STATELESS_TOKENS", "false").lower() in ("1", "true", "yes")
+    )
+
+    # Shared secret for the /internal/* metrics endpoints (X-Internal-Token
+    # header); the endpoints are not served while it is empty
+    internal_api_token: str = Field(default_factory=lambda: os.getenv("INTERNAL_API_TOKEN", ""))
+
+    # Password hashing (bcrypt) worker pool
+    bcrypt_rounds: int = Field(default_factory=lambda: int(os.getenv("BCRYPT_ROUNDS", "12")))
+    password_hash_workers: int = Field(
+        default_factory=lambda: int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    )
+    password_hash_max_queue: int = Field(
+        default_factory=lambda: int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+    )
+
 
 @lru_cache
 def get_settings() -> Settings:
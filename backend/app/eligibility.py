@@ -0,0 +1,318 @@
+"""
+Deterministic eligibility pre-scoring of visa programs.
+
+Programs and their thresholds live in app/data/visa_programs.json and are
+loaded once into column arrays, so an intake is scored against every program
+in a handful of NumPy operations. Hard rules (budget far below the fees,
+passport expiring before the move, statutory age limits, a missing required
+job offer or admission) exclude a program outright; softer shortfalls lower
+its 0-100 score. A criminal record only excludes programs where it is an
+absolute bar; elsewhere it is assessed case by case, so it lowers the score
+and flags the program for review.
+
+Unknown intake fields never exclude a program. The model still makes
+the final call; this only keeps obviously impossible programs out of the
+prompt, and powers the what-if endpoint without any LLM call.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.schemas import IntakeData
+
+PROGRAMS_PATH = Path(__file__).parent / "data" / "visa_programs.json"
+
+# Budget below this fraction of a program's fees is a hard disqualifier
+FEES_HARD_FLOOR = 0.5
+# Assets below this fraction of a required investment is a hard disqualifier
+INVESTMENT_HARD_FLOOR = 0.5
+
+# Score lost per year past a points system's age limit, and the most it costs
+AGE_PENALTY_PER_YEAR = 4.0
+MAX_AGE_PENALTY = 40.0
+# Score lost by a criminal record where the program reviews it case by case
+CRIMINAL_REVIEW_PENALTY = 25.0
+
+ELIGIBLE_SCORE = 75
+POSSIBLE_SCORE = 50
+
+_EDUCATION_LEVELS = (
+    (5, ("phd", "doctor", "doctorate")),
+    (4, ("master", "masters", "msc", "mba", "postgraduate")),
+    (3, ("bachelor", "bachelors", "bsc", "ba", "degree", "undergraduate")),
+    (2, ("diploma", "associate", "college", "vocational", "hnd", "ond")),
+    (1, ("high school", "secondary", "ssce", "waec", "a-level", "o-level")),
+)
+_EDUCATION_PATTERNS = tuple(
+    (level, re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b"))
+    for level, keywords in _EDUCATION_LEVELS
+)
+
+
+@dataclass
+class ProgramScore:
+    code: str
+    name: str
+    country: str
+    category: str
+    score: int
+    status: str  # eligible | possible | unlikely | not_eligible
+    reasons: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "name": self.name,
+            "country": self.country,
+            "category": self.category,
+            "score": self.score,
+            "status": self.status,
+            "reasons": self.reasons,
+        }
+
+
+def _column(programs: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array(
+        [np.nan if program.get(key) is None else float(program[key]) for program in programs],
+        dtype=float,
+    )
+
+
+def _flags(programs: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array([bool(program.get(key)) for program in programs], dtype=bool)
+
+
+class ProgramTable:
+    """Visa programs as parallel arrays, one element per program."""
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        programs = data["programs"]
+        self.version = data.get("version", 1)
+        self.programs = programs
+        self.codes = [program["code"] for program in programs]
+        # Normalized country name, ISO code or alias -> country name used by the programs
+        self.countries: Dict[str, str] = {}
+        for program in programs:
+            self.countries[_country_key(program["country"])] = program["country"]
+        for country, aliases in data.get("country_aliases", {}).items():
+            for name in (country, *aliases):
+                self.countries[_country_key(name)] = country
+        self.fees = _column(programs, "fees_usd")
+        self.min_funds = _column(programs, "min_funds_usd")
+        self.min_investment = _column(programs, "min_investment_usd")
+        self.min_age = _column(programs, "min_age")
+        self.max_age = _column(programs, "max_age")
+        self.points_age_limit = _column(programs, "points_age_limit")
+        self.min_education = _column(programs, "min_education")
+        self.min_experience = _column(programs, "min_experience_years")
+        self.passport_months = _column(programs, "passport_validity_months")
+        self.requires_job_offer = _flags(programs, "requires_job_offer")
+        self.requires_admission = _flags(programs, "requires_admission")
+        self.requires_language_test = _flags(programs, "requires_language_test")
+        self.criminal_bar = _flags(programs, "criminal_bar")
+
+    def canonical_country(self, name: Optional[str]) -> Optional[str]:
+        """The programs' name for a destination ("USA" -> "United States"), if it has any."""
+        if not name:
+            return None
+        return self.countries.get(_country_key(name))
+
+    def score(self, intake: IntakeData) -> List[ProgramScore]:
+        """Score every program for `intake`, best first."""
+        n = len(self.programs)
+        penalty = np.zeros(n)
+        excluded = np.zeros(n, dtype=bool)
+        reasons: List[List[str]] = [[] for _ in range(n)]
+
+        def flag(mask: np.ndarray, reason: str, hard: bool = False, amount: Any = 0.0) -> None:
+            if hard:
+                np.logical_or(excluded, mask, out=excluded)
+            else:
+                penalty[mask] += np.broadcast_to(amount, (n,))[mask]
+            for idx in np.flatnonzero(mask):
+                reasons[idx].append(reason)
+
+        funds = _available_funds(intake)
+        if funds is not None:
+            flag(self.fees * FEES_HARD_FLOOR > funds, "Budget is far below the program fees", hard=True)
+            shortfall = np.nan_to_num((self.min_funds - funds) / self.min_funds, nan=0.0)
+            flag(shortfall > 0, "Funds are below the usual proof-of-funds level", amount=np.clip(shortfall, 0, 1) * 40)
+
+        assets = _max_known(intake.total_assets_usd, intake.liquid_assets_usd)
+        if assets is not None:
+            flag(
+                self.min_investment * INVESTMENT_HARD_FLOOR > assets,
+                "Assets are far below the required investment",
+                hard=True,
+            )
+            flag(self.min_investment > assets, "Assets are below the required investment", amount=25.0)
+
+        if intake.age is not None:
+            flag(
+                (self.min_age > intake.age) | (self.max_age < intake.age),
+                "Age is outside the program's limits",
+                hard=True,
+            )
+            years_over = np.nan_to_num(intake.age - self.points_age_limit, nan=0.0)
+            flag(
+                years_over > 0,
+                "Age reduces the points awarded by this program",
+                amount=np.minimum(np.clip(years_over, 0, None) * AGE_PENALTY_PER_YEAR, MAX_AGE_PENALTY),
+            )
+
+        passport_expiry = _parse_date(intake.passport_expiry)
+        if passport_expiry is not None:
+            move_date = _parse_date(intake.target_move_date) or date.today()
+            days_valid_after_move = (passport_expiry - move_date).days
+            flag(
+                days_valid_after_move < np.nan_to_num(self.passport_months, nan=0.0) * 30,
+                "Passport expires before the required validity after your move date",
+                hard=True,
+            )
+
+        if intake.criminal_records:
+            flag(self.criminal_bar, "Criminal record is a bar for this program", hard=True)
+            flag(
+                ~self.criminal_bar,
+                "Criminal record needs a case-by-case admissibility review",
+                amount=CRIMINAL_REVIEW_PENALTY,
+            )
+        if intake.has_overstays:
+            flag(np.ones(n, dtype=bool), "Previous overstays weigh against approval", amount=20.0)
+
+        if intake.has_job_offer_international is False:
+            flag(self.requires_job_offer, "Requires a job offer", hard=True)
+        elif intake.has_job_offer_international is None:
+            flag(self.requires_job_offer, "Requires a job offer", amount=15.0)
+
+        if intake.has_admission_offer is False:
+            flag(self.requires_admission, "Requires an admission offer", hard=True)
+        elif intake.has_admission_offer is None:
+            flag(self.requires_admission, "Requires an admission offer", amount=15.0)
+
+        if intake.language_tests_taken is not None and not intake.language_tests_taken:
+            flag(self.requires_language_test, "Requires a language test result", amount=10.0)
+
+        education = _education_level(intake.education_level)
+        if education is not None:
+            gap = np.nan_to_num(self.min_education - education, nan=0.0)
+            flag(gap > 0, "Education is below the usual requirement", amount=np.clip(gap, 0, None) * 15)
+
+        if intake.total_experience_years is not None:
+            gap = np.nan_to_num(self.min_experience - intake.total_experience_years, nan=0.0)
+            flag(gap > 0, "Work experience is below the usual requirement", amount=np.minimum(np.clip(gap, 0, None) * 8, 30))
+
+        scores = np.clip(np.rint(100 - penalty), 0, 100).astype(int)
+        scores[excluded] = 0
+        status = np.where(
+            excluded,
+            "not_eligible",
+            np.where(scores >= ELIGIBLE_SCORE, "eligible", np.where(scores >= POSSIBLE_SCORE, "possible", "unlikely")),
+        )
+
+        order = np.lexsort((-scores, excluded))
+        return [
+            ProgramScore(
+                code=self.codes[idx],
+                name=self.programs[idx]["name"],
+                country=self.programs[idx]["country"],
+                category=self.programs[idx]["category"],
+                score=int(scores[idx]),
+                status=str(status[idx]),
+                reasons=reasons[idx],
+            )
+            for idx in order
+        ]
+
+
+@lru_cache
+def get_program_table() -> ProgramTable:
+    with open(PROGRAMS_PATH, encoding="utf-8") as handle:
+        return ProgramTable(json.load(handle))
+
+
+def _country_key(name: str) -> str:
+    words = re.sub(r"[^a-z0-9]+", " ", name.casefold().replace(".", "")).split()
+    if words[:1] == ["the"]:
+        words = words[1:]
+    return " ".join(words)
+
+
+def _max_known(*values: Optional[float]) -> Optional[float]:
+    known = [float(value) for value in values if value is not None]
+    return max(known) if known else None
+
+
+def _available_funds(intake: IntakeData) -> Optional[float]:
+    budget_amount = None
+    if intake.budget_amount is not None and (intake.budget_currency or "").upper() in ("", "USD"):
+        budget_amount = intake.budget_amount
+    return _max_known(intake.max_budget_usd, intake.liquid_assets_usd, budget_amount)
+
+
+def _education_level(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    text = value.casefold()
+    for level, pattern in _EDUCATION_PATTERNS:
+        if pattern.search(text):
+            return level
+    return None
+
+
+_DATE_RE = re.compile(r"(\d{4})-(\d{1,2})(?:-(\d{1,2}))?")
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    """Dates as the intake form sends them: YYYY-MM-DD or YYYY-MM."""
+    if not value:
+        return None
+    match = _DATE_RE.search(value)
+    if not match:
+        return None
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def score_programs(intake: IntakeData, destination: Optional[str] = None) -> List[ProgramScore]:
+    """Programs scored for `intake`, best first, optionally limited to one destination country."""
+    return _in_destinations(get_program_table().score(intake), [destination] if destination else None)
+
+
+def _in_destinations(
+    results: List[ProgramScore], destinations: Optional[Sequence[str]]
+) -> List[ProgramScore]:
+    """Results in the destination countries; destinations the table does not know match nothing."""
+    if destinations is None:
+        return results
+    table = get_program_table()
+    wanted = {table.canonical_country(destination) for destination in destinations} - {None}
+    return [result for result in results if result.country in wanted]
+
+
+def prompt_candidates(
+    intake: IntakeData,
+    max_candidates: int,
+    destinations: Optional[Sequence[str]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Pre-screened programs in `destinations` to hand the model, and the ones it should not recommend."""
+    results = _in_destinations(get_program_table().score(intake), destinations)
+    return {
+        "candidates": [
+            {"code": r.code, "name": r.name, "score": r.score, "status": r.status}
+            for r in results if r.status != "not_eligible"
+        ][:max_candidates],
+        "excluded": [
+            {"name": r.name, "reason": r.reasons[0]}
+            for r in results if r.status == "not_eligible" and r.reasons
+        ][:max_candidates],
+    }
@@ -0,0 +1,96 @@
+"""
+Per-destination fan-out of recommendation generations.
+
+An intake listing several preferred destinations is split into one
+sub-prompt per destination. The sub-completions run concurrently and their
+options are merged and ranked here into a single v2 response document, so a
+generation takes about as long as its slowest destination instead of one
+completion reasoning about every country in turn.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("recommendations")
+
+# Best first; unknown statuses rank after these
+STATUS_RANK = {"eligible": 0, "possible": 1, "unlikely": 2, "not_eligible": 3}
+
+# Not "and": it is part of country names (Trinidad and Tobago)
+_DESTINATION_SPLIT_RE = re.compile(r"[,;/|\n]")
+
+
+def split_destinations(preferred_destinations: Optional[str], limit: Optional[int] = None) -> List[str]:
+    """Distinct destinations named in the free-text preferred_destinations answer."""
+    if not preferred_destinations:
+        return []
+    destinations: List[str] = []
+    seen = set()
+    for part in _DESTINATION_SPLIT_RE.split(preferred_destinations):
+        name = part.strip(" .")
+        if not name or name.casefold() in seen:
+            continue
+        seen.add(name.casefold())
+        destinations.append(name)
+    return destinations[:limit]
+
+
+def _score(value: Any) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def rank_key(option: Dict[str, Any]) -> tuple:
+    status = str(option.get("status") or "").strip().lower()
+    return (STATUS_RANK.get(status, len(STATUS_RANK)), -_score(option.get("score")))
+
+
+def _load(raw: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def merge_responses(destinations: List[str], raws: List[str], max_options: int) -> str:
+    """
+    Merge per-destination v2 responses into one v2 response document.
+
+    Options from every destination are ranked by status then score; the
+    overall scores are the best of the destinations and the summaries are
+    concatenated in destination order.
+    """
+    options: List[Dict[str, Any]] = []
+    summaries: List[str] = []
+    current_scores: List[int] = []
+    boosted_scores: List[int] = []
+    for destination, raw in zip(destinations, raws):
+        data = _load(raw)
+        if data is None:
+            logger.warning("Discarding unparseable sub-response", extra={"destination": destination})
+            continue
+        for option in data.get("recommendations") or []:
+            if isinstance(option, dict):
+                option.setdefault("country", destination)
+                options.append(option)
+        summary = data.get("insight_summary") or data.get("summary")
+        if summary:
+            summaries.append(str(summary).strip())
+        if "current_score" in data:
+            current_scores.append(_score(data.get("current_score")))
+        if "boosted_score" in data:
+            boosted_scores.append(_score(data.get("boosted_score")))
+
+    options.sort(key=rank_key)
+    merged = {
+        "current_score": max(current_scores) if current_scores else None,
+        "boosted_score": max(boosted_scores) if boosted_scores else None,
+        "insight_summary": " ".join(summaries),
+        "recommendations": options[:max_options],
+        "top_recommendation_index": 0,
+    }
+    return json.dumps(merged, ensure_ascii=False)
@@ -0,0 +1,408 @@
+"""
+DB-backed queue for long-running generations.
+
+Endpoints enqueue a row in `generation_jobs` and return its id right away;
+workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+workers (in the API processes or in run_worker.py) can share the table
+without claiming the same job twice.
+
+A claimed job is invisible to other workers until its `locked_until`
+passes. The worker extends that deadline while the handler runs; if the
+process dies, the job becomes claimable again once the visibility timeout
+expires. Failures are retried with linear backoff up to `max_attempts`.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import Settings, get_settings
+from app.database import SessionLocal
+from app.models import GenerationJob
+
+logger = logging.getLogger("jobs")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    id: int
+    user_id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+
+
+JobHandler = Callable[[ClaimedJob], Awaitable[Any]]
+_handlers: Dict[str, JobHandler] = {}
+
+
+def register_handler(kind: str, handler: JobHandler) -> None:
+    """Register the coroutine that runs jobs of `kind`; its return value is stored as the result."""
+    _handlers[kind] = handler
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def enqueue(
+    db: Session, user_id: int, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None
+) -> GenerationJob:
+    """Insert a queued job."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    job = GenerationJob(
+        user_id=user_id,
+        kind=kind,
+        dedupe_key=dedupe_key,
+        status=JOB_QUEUED,
+        payload=payload,
+        max_attempts=get_settings().job_max_attempts,
+        run_after=_utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    counters.incr("enqueued")
+    return job
+
+
+def find_pending(db: Session, user_id: int, kind: str, dedupe_key: str) -> Optional[GenerationJob]:
+    """The queued or running job of `kind` for the user with `dedupe_key`, if any."""
+    return db.query(GenerationJob).filter(
+        GenerationJob.user_id == user_id,
+        GenerationJob.kind == kind,
+        GenerationJob.dedupe_key == dedupe_key,
+        GenerationJob.status.in_((JOB_QUEUED, JOB_RUNNING)),
+    ).first()
+
+
+def enqueue_unique(
+    db: Session, user_id: int, kind: str, dedupe_key: str, payload: Dict[str, Any]
+) -> GenerationJob:
+    """
+    Enqueue a job unless one with the same key is already queued or running.
+
+    The partial unique index on (user_id, kind, dedupe_key) settles races:
+    when a concurrent request inserts first, this insert fails and the
+    winner's job is returned instead.
+    """
+    pending = find_pending(db, user_id, kind, dedupe_key)
+    if pending is not None:
+        return pending
+    try:
+        return enqueue(db, user_id, kind, payload, dedupe_key=dedupe_key)
+    except IntegrityError:
+        db.rollback()
+        pending = find_pending(db, user_id, kind, dedupe_key)
+        if pending is None:
+            raise
+        counters.incr("deduplicated")
+        return pending
+
+
+def get_job(db: Session, job_id: int, user_id: int) -> Optional[GenerationJob]:
+    return db.query(GenerationJob).filter(
+        GenerationJob.id == job_id,
+        GenerationJob.user_id == user_id,
+    ).first()
+
+
+def claim_next_job(worker_id: str, visibility_timeout: float) -> Optional[ClaimedJob]:
+    """
+    Claim the oldest runnable job: queued and due, or running with an expired
+    visibility timeout (its worker died).
+    """
+    db = SessionLocal()
+    try:
+        now = _utcnow()
+        job = (
+            db.query(GenerationJob)
+            .filter(
+                or_(
+                    (GenerationJob.status == JOB_QUEUED) & (GenerationJob.run_after <= now),
+                    (GenerationJob.status == JOB_RUNNING) & (GenerationJob.locked_until < now),
+                )
+            )
+            .order_by(GenerationJob.run_after, GenerationJob.id)
+            .with_for_update(skip_locked=True)
+            .limit(1)
+            .first()
+        )
+        if job is None:
+            db.rollback()
+            return None
+        if job.status == JOB_RUNNING:
+            counters.incr("visibility_expired")
+            if job.attempts >= job.max_attempts:
+                # Its worker died on the last attempt
+                job.status = JOB_FAILED
+                job.error = job.error or "Worker stopped before the job finished"
+                job.locked_until = None
+                job.finished_at = now
+                counters.incr("failed")
+                db.commit()
+                return None
+        job.status = JOB_RUNNING
+        job.attempts = (job.attempts or 0) + 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=visibility_timeout)
+        job.started_at = job.started_at or now
+        claimed = ClaimedJob(
+            id=job.id,
+            user_id=job.user_id,
+            kind=job.kind,
+            payload=job.payload or {},
+            attempts=job.attempts,
+            max_attempts=job.max_attempts,
+        )
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _update_claimed(job_id: int, worker_id: str, **values: Any) -> bool:
+    """Write to a job only while `worker_id` still holds it."""
+    db = SessionLocal()
+    try:
+        updated = db.query(GenerationJob).filter(
+            GenerationJob.id == job_id,
+            GenerationJob.status == JOB_RUNNING,
+            GenerationJob.locked_by == worker_id,
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+def extend_visibility(job_id: int, worker_id: str, visibility_timeout: float) -> bool:
+    return _update_claimed(
+        job_id, worker_id, locked_until=_utcnow() + timedelta(seconds=visibility_timeout)
+    )
+
+
+def complete_job(job_id: int, worker_id: str, result: Any) -> bool:
+    return _update_claimed(
+        job_id,
+        worker_id,
+        status=JOB_SUCCEEDED,
+        result=result,
+        error=None,
+        locked_until=None,
+        finished_at=_utcnow(),
+    )
+
+
+def fail_job(job: ClaimedJob, worker_id: str, error: str, retryable: bool, backoff_seconds: float) -> bool:
+    """Requeue with backoff while attempts remain, otherwise mark the job failed."""
+    if retryable and job.attempts < job.max_attempts:
+        counters.incr("retried")
+        return _update_claimed(
+            job.id,
+            worker_id,
+            status=JOB_QUEUED,
+            error=error,
+            locked_by=None,
+            locked_until=None,
+            run_after=_utcnow() + timedelta(seconds=backoff_seconds * job.attempts),
+        )
+    counters.incr("failed")
+    return _update_claimed(
+        job.id,
+        worker_id,
+        status=JOB_FAILED,
+        error=error,
+        locked_until=None,
+        finished_at=_utcnow(),
+    )
+
+
+class JobCounters:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.visibility_expired = 0
+        self.deduplicated = 0
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "retried": self.retried,
+                "visibility_expired": self.visibility_expired,
+                "deduplicated": self.deduplicated,
+            }
+
+
+counters = JobCounters()
+
+
+def queue_stats(db: Session) -> Dict[str, Any]:
+    """Queue depth per status and the age of the oldest waiting job."""
+    now = _utcnow()
+    depth = {
+        status: count
+        for status, count in db.query(GenerationJob.status, func.count(GenerationJob.id))
+        .group_by(GenerationJob.status)
+        .all()
+    }
+    oldest_queued = db.query(func.min(GenerationJob.created_at)).filter(
+        GenerationJob.status == JOB_QUEUED
+    ).scalar()
+    stalled = db.query(func.count(GenerationJob.id)).filter(
+        GenerationJob.status == JOB_RUNNING,
+        GenerationJob.locked_until < now,
+    ).scalar()
+    return {
+        "depth": {status: depth.get(status, 0) for status in (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)},
+        "oldest_queued_age_seconds": (
+            round((now - _as_utc(oldest_queued)).total_seconds(), 3) if oldest_queued else 0.0
+        ),
+        "running_past_visibility_timeout": stalled or 0,
+        "workers": job_worker.stats() if job_worker else None,
+        "counters": counters.snapshot(),
+    }
+
+
+class JobWorker:
+    """`concurrency` polling loops that claim and run jobs in this process."""
+
+    def __init__(self, settings: Settings, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.poll_seconds = settings.job_poll_seconds
+        self.visibility_timeout = settings.job_visibility_timeout_seconds
+        self.backoff_seconds = settings.job_retry_backoff_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._stopping = asyncio.Event()
+        self.busy = 0
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._loop(), name=f"job-worker-{idx}")
+            for idx in range(self.concurrency)
+        ]
+        logger.info("Started job workers", extra={"worker_id": self.worker_id, "concurrency": self.concurrency})
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        self.start()
+        await asyncio.gather(*self._tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"worker_id": self.worker_id, "concurrency": self.concurrency, "busy": self.busy}
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await run_in_threadpool(claim_next_job, self.worker_id, self.visibility_timeout)
+            except Exception as exc:
+                logger.error(f"Failed to claim job: {exc}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.busy += 1
+            try:
+                await self._run(job)
+            finally:
+                self.busy -= 1
+
+    async def _heartbeat(self, job: ClaimedJob) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            await run_in_threadpool(extend_visibility, job.id, self.worker_id, self.visibility_timeout)
+
+    async def _run(self, job: ClaimedJob) -> None:
+        handler = _handlers.get(job.kind)
+        if handler is None:
+            await run_in_threadpool(
+                fail_job, job, self.worker_id, f"No handler for job kind {job.kind!r}", False, 0
+            )
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await handler(job)
+        except HTTPException as exc:
+            # Client errors (missing intake, unknown visa option) will not
+            # succeed on a retry; upstream/server errors might.
+            await run_in_threadpool(
+                fail_job, job, self.worker_id, str(exc.detail), exc.status_code >= 500, self.backoff_seconds
+            )
+        except Exception as exc:
+            logger.error(f"Job {job.id} failed: {exc}", extra={"job_id": job.id, "kind": job.kind})
+            await run_in_threadpool(
+                fail_job, job, self.worker_id, str(exc), True, self.backoff_seconds
+            )
+        else:
+            if await run_in_threadpool(complete_job, job.id, self.worker_id, result):
+                counters.incr("succeeded")
+            else:
+                logger.warning("Job was reclaimed before it completed", extra={"job_id": job.id})
+        finally:
+            heartbeat.cancel()
+
+
+# The in-process worker, if this process runs one
+job_worker: Optional[JobWorker] = None
+
+
+def start_job_worker(settings: Settings) -> Optional[JobWorker]:
+    global job_worker
+    if settings.job_workers <= 0:
+        return None
+    job_worker = JobWorker(settings, settings.job_workers)
+    job_worker.start()
+    return job_worker
+
+
+async def stop_job_worker() -> None:
+    global job_worker
+    if job_worker is not None:
+        await job_worker.stop()
+        job_worker = None
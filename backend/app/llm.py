@@ -0,0 +1,67 @@
+"""
+Process-wide AsyncOpenAI client.
+
+One client (and therefore one HTTP connection pool) is created at startup and
+shared by every LLM-calling endpoint, so completions reuse warm keep-alive
+connections instead of paying a new TLS handshake per request.
+"""
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException, status
+from openai import AsyncOpenAI
+
+from app.config import Settings
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def create_openai_client(
+    settings: Settings, transport: Optional[httpx.AsyncBaseTransport] = None
+) -> AsyncOpenAI:
+    """
+    Build an AsyncOpenAI client with tuned keep-alive limits.
+
+    `transport` replaces the network transport, e.g. with a local stand-in
+    for the OpenAI API in tests.
+    """
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+            keepalive_expiry=settings.openai_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url or None,
+        http_client=http_client,
+        timeout=60,
+    )
+
+
+def init_openai_client(settings: Settings) -> None:
+    """Create the shared client at startup (no-op without an API key)."""
+    global _client
+    if _client is None and settings.openai_api_key:
+        _client = create_openai_client(settings)
+
+
+async def close_openai_client() -> None:
+    """Close the shared client's connection pool on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_openai_client(settings: Settings) -> AsyncOpenAI:
+    if not settings.openai_api_key:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OpenAI API key not configured.",
+        )
+    init_openai_client(settings)
+    return _client
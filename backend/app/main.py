@@ -1,25 +1,39 @@
+import asyncio
+import functools
 import json
+import re
 import logging
 import hashlib
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
-from fastapi import Depends, FastAPI, HTTPException, status, Response
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, status, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
-from openai import OpenAI
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import Integer
 from sqlalchemy import cast as sql_cast
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from app.config import Settings, get_settings
-from app.database import engine, get_db
+from app.database import SessionLocal, engine, get_db, pool_status, release_connection
 from app.models import (
-    Base, User, UserProfile, Recommendation, Document, ChecklistProgress, ChecklistCache,
+    Base, User, UserProfile, Recommendation, Document, ChecklistProgress, ChecklistCache, ChecklistContent,
     TravelAgentProfile, Conversation, Message, UserRole
 )
-from app.migrations import ensure_role_column, ensure_profile_picture_column
+from app.migrations import (
+    ensure_role_column,
+    ensure_profile_picture_column,
+    ensure_token_version_column,
+    ensure_recommendation_parser_version_column,
+    ensure_recommendation_schema_version_column,
+    ensure_checklist_cache_content_column,
+    ensure_checklist_progress_unique_constraint,
+    ensure_generation_job_dedupe_key,
+)
 from app.schemas import (
     IntakeCreate,
     IntakeData,
@@ -43,8 +57,11 @@ from app.schemas import (
     ChecklistResponse,
     ChecklistFetchRequest,
     ChecklistCachedResponse,
+    ChecklistStepRequest,
+    ChecklistStepResponse,
     ChecklistProgressCreate,
     ChecklistProgressUpdate,
+    ChecklistProgressDelta,
     ChecklistProgressResponse,
     TravelAgentOnboardingData,
     TravelAgentProfileCreate,
@@ -59,6 +76,11 @@ from app.schemas import (
     ChatRequest,
     ChatResponse,
     ChatMessage,
+    JobAcceptedResponse,
+    JobStatusResponse,
+    EligibilityWhatIfRequest,
+    EligibilityWhatIfResponse,
+    EligibilityProgramResult,
 )
 
 # Setup logging for recommendations
@@ -66,20 +88,64 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("recommendations")
 from app.storage import IntakeStore
 from app.auth import (
-    get_password_hash,
     authenticate_user,
     create_access_token,
     get_user_by_email,
     get_current_active_user,
+    get_current_active_principal,
+    invalidate_principal,
+    token_claims_for,
+    Principal,
+    principal_cache,
+    require_internal_token,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 from app.oauth import verify_google_token
+from app.llm import close_openai_client, get_openai_client, init_openai_client
+from app.passwords import hash_password_async, password_pool
+from app.streaming import RecommendationStreamParser, sse_event
+from app.parsing import (
+    PARSER_VERSION,
+    parse_recommendation,
+    parse_recommendation_option,
+    reparse_stored,
+    response_from_output,
+    stored_output,
+)
+from app import recommendation_cache
+from app.recommendation_cache import intake_cache_key
+from app.singleflight import generation_flight
+from app.fanout import merge_responses, split_destinations
+from app.checklist_catalog import get_catalog as get_checklist_catalog
+from app import checklist_store
+from app.warming import WarmItem, checklist_warmer
+from app.progress import progress_coalescer
+from app import persistence
+from app.eligibility import get_program_table, prompt_candidates, score_programs
+from app.prompts import (
+    RECOMMENDATION_PROMPT_VERSION,
+    RECOMMENDATION_SCHEMA_VERSION,
+    CHECKLIST_DETAIL_FIELDS,
+    build_checklist_outline_prompt,
+    build_checklist_prompt,
+    build_checklist_step_prompt,
+    build_destination_prompt,
+    build_recommendation_prompt,
+    log_usage,
+)
+from app import jobs
 
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 ensure_role_column(engine)
 ensure_profile_picture_column(engine)
+ensure_token_version_column(engine)
+ensure_recommendation_parser_version_column(engine)
+ensure_recommendation_schema_version_column(engine)
+ensure_checklist_cache_content_column(engine)
+ensure_checklist_progress_unique_constraint(engine)
+ensure_generation_job_dedupe_key(engine)
 
 # Single in-memory store so intakes persist across requests during runtime
 store = IntakeStore()
@@ -89,15 +155,6 @@ def get_store() -> IntakeStore:
     return store
 
 
-def get_openai_client(settings: Settings) -> OpenAI:
-    if not settings.openai_api_key:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="OpenAI API key not configured.",
-        )
-    return OpenAI(api_key=settings.openai_api_key, timeout=60)
-
-
 from fastapi.encoders import jsonable_encoder
 
 # Custom JSON encoder for datetime
@@ -132,12 +189,128 @@ def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+# Operational metrics; only served to callers presenting INTERNAL_API_TOKEN
+internal = APIRouter(
+    prefix="/internal",
+    dependencies=[Depends(require_internal_token)],
+    include_in_schema=False,
+)
+
+
+@internal.get("/principal-cache")
+def principal_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the authenticated principal cache."""
+    return principal_cache.stats()
+
+
+@internal.get("/pool")
+def database_pool_stats() -> Dict[str, Any]:
+    """Connection pool occupancy and checkout wait-time histogram."""
+    return pool_status()
+
+
+@internal.get("/recommendation-cache")
+def recommendation_cache_stats(db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """Hit rate of the shared (cross-user) recommendation cache."""
+    return recommendation_cache.stats(db)
+
+
+@internal.get("/password-pool")
+def password_pool_stats() -> Dict[str, Any]:
+    """Occupancy and rejection counters for the bcrypt worker pool."""
+    return password_pool.stats()
+
+
+@internal.get("/single-flight")
+def single_flight_stats() -> Dict[str, Any]:
+    """Coalescing counters for duplicate in-flight generations."""
+    return generation_flight.stats()
+
+
+@internal.get("/checklist-catalog")
+def checklist_catalog_stats() -> Dict[str, Any]:
+    """Size and hit rate of the curated checklist catalog."""
+    return get_checklist_catalog().stats()
+
+
+@internal.get("/checklist-store")
+def checklist_store_stats(db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """Reuse of checklist content shared across users."""
+    return checklist_store.stats(db)
+
+
+@internal.get("/checklist-warming")
+def checklist_warming_stats() -> Dict[str, Any]:
+    """Speculative checklist generations after recommendations."""
+    return checklist_warmer.stats()
+
+
+@internal.get("/checklist-progress")
+def checklist_progress_write_stats() -> Dict[str, Any]:
+    """PATCH /checklist/progress requests versus coalesced writes."""
+    return progress_coalescer.stats()
+
+
+@internal.get("/jobs")
+def job_queue_stats(db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """Depth and age of the background generation queue."""
+    return jobs.queue_stats(db)
+
+
+app.include_router(internal)
+
+
+@app.on_event("startup")
+def startup_openai_client() -> None:
+    init_openai_client(get_settings())
+
+
+@app.on_event("startup")
+async def startup_job_worker() -> None:
+    jobs.start_job_worker(get_settings())
+
+
+@app.on_event("shutdown")
+async def shutdown_job_worker() -> None:
+    await jobs.stop_job_worker()
+
+
+@app.on_event("shutdown")
+async def shutdown_checklist_warmer() -> None:
+    await checklist_warmer.stop()
+
+
+@app.on_event("shutdown")
+async def shutdown_openai_client() -> None:
+    await close_openai_client()
+
+
+@app.on_event("shutdown")
+def shutdown_password_pool() -> None:
+    password_pool.shutdown()
+
+
+def _insert_user(db: Session, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Insert a user in one statement; None if the email is already taken."""
+    created = persistence.insert_returning(db, User, values, ignore_conflicts_on=("email",))
+    db.commit()
+    return created
+
+
+def _upsert_onboarding_profile(
+    db: Session, model: Any, user_id: int, onboarding_data: Optional[Any]
+) -> Dict[str, Any]:
+    profile = persistence.upsert_onboarding_profile(db, model, user_id, onboarding_data)
+    db.commit()
+    return profile
+
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user with optional role selection"""
     # Check if user already exists
-    db_user = get_user_by_email(db, email=user_data.email)
+    db_user = await run_in_threadpool(get_user_by_email, db, user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -155,28 +328,31 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
                 detail=f"Invalid role. Must be 'USER' or 'TRAVEL_AGENT'"
             )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    db_user = User(
-        email=user_data.email,
-        name=user_data.name,
-        hashed_password=hashed_password,
-        role=role
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    # Create new user (bcrypt runs on the dedicated password pool)
+    hashed_password = await hash_password_async(user_data.password)
+    db_user = await run_in_threadpool(_insert_user, db, {
+        "email": user_data.email,
+        "name": user_data.name,
+        "hashed_password": hashed_password,
+        "role": role,
+    })
+    if db_user is None:
+        # Registered concurrently since the check above
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     return db_user
 
 
 @app.post("/auth/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """Login and get access token"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -185,7 +361,7 @@ def login(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=token_claims_for(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -203,6 +379,7 @@ def update_current_user_info(
     db: Session = Depends(get_db)
 ):
     """Update current user information"""
+    previous_email = current_user.email
     # Check if email is being changed and if it's already taken
     if user_update.email and user_update.email != current_user.email:
         existing_user = get_user_by_email(db, email=user_update.email)
@@ -221,7 +398,9 @@ def update_current_user_info(
         current_user.profile_picture_url = user_update.profile_picture_url
     
     db.commit()
+    invalidate_principal(previous_email)
     db.refresh(current_user)
+    invalidate_principal(current_user.email)
     return current_user
 
 
@@ -268,7 +447,7 @@ async def login_with_google(
         # Generate JWT token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data=token_claims_for(user), expires_delta=access_token_expires
         )
         
         return {"access_token": access_token, "token_type": "bearer"}
@@ -307,37 +486,7 @@ def create_user_profile(
     db: Session = Depends(get_db)
 ):
     """Create or update user profile with onboarding data"""
-    # Check if profile already exists
-    existing_profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
-    
-    if existing_profile:
-        # Update existing profile
-        if profile_data.onboarding_data:
-            # Keep existing data and merge with new data, preserving all fields including nulls
-            existing_data = existing_profile.onboarding_data or {}
-            new_data = profile_data.onboarding_data.model_dump(exclude_none=False)
-            # Merge: new_data overwrites existing_data, but we keep all fields
-            merged_data = {**existing_data, **new_data}
-            existing_profile.onboarding_data = merged_data
-        existing_profile.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_profile)
-        return existing_profile
-    else:
-        # Create new profile
-        onboarding_dict = None
-        if profile_data.onboarding_data:
-            # Store all fields including nulls so users can fill them in later
-            onboarding_dict = profile_data.onboarding_data.model_dump(exclude_none=False)
-        
-        new_profile = UserProfile(
-            user_id=current_user.id,
-            onboarding_data=onboarding_dict
-        )
-        db.add(new_profile)
-        db.commit()
-        db.refresh(new_profile)
-        return new_profile
+    return _upsert_onboarding_profile(db, UserProfile, current_user.id, profile_data.onboarding_data)
 
 
 @app.put("/profile", response_model=UserProfileResponse)
@@ -347,34 +496,7 @@ def update_user_profile(
     db: Session = Depends(get_db)
 ):
     """Update user profile onboarding data"""
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
-    
-    if not profile:
-        # Create profile if it doesn't exist
-        onboarding_dict = None
-        if profile_data.onboarding_data:
-            # Store all fields including nulls so users can fill them in later
-            onboarding_dict = profile_data.onboarding_data.model_dump(exclude_none=False)
-        
-        profile = UserProfile(
-            user_id=current_user.id,
-            onboarding_data=onboarding_dict
-        )
-        db.add(profile)
-    else:
-        # Update existing profile
-        if profile_data.onboarding_data:
-            # Merge with existing data, preserving all fields including nulls
-            existing_data = profile.onboarding_data or {}
-            new_data = profile_data.onboarding_data.model_dump(exclude_none=False)
-            # Merge: new_data overwrites existing_data, preserving all fields
-            merged_data = {**existing_data, **new_data}
-            profile.onboarding_data = merged_data
-        profile.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(profile)
-    return profile
+    return _upsert_onboarding_profile(db, UserProfile, current_user.id, profile_data.onboarding_data)
 
 
 @app.post("/intakes", response_model=IntakeRecord, status_code=status.HTTP_201_CREATED)
@@ -397,280 +519,57 @@ def get_intake(
     return record
 
 
-def build_prompt(intake: IntakeData) -> str:
-    payload = intake.model_dump(exclude_none=True)
-    return (
-        "You are JAPA Visa Strategist, an expert immigration recommender system.\n\n"
-        "Your task:\n"
-        "Given structured or unstructured user data, analyze eligibility and recommend the top "
-        "immigration or visa pathways.\n\n"
-        "CRITICAL LANGUAGE RULES:\n"
-        "- Always use 'you' and 'your' instead of 'the applicant', 'applicant', 'applicant's', etc.\n"
-        "- Write as if speaking directly to the user (second person)\n"
-        "- Example: 'You have a solid background' NOT 'The applicant has a solid background'\n\n"
-        "Rules:\n"
-        "1. You MUST return ONLY valid JSON matching the schema below.\n"
-        "2. All fields are required and must never be omitted.\n"
-        "3. If information is unknown or uncertain, respond with null, \"\", or \"unknown\" instead of "
-        "hallucinating.\n"
-        "4. Scores must be integers between 0 and 100.\n"
-        "5. Status must be one of: \"eligible\", \"possible\", \"unlikely\", \"not_eligible\".\n"
-        "6. Recommendations must be no more than 3 total, ordered from strongest match to weakest.\n"
-        "7. The \"top_recommendation\" field must exactly repeat the strongest recommendation object.\n\n"
-        "JSON Schema (fill every field):\n\n"
-        "{\n"
-        "  \"current_score\": 0-100,\n"
-        "  \"boosted_score\": 0-100,\n"
-        "  \"insight_summary\": \"Short paragraph analysis of your readiness.\",\n"
-        "  \"recommendations\": [\n"
-        "    {\n"
-        "      \"visa_name\": \"string\",\n"
-        "      \"visa_type_code\": \"string\",\n"
-        "      \"country\": \"string\",\n"
-        "      \"category\": \"immigration | work | study | investment | family\",\n"
-        "      \"score\": 0-100,\n"
-        "      \"boosted_score\": 0-100,\n"
-        "      \"status\": \"eligible | possible | unlikely | not_eligible\",\n"
-        "      \"estimated_cost\": \"string (e.g., '$1,500' or 'Varies')\",\n"
-        "      \"processing_time\": \"string (REQUIRED - e.g., '2-4 weeks', '3-6 months', '1-2 years')\",\n"
-        "      \"eligibility_summary\": \"1-2 sentences explaining match level.\",\n"
-        "      \"improvement_actions\": [\"string\", \"...\"],\n"
-        "      \"overview\": \"Contextual summary of the visa/program.\",\n"
-        "      \"who_is_it_for\": [\"bullet\", \"...\"],\n"
-        "      \"quick_facts\": [\"bullet\", \"...\"],\n"
-        "      \"requirements\": [\"bullet\", \"...\"],\n"
-        "      \"benefits\": [\"bullet\", \"...\"],\n"
-        "      \"success_boost\": [\"bullet actions to increase eligibility\"],\n"
-        "      \"match_summary\": \"Sentence explaining why you fit or don't fit.\",\n"
-        "      \"timeline\": [\n"
-        "        {\"stage\": \"string\", \"description\": \"string\", \"duration\": \"string\"}\n"
-        "      ],\n"
-        "      \"checklist\": [\n"
-        "        {\n"
-        "          \"title\": \"string\",\n"
-        "          \"description\": \"string\",\n"
-        "          \"documents\": [\"string\"],\n"
-        "          \"owner\": \"applicant | JAPA\",\n"
-        "          \"due_in\": \"string\",\n"
-        "          \"guidance\": \"string\"\n"
-        "        }\n"
-        "      ],\n"
-        "      \"tips\": [\"string\"],\n"
-        "      \"resources\": [\"string\"],\n"
-        "      \"call_to_actions\": [\n"
-        "        {\"label\": \"string\", \"action_type\": \"string\", \"href\": \"string or null\"}\n"
-        "      ]\n"
-        "    }\n"
-        "  ],\n"
-        "  \"top_recommendation\": { ...same object as first recommendation... }\n"
-        "}\n\n"
-        "Return only JSON. Do not add explanations outside the JSON.\n\n"
-        "IMPORTANT: In all text fields (insight_summary, eligibility_summary, match_summary, reasoning, overview, description), "
-        "always use 'you' and 'your' instead of 'the applicant', 'applicant', 'applicant's', etc. "
-        "Write as if speaking directly to the user.\n\n"
-        f"User intake JSON: {json.dumps(payload, ensure_ascii=False)}"
-    )
-
+def _load_cached_recommendation(db: Session, user_id: int) -> Optional[RecommendationResponse]:
+    """
+    Return the user's most recent stored recommendation, if any.
 
-def parse_recommendation(raw: str) -> Optional[RecommendationResponse]:
-    try:
-        data: Dict[str, Any] = json.loads(raw)
-    except json.JSONDecodeError:
-        logger.warning(f"Failed to parse JSON from ChatGPT response")
+    output_data is served as stored when it was produced by the current
+    parser; older rows are reparsed from raw_response once and written back.
+    A row the current parser cannot read keeps its output_data but is still
+    stamped with PARSER_VERSION, so the attempt is not repeated on every read.
+    """
+    cached = db.query(Recommendation).filter(
+        Recommendation.user_id == user_id
+    ).order_by(Recommendation.created_at.desc()).first()
+    if not cached:
         return None
 
-    logger.info(f"Parsing ChatGPT response with keys: {list(data.keys())}")
-    
-    # Try to find recommendations in various possible locations
-    recommendations_list = (
-        data.get("recommendations") or 
-        data.get("options") or 
-        data.get("visa_options") or
-        []
-    )
-    
-    if not recommendations_list and "top_recommendation" in data:
-        # If only top_recommendation exists, use it as a single-item list
-        recommendations_list = [data["top_recommendation"]]
-    
-    recs = []
-    for opt in recommendations_list:
-        if not isinstance(opt, dict):
-            continue
-        
-        # Extract visa type from various possible field names
-        visa_type = (
-            opt.get("visa_type") or
-            opt.get("visa_name") or 
-            opt.get("visa_type_code") or 
-            opt.get("name") or
-            opt.get("title") or
-            "Visa option"
-        )
-        
-        # Extract reasoning/description
-        reasoning = (
-            opt.get("reasoning") or
-            opt.get("match_summary") or
-            opt.get("eligibility_summary") or
-            opt.get("overview") or
-            opt.get("description") or
-            opt.get("summary") or
-            "See details"
-        )
-        # Replace "the applicant" / "applicant" with "you" / "your" for better user experience
-        if reasoning:
-            reasoning = reasoning.replace("the applicant", "you")
-            reasoning = reasoning.replace("The applicant", "You")
-            reasoning = reasoning.replace("applicant's", "your")
-            reasoning = reasoning.replace("Applicant's", "Your")
-            reasoning = reasoning.replace("applicant", "you")
-        
-        # Extract likelihood/status
-        likelihood = (
-            opt.get("likelihood") or
-            opt.get("status") or
-            opt.get("eligibility") or
-            "possible"
-        )
-        
-        # Extract timeline - prioritize processing_time from AI response
-        estimated_timeline = (
-            opt.get("processing_time") or
-            opt.get("estimated_timeline") or
-            opt.get("timeline") if isinstance(opt.get("timeline"), str) else None
-        )
-        
-        # Extract costs
-        estimated_costs = (
-            opt.get("estimated_costs") or
-            opt.get("estimated_cost") or
-            opt.get("cost") or
-            opt.get("fees")
-        )
-        
-        # Extract requirements / documents (separate from risk flags)
-        requirements = (
-            opt.get("requirements") or
-            opt.get("documents") or
-            []
-        )
-        if isinstance(requirements, str):
-            requirements = [requirements]
-
-        # Extract checklist (structured tasks)
-        checklist = opt.get("checklist") or []
-        if isinstance(checklist, dict):
-            checklist = [checklist]
-        if not isinstance(checklist, list):
-            checklist = []
-
-        # Extract risk flags / key points
-        risk_flags = (
-            opt.get("risk_flags") or
-            opt.get("quick_facts") or
-            opt.get("challenges") or
-            []
-        )
-        if isinstance(risk_flags, str):
-            risk_flags = [risk_flags]
-        
-        # Extract next steps
-        next_steps = (
-            opt.get("next_steps") or
-            opt.get("success_boost") or
-            opt.get("improvement_actions") or
-            opt.get("action_items") or
-            []
-        )
-        if isinstance(next_steps, str):
-            next_steps = [next_steps]
-        
-        recs.append(
-            RecommendationOption(
-                visa_type=visa_type,
-                reasoning=reasoning,
-                likelihood=likelihood,
-                estimated_timeline=estimated_timeline,
-                estimated_costs=estimated_costs,
-                risk_flags=risk_flags if risk_flags else None,
-                next_steps=next_steps if next_steps else None,
-                checklist=checklist if checklist else None,
-                requirements=requirements if requirements else None,
-            )
-        )
-    
-    logger.info(f"Parsed {len(recs)} recommendation options")
-    
-    # Extract summary
-    summary = (
-        data.get("summary") or
-        data.get("insight_summary") or
-        data.get("overview") or
-        data.get("introduction") or
-        "Based on your profile, here are your visa recommendations."
-    )
+    logger.info(f"Returning cached recommendation", extra={
+        "user_id": user_id,
+        "recommendation_id": cached.id,
+        "used_cache": True,
+        "parser_version": cached.parser_version,
+    })
 
-    return RecommendationResponse(
-        summary=summary,
-        options=recs,
-        notes=data.get("notes"),
-        raw_message=raw,
-    )
+    if cached.parser_version != PARSER_VERSION:
+        output = reparse_stored(cached.raw_response, cached.schema_version)
+        if output is not None:
+            cached.output_data = output
+        else:
+            logger.warning("Stored recommendation could not be reparsed; keeping its output", extra={
+                "user_id": user_id,
+                "recommendation_id": cached.id,
+            })
+        cached.parser_version = PARSER_VERSION
+        db.commit()
+
+    if cached.output_data:
+        return response_from_output(cached.output_data, cached.raw_response)
+    return None
 
 
-@app.post("/recommendations", response_model=RecommendationResponse)
-def get_recommendation(
+def _resolve_intake(
+    db: Session,
+    store: IntakeStore,
     request: RecommendationRequest,
-    settings: Settings = Depends(get_settings),
-    store: IntakeStore = Depends(get_store),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-) -> RecommendationResponse:
+    user_id: int,
+) -> IntakeData:
     """
-    Get visa recommendations.
-    
-    - use_cached=True (default): Return the most recent stored recommendation for this user
-    - use_cached=False: Call ChatGPT, store the response, then return it
+    Resolve the intake for a generation request (read phase).
+
+    The pooled connection is released before returning so it is not held
+    through the LLM call that follows.
     """
-    user_id = current_user.id
-    
-    # If use_cached is True, try to return stored recommendation
-    if request.use_cached:
-        cached = db.query(Recommendation).filter(
-            Recommendation.user_id == user_id
-        ).order_by(Recommendation.created_at.desc()).first()
-        
-        if cached and cached.raw_response:
-            logger.info(f"Returning cached recommendation", extra={
-                "user_id": user_id,
-                "recommendation_id": cached.id,
-                "used_cache": True,
-            })
-            # Re-parse the raw response with the improved parser
-            # This ensures old cached data is parsed correctly too
-            parsed = parse_recommendation(cached.raw_response)
-            if parsed and parsed.options:
-                parsed.source = "cache"
-                return parsed
-            
-            # Fallback to stored output_data if parsing fails
-            if cached.output_data:
-                return RecommendationResponse(
-                    summary=cached.output_data.get("summary", "Cached recommendation"),
-                    options=[RecommendationOption(**opt) for opt in cached.output_data.get("options", [])],
-                    notes=cached.output_data.get("notes"),
-                    source="cache",
-                    raw_message=cached.raw_response,
-                )
-        
-        # No cached data exists, inform the user
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No cached recommendation found. Call with use_cached=False to generate one.",
-        )
-    
-    # use_cached is False - call OpenAI and store the result
     intake: Optional[IntakeData] = None
     
     # Try to get intake from request
@@ -688,47 +587,46 @@ def get_recommendation(
         profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
         if profile and profile.onboarding_data:
             intake = IntakeData(**profile.onboarding_data)
+    release_connection(db)
     
     if not intake:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No intake data provided. Provide intake, intake_id, or complete onboarding first.",
         )
+    return intake
+
+
+def _store_recommendation(
+    db: Session,
+    user_id: int,
+    intake: IntakeData,
+    parsed: RecommendationResponse,
+    content: str,
+) -> Recommendation:
+    """Persist a generated recommendation (write phase)."""
+    recommendation_record = Recommendation(
+        user_id=user_id,
+        input_data=intake.model_dump(exclude_none=True),
+        output_data=stored_output(parsed),
+        raw_response=content,
+        parser_version=PARSER_VERSION,
+        schema_version=RECOMMENDATION_SCHEMA_VERSION,
+    )
+    db.add(recommendation_record)
+    db.commit()
+    db.refresh(recommendation_record)
     
-    # Log the request
-    logger.info(f"Calling OpenAI for recommendation", extra={
+    logger.info(f"Stored new recommendation", extra={
         "user_id": user_id,
+        "recommendation_id": recommendation_record.id,
         "used_cache": False,
-        "input_summary": {
-            "nationality": intake.nationality,
-            "destinations": intake.preferred_destinations,
-            "education": intake.education_level,
-        },
     })
-    
-    prompt = build_prompt(intake)
-    
-    # Get OpenAI client
-    client = get_openai_client(settings)
-    
-    try:
-        completion = client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": "You are a concise visa recommendation engine."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            timeout=60,
-        )
-        content = completion.choices[0].message.content or ""
-    except Exception as exc:
-        logger.error(f"OpenAI request failed: {exc}", extra={"user_id": user_id})
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"OpenAI request failed: {exc}",
-        ) from exc
-    
+    return recommendation_record
+
+
+def _parse_generated_recommendation(content: str) -> RecommendationResponse:
+    """Parse a fresh model response, falling back to the raw text."""
     # Log the raw ChatGPT response
     logger.info("=" * 60)
     logger.info("RAW CHATGPT RESPONSE:")
@@ -736,86 +634,468 @@ def get_recommendation(
     logger.info(content)
     logger.info("=" * 60)
     
-    # Parse the response
-    parsed = parse_recommendation(content)
+    parsed = parse_recommendation(content, RECOMMENDATION_SCHEMA_VERSION)
     if not parsed:
         logger.warning("Failed to parse ChatGPT response as JSON")
-        parsed = RecommendationResponse(
+        return RecommendationResponse(
             summary="Unable to parse structured response. Showing raw model output.",
             options=[],
             notes=["Model returned unstructured text; please retry."],
             raw_message=content,
         )
-    else:
-        parsed.raw_message = content
-        # Log the parsed result
-        logger.info("PARSED RECOMMENDATION:")
-        logger.info(f"  Summary: {parsed.summary}")
-        logger.info(f"  Options count: {len(parsed.options)}")
-        for i, opt in enumerate(parsed.options):
-            logger.info(f"  Option {i+1}: {opt.visa_type} - {opt.likelihood} - Timeline: {opt.estimated_timeline or 'MISSING'}")
-    
-    # Store the recommendation in the database
-    recommendation_record = Recommendation(
-        user_id=user_id,
-        input_data=intake.model_dump(exclude_none=True),
-        output_data={
-            "summary": parsed.summary,
-            "options": [opt.model_dump() for opt in parsed.options],
-            "notes": parsed.notes,
-        },
-        raw_response=content,
-    )
-    db.add(recommendation_record)
-    db.commit()
-    db.refresh(recommendation_record)
-    
-    logger.info(f"Stored new recommendation", extra={
+    parsed.raw_message = content
+    # Log the parsed result
+    logger.info("PARSED RECOMMENDATION:")
+    logger.info(f"  Summary: {parsed.summary}")
+    logger.info(f"  Options count: {len(parsed.options)}")
+    for i, opt in enumerate(parsed.options):
+        logger.info(f"  Option {i+1}: {opt.visa_type} - {opt.likelihood} - Timeline: {opt.estimated_timeline or 'MISSING'}")
+    return parsed
+
+
+def _log_generation_request(user_id: int, intake: IntakeData) -> None:
+    logger.info(f"Calling OpenAI for recommendation", extra={
         "user_id": user_id,
-        "recommendation_id": recommendation_record.id,
         "used_cache": False,
+        "input_summary": {
+            "nationality": intake.nationality,
+            "destinations": intake.preferred_destinations,
+            "education": intake.education_level,
+        },
     })
-    
-    parsed.source = "openai"
-    return parsed
 
 
-@app.get(
-    "/recommendations/history",
-    response_model=List[RecommendationRecord],
-    # History is used for UI lists; exclude large blobs to keep payload fast.
-    response_model_exclude={"__all__": {"raw_response", "input_data"}},
-)
-def get_recommendation_history(
+@app.post("/recommendations", response_model=RecommendationResponse)
+async def get_recommendation(
+    request: RecommendationRequest,
+    settings: Settings = Depends(get_settings),
+    store: IntakeStore = Depends(get_store),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
-    limit: int = 10,
-) -> List[RecommendationRecord]:
-    """
-    Get all stored recommendations for the current user, ordered by most recent first.
+) -> RecommendationResponse:
     """
-    recommendations = db.query(Recommendation).filter(
-        Recommendation.user_id == current_user.id
-    ).order_by(Recommendation.created_at.desc()).limit(limit).all()
+    Get visa recommendations.
     
-    logger.info(f"Retrieved recommendation history", extra={
-        "user_id": current_user.id,
-        "count": len(recommendations),
-    })
+    - use_cached=True (default): Return the most recent stored recommendation for this user
+    - use_cached=False: Call ChatGPT, store the response, then return it
+    """
+    user_id = current_user.id
     
-    # Debug: Log the first recommendation's created_at
-    if recommendations:
-        logger.info(f"First recommendation created_at: {recommendations[0].created_at}, type: {type(recommendations[0].created_at)}")
+    # If use_cached is True, try to return stored recommendation
+    if request.use_cached:
+        cached = await run_in_threadpool(_load_cached_recommendation, db, user_id)
+        if cached:
+            return cached
+        
+        # No cached data exists, inform the user
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No cached recommendation found. Call with use_cached=False to generate one.",
+        )
     
-    return recommendations
+    # use_cached is False - call OpenAI and store the result
+    intake = await run_in_threadpool(_resolve_intake, db, store, request, user_id)
+    if request.enqueue:
+        return await _enqueue_generation(
+            db, user_id, "recommendation", {"intake": intake.model_dump(mode="json", exclude_none=True)}
+        )
+    return await regenerate_recommendation(db, settings, user_id, intake)
 
 
-@app.get("/recommendations/{recommendation_id}", response_model=RecommendationRecord)
-def get_recommendation_by_id(
-    recommendation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-) -> RecommendationRecord:
+async def regenerate_recommendation(
+    db: Session,
+    settings: Settings,
+    user_id: int,
+    intake: IntakeData,
+) -> RecommendationResponse:
+    """generate_recommendation, coalesced with identical in-flight requests."""
+    # Double-clicked "Regenerate" and client retries share one generation
+    intake_key = intake_cache_key(intake, RECOMMENDATION_PROMPT_VERSION, settings.openai_model)
+    flight_key = f"recommendation:{user_id}:{intake_key}"
+
+    async def recheck(waited_since: datetime) -> Optional[RecommendationResponse]:
+        return await run_in_threadpool(
+            _recommendation_stored_since, db, user_id, waited_since, intake_key, settings.openai_model
+        )
+
+    async def generate() -> RecommendationResponse:
+        response = await generate_recommendation(db, settings, user_id, intake)
+        # Users usually open the top options' checklists next
+        _warm_checklists(settings, user_id, response)
+        return response
+
+    return await generation_flight.do(flight_key, generate, recheck=recheck)
+
+
+def _recommendation_stored_since(
+    db: Session, user_id: int, since: datetime, intake_key: str, model: str
+) -> Optional[RecommendationResponse]:
+    """
+    The recommendation another worker stored for this same intake while we
+    waited, if any. Rows for the user's other intakes (e.g. a regeneration
+    with edited answers that finished meanwhile) are not handed over.
+    """
+    try:
+        rows = db.query(Recommendation).filter(
+            Recommendation.user_id == user_id,
+            Recommendation.created_at >= since,
+        ).order_by(Recommendation.created_at.desc()).all()
+        for row in rows:
+            if not row.output_data or not row.input_data:
+                continue
+            try:
+                stored_intake = IntakeData.model_validate(row.input_data)
+            except ValidationError:
+                continue
+            if intake_cache_key(stored_intake, RECOMMENDATION_PROMPT_VERSION, model) == intake_key:
+                return response_from_output(row.output_data, row.raw_response)
+        return None
+    finally:
+        release_connection(db)
+
+
+async def _complete_recommendation(settings: Settings, prompt: str, user_id: int) -> str:
+    """Run the recommendation prompt through the model and return its text."""
+    client = get_openai_client(settings)
+    try:
+        completion = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=[
+                {"role": "system", "content": "You are a concise visa recommendation engine."},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.2,
+            timeout=60,
+        )
+        log_usage("recommendation", prompt, completion.usage, user_id=user_id)
+        return completion.choices[0].message.content or ""
+    except Exception as exc:
+        logger.error(f"OpenAI request failed: {exc}", extra={"user_id": user_id})
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"OpenAI request failed: {exc}",
+        ) from exc
+
+
+def _prescreen(
+    settings: Settings, intake: IntakeData, destination: Optional[str] = None
+) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Locally ranked candidate programs for the prompt, if pre-filtering is on.
+
+    Only programs in `destination`, or else the intake's preferred
+    destinations, are listed; without either there is no candidate block.
+    """
+    if not settings.eligibility_prefilter_enabled:
+        return None
+    destinations = [destination] if destination else split_destinations(intake.preferred_destinations)
+    if not destinations:
+        return None
+    return prompt_candidates(intake, settings.eligibility_max_candidates, destinations)
+
+
+def _fanout_destinations(settings: Settings, intake: IntakeData) -> List[str]:
+    """Destinations to generate separately, or [] for a single completion."""
+    if not settings.recommendation_fanout_enabled:
+        return []
+    destinations = split_destinations(
+        intake.preferred_destinations, settings.recommendation_fanout_max_destinations
+    )
+    return destinations if len(destinations) > 1 else []
+
+
+async def _complete_fanout(
+    settings: Settings,
+    intake: IntakeData,
+    destinations: List[str],
+    user_id: int,
+) -> str:
+    """
+    Run one completion per destination, at most
+    RECOMMENDATION_FANOUT_CONCURRENCY at a time, and merge the results.
+
+    Destinations whose completion fails are left out; the request only fails
+    if all of them do.
+    """
+    semaphore = asyncio.Semaphore(settings.recommendation_fanout_concurrency)
+
+    async def complete_destination(destination: str) -> str:
+        prompt = build_destination_prompt(intake, destination, _prescreen(settings, intake, destination))
+        async with semaphore:
+            return await _complete_recommendation(settings, prompt, user_id)
+
+    results = await asyncio.gather(
+        *(complete_destination(destination) for destination in destinations),
+        return_exceptions=True,
+    )
+    succeeded = [
+        (destination, result)
+        for destination, result in zip(destinations, results)
+        if isinstance(result, str)
+    ]
+    failed = [result for result in results if isinstance(result, BaseException)]
+    logger.info("Fan-out recommendation completed", extra={
+        "user_id": user_id,
+        "destinations": destinations,
+        "failed": len(failed),
+    })
+    if not succeeded:
+        raise failed[0]
+    return merge_responses(
+        [destination for destination, _ in succeeded],
+        [result for _, result in succeeded],
+        settings.recommendation_fanout_max_options,
+    )
+
+
+def _lookup_shared_recommendation(db: Session, cache_key: str) -> Optional[str]:
+    try:
+        return recommendation_cache.lookup(db, cache_key)
+    finally:
+        release_connection(db)
+
+
+def _store_shared_recommendation(
+    db: Session,
+    user_id: int,
+    cache_key: str,
+    cache_model: str,
+    content: str,
+    ttl_seconds: int,
+) -> None:
+    """Best effort: the user's recommendation is already saved, so a failed cache write is only logged."""
+    try:
+        recommendation_cache.store(db, cache_key, cache_model, RECOMMENDATION_PROMPT_VERSION, content, ttl_seconds)
+    except SQLAlchemyError as exc:
+        db.rollback()
+        logger.warning(
+            f"Failed to store shared recommendation: {exc}",
+            extra={"user_id": user_id, "cache_key": cache_key},
+        )
+    finally:
+        release_connection(db)
+
+
+async def generate_recommendation(
+    db: Session,
+    settings: Settings,
+    user_id: int,
+    intake: IntakeData,
+) -> RecommendationResponse:
+    """
+    Produce and store a fresh recommendation for `intake`.
+
+    Materially identical intakes (see app.recommendation_cache) are served
+    from the shared cache instead of calling the model. With fan-out enabled,
+    an intake naming several destinations gets one completion per destination.
+    """
+    destinations = _fanout_destinations(settings, intake)
+    # Fanned-out, pre-screened and plain outputs are cached separately
+    cache_model = settings.openai_model
+    if destinations:
+        cache_model += "+fanout"
+    if settings.eligibility_prefilter_enabled:
+        cache_model += f"+programs-v{get_program_table().version}"
+    cache_key = None
+    content = None
+    if settings.recommendation_cache_enabled:
+        cache_key = intake_cache_key(intake, RECOMMENDATION_PROMPT_VERSION, cache_model)
+        content = await run_in_threadpool(_lookup_shared_recommendation, db, cache_key)
+
+    if content is not None:
+        logger.info("Serving recommendation from shared cache", extra={
+            "user_id": user_id,
+            "cache_key": cache_key,
+        })
+        source = "shared_cache"
+    else:
+        _log_generation_request(user_id, intake)
+        if destinations:
+            content = await _complete_fanout(settings, intake, destinations, user_id)
+        else:
+            prompt = build_recommendation_prompt(intake, _prescreen(settings, intake))
+            content = await _complete_recommendation(settings, prompt, user_id)
+        source = "openai"
+    
+    parsed = _parse_generated_recommendation(content)
+    
+    # Store the recommendation in the database
+    await run_in_threadpool(_store_recommendation, db, user_id, intake, parsed, content)
+    if cache_key and source == "openai" and parsed.options:
+        await run_in_threadpool(
+            _store_shared_recommendation,
+            db,
+            user_id,
+            cache_key,
+            cache_model,
+            content,
+            settings.recommendation_cache_ttl_seconds,
+        )
+    
+    parsed.source = source
+    return parsed
+
+
+@app.post("/recommendations/stream")
+async def stream_recommendation(
+    request: RecommendationRequest,
+    settings: Settings = Depends(get_settings),
+    store: IntakeStore = Depends(get_store),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> StreamingResponse:
+    """
+    Generate visa recommendations and stream them as server-sent events.
+
+    Events: `summary` once the overall summary is complete, `recommendation`
+    for each option as soon as its object closes, then `done` with the full
+    parsed response after it has been stored (or `error`).
+    """
+    user_id = current_user.id
+    intake = await run_in_threadpool(_resolve_intake, db, store, request, user_id)
+    _log_generation_request(user_id, intake)
+    prompt = build_recommendation_prompt(intake, _prescreen(settings, intake))
+    client = get_openai_client(settings)
+
+    async def event_stream():
+        parser = RecommendationStreamParser()
+        try:
+            stream = await client.chat.completions.create(
+                model=settings.openai_model,
+                messages=[
+                    {"role": "system", "content": "You are a concise visa recommendation engine."},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.2,
+                timeout=60,
+                stream=True,
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                for event, value in parser.feed(delta):
+                    if event == "summary":
+                        yield sse_event("summary", {"summary": value})
+                    else:
+                        option = parse_recommendation_option(value)
+                        yield sse_event("recommendation", {
+                            "index": parser.recommendations_emitted - 1,
+                            "option": option.model_dump(),
+                        })
+        except Exception as exc:
+            logger.error(f"OpenAI streaming request failed: {exc}", extra={"user_id": user_id})
+            yield sse_event("error", {"detail": f"OpenAI request failed: {exc}"})
+            return
+
+        content = parser.text
+        parsed = _parse_generated_recommendation(content)
+        # The request-scoped session is not guaranteed to outlive the
+        # response body, so the write phase uses its own session.
+        write_db = SessionLocal()
+        try:
+            await run_in_threadpool(_store_recommendation, write_db, user_id, intake, parsed, content)
+        finally:
+            write_db.close()
+        parsed.source = "openai"
+        _warm_checklists(settings, user_id, parsed)
+        yield sse_event("done", parsed.model_dump(exclude={"raw_message"}))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/eligibility/what-if", response_model=EligibilityWhatIfResponse)
+def eligibility_what_if(
+    request: EligibilityWhatIfRequest,
+    store: IntakeStore = Depends(get_store),
+    current_user: Principal = Depends(get_current_active_principal),
+    db: Session = Depends(get_db),
+) -> EligibilityWhatIfResponse:
+    """
+    Re-score visa programs with some intake fields changed, without calling the model.
+
+    Starts from the given intake (or the user's onboarding data), applies
+    `changes`, and returns every program's score next to its score before
+    the changes.
+    """
+    baseline = _resolve_intake(
+        db,
+        store,
+        RecommendationRequest(intake_id=request.intake_id, intake=request.intake, use_cached=False),
+        current_user.id,
+    )
+
+    unknown = sorted(set(request.changes) - set(IntakeData.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown intake fields: {', '.join(unknown)}",
+        )
+    try:
+        changed = IntakeData(**{**baseline.model_dump(), **request.changes})
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=jsonable_encoder(exc.errors()),
+        )
+
+    before = {result.code: result for result in score_programs(baseline, request.destination)}
+    programs = []
+    for result in score_programs(changed, request.destination):
+        previous = before.get(result.code)
+        programs.append(EligibilityProgramResult(
+            **result.as_dict(),
+            baseline_score=previous.score if previous else None,
+            baseline_status=previous.status if previous else None,
+            score_change=result.score - previous.score if previous else None,
+        ))
+    return EligibilityWhatIfResponse(
+        programs=programs,
+        changed_fields=sorted(request.changes),
+        programs_version=get_program_table().version,
+    )
+
+
+@app.get(
+    "/recommendations/history",
+    response_model=List[RecommendationRecord],
+    # History is used for UI lists; exclude large blobs to keep payload fast.
+    response_model_exclude={"__all__": {"raw_response", "input_data"}},
+)
+def get_recommendation_history(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_principal),
+    limit: int = 10,
+) -> List[RecommendationRecord]:
+    """
+    Get all stored recommendations for the current user, ordered by most recent first.
+    """
+    recommendations = db.query(Recommendation).filter(
+        Recommendation.user_id == current_user.id
+    ).order_by(Recommendation.created_at.desc()).limit(limit).all()
+    
+    logger.info(f"Retrieved recommendation history", extra={
+        "user_id": current_user.id,
+        "count": len(recommendations),
+    })
+    
+    # Debug: Log the first recommendation's created_at
+    if recommendations:
+        logger.info(f"First recommendation created_at: {recommendations[0].created_at}, type: {type(recommendations[0].created_at)}")
+    
+    return recommendations
+
+
+@app.get("/recommendations/{recommendation_id}", response_model=RecommendationRecord)
+def get_recommendation_by_id(
+    recommendation_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_principal),
+) -> RecommendationRecord:
     """
     Get a specific stored recommendation by ID.
     """
@@ -852,71 +1132,12 @@ def compute_option_hash(visa_option: RecommendationOption) -> str:
     return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
 
 
-def generate_checklist_via_openai(
-    visa_option: RecommendationOption,
-    settings: Settings,
-    current_user: User,
-) -> List[dict]:
-    """
-    Call OpenAI to generate a detailed checklist for a visa option.
-    """
-    prompt = f"""You are an expert immigration advisor. Generate a comprehensive, step-by-step application checklist for the following visa recommendation.
-
-Visa Type: {visa_option.visa_type}
-Reasoning: {visa_option.reasoning}
-Likelihood: {visa_option.likelihood or "possible"}
-Estimated Timeline: {visa_option.estimated_timeline or "varies"}
-Estimated Costs: {visa_option.estimated_costs or "varies"}
-
-Requirements: {', '.join(visa_option.requirements) if visa_option.requirements else "Standard requirements apply"}
-Next Steps: {', '.join(visa_option.next_steps) if visa_option.next_steps else "Standard application process"}
-
-Create a detailed, actionable step-by-step checklist with 8-12 steps that guides you through the entire visa application process. Each step should be specific, actionable, and include:
-- Clear title
-- Detailed description of what needs to be done
-- Specific guidance/tips
-- Documents needed for that step
-- Who is responsible (applicant or JAPA)
-- Timeline/due date information
-- Estimated duration (in days) - realistic estimate for completing this specific step
-
-IMPORTANT: For the estimated_duration field, provide a realistic number of days it typically takes to complete this step. Consider factors like:
-- Document gathering: 3-7 days for simple docs, 2-4 weeks for complex ones
-- Form completion: 1-3 days for simple forms, 1-2 weeks for complex applications
-- Application submission: 1-2 days
-- Waiting periods: Use actual processing times from the visa type
-- Interviews/preparation: 1-2 weeks preparation time
-
-Return ONLY valid JSON matching this exact schema:
-{{
-  "checklist": [
-    {{
-      "title": "Step title (e.g., 'Gather Required Documents')",
-      "description": "Detailed description of what needs to be done in this step",
-      "guidance": "Specific tips, warnings, or guidance for completing this step",
-      "documents": ["Document 1", "Document 2"],
-      "owner": "applicant",
-      "due_in": "Timeline information (e.g., 'Before application submission')",
-      "estimated_duration": 7
-    }}
-  ]
-}}
-
-Make sure the checklist is comprehensive, covers the entire application process from start to finish, and is specific to {visa_option.visa_type}. Include steps for:
-1. Initial preparation and eligibility review
-2. Document gathering and preparation
-3. Form completion
-4. Application submission
-5. Follow-up actions
-6. Interview preparation (if applicable)
-7. Post-approval steps
-
-Return only JSON, no explanations."""
-
+async def _checklist_completion(settings: Settings, kind: str, prompt: str, user_id: int) -> Dict[str, Any]:
+    """Run a checklist prompt through the model and return its JSON object."""
     client = get_openai_client(settings)
 
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=settings.openai_model,
             messages=[
                 {"role": "system", "content": "You are an expert immigration advisor. Return only valid JSON."},
@@ -925,251 +1146,997 @@ Return only JSON, no explanations."""
             temperature=0.3,
             timeout=60,
         )
+        log_usage(kind, prompt, completion.usage, user_id=user_id)
         content = completion.choices[0].message.content or ""
     except Exception as exc:
-        logger.error(f"OpenAI checklist generation failed: {exc}", extra={"user_id": current_user.id})
+        logger.error(f"OpenAI checklist generation failed: {exc}", extra={"user_id": user_id})
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Failed to generate checklist: {exc}",
         ) from exc
 
     try:
-        data = json.loads(content)
-        checklist = data.get("checklist", [])
-        
-        if not checklist:
-            raise ValueError("No checklist items returned")
-        
-        logger.info(f"Generated checklist with {len(checklist)} steps", extra={
-            "user_id": current_user.id,
-            "visa_type": visa_option.visa_type,
-            "steps_count": len(checklist),
-        })
-        
-        return checklist
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse checklist JSON: {e}", extra={"user_id": current_user.id})
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Failed to parse checklist response. Please try again.",
-        )
-    except Exception as e:
-        logger.error(f"Checklist generation error: {e}", extra={"user_id": current_user.id})
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing checklist: {str(e)}",
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse checklist JSON: {e}", extra={"user_id": user_id})
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to parse checklist response. Please try again.",
+        )
+    if not isinstance(data, dict):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to parse checklist response. Please try again.",
+        )
+    return data
+
+
+async def generate_checklist_via_openai(
+    visa_option: RecommendationOption,
+    settings: Settings,
+    current_user: User,
+    outline: bool = False,
+) -> List[dict]:
+    """
+    Call OpenAI to generate a detailed checklist for a visa option.
+
+    With `outline` only step titles and timing are generated; each step is
+    marked "detail_pending" and detailed later by generate_checklist_step_via_openai.
+    """
+    if outline:
+        data = await _checklist_completion(
+            settings, "checklist_outline", build_checklist_outline_prompt(visa_option), current_user.id
+        )
+    else:
+        data = await _checklist_completion(
+            settings, "checklist", build_checklist_prompt(visa_option), current_user.id
+        )
+
+    try:
+        checklist = data.get("checklist", [])
+        
+        if not checklist:
+            raise ValueError("No checklist items returned")
+        if outline:
+            checklist = [
+                {**item, "id": checklist_store.step_id(item, idx), "detail_pending": True}
+                for idx, item in enumerate(checklist)
+                if isinstance(item, dict)
+            ]
+        
+        logger.info(f"Generated checklist with {len(checklist)} steps", extra={
+            "user_id": current_user.id,
+            "visa_type": visa_option.visa_type,
+            "steps_count": len(checklist),
+            "outline": outline,
+        })
+        
+        return checklist
+    except Exception as e:
+        logger.error(f"Checklist generation error: {e}", extra={"user_id": current_user.id})
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing checklist: {str(e)}",
+        )
+
+
+async def generate_checklist_step_via_openai(
+    visa_option: RecommendationOption,
+    checklist: List[dict],
+    step: dict,
+    settings: Settings,
+    user_id: int,
+) -> Dict[str, Any]:
+    """Call OpenAI for the description, guidance and documents of one outline step."""
+    titles = [str(item.get("title", "")) for item in checklist if isinstance(item, dict)]
+    prompt = build_checklist_step_prompt(visa_option, titles, str(step.get("title", "")))
+    data = await _checklist_completion(settings, "checklist_step", prompt, user_id)
+    detail = {field: data[field] for field in CHECKLIST_DETAIL_FIELDS if field in data}
+    if not detail.get("description"):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to generate checklist step details. Please try again.",
+        )
+    return detail
+
+
+def _find_cached_checklist(
+    db: Session, user_id: int, visa_type: str
+) -> Optional[ChecklistCachedResponse]:
+    existing_cache = (
+        db.query(ChecklistCache)
+        .options(joinedload(ChecklistCache.content))
+        .filter(
+            ChecklistCache.user_id == user_id,
+            ChecklistCache.visa_type == visa_type,
+        )
+        .first()
+    )
+    if not existing_cache:
+        return None
+
+    logger.info(
+        "Checklist found in DB, returning cached version",
+        extra={
+            "user_id": user_id,
+            "visa_type": visa_type,
+            "source": existing_cache.source,
+        },
+    )
+    return ChecklistCachedResponse(
+        checklist=existing_cache.checklist,
+        source=existing_cache.source or "cache",
+        option_hash=existing_cache.option_hash,
+        cached_at=existing_cache.updated_at or existing_cache.created_at,
+    )
+
+
+def _resolve_visa_option(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    visa_option: Optional[RecommendationOption],
+) -> Optional[RecommendationOption]:
+    """Fall back to the matching option of the user's latest recommendation."""
+    if visa_option is not None:
+        return visa_option
+    latest_rec = (
+        db.query(Recommendation)
+        .filter(Recommendation.user_id == user_id)
+        .order_by(Recommendation.created_at.desc())
+        .first()
+    )
+    options = []
+    if latest_rec and latest_rec.output_data:
+        options = latest_rec.output_data.get("options", [])
+    match = next(
+        (
+            opt
+            for opt in options
+            if str(opt.get("visa_type", "")).lower() == str(visa_type).lower()
+        ),
+        None,
+    )
+    if match:
+        try:
+            return RecommendationOption(**match)
+        except Exception:
+            return None
+    return None
+
+
+def _checklist_read_phase(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    visa_option: Optional[RecommendationOption],
+    check_stale: bool = False,
+) -> Tuple[Optional[ChecklistCachedResponse], Optional[RecommendationOption]]:
+    """
+    Look up a cached checklist, or resolve the option to generate one for.
+
+    With `check_stale` the option is resolved for cached checklists too, so
+    the caller can compare it with the option the checklist was made for.
+    The pooled connection is released before returning so it is not held
+    through the LLM call that may follow.
+    """
+    try:
+        # Check if checklist already exists in DB - if so, return it immediately
+        cached = _find_cached_checklist(db, user_id, visa_type)
+        if cached and not check_stale:
+            return cached, visa_option
+        return cached, _resolve_visa_option(db, user_id, visa_type, visa_option)
+    finally:
+        release_connection(db)
+
+
+def _is_stale(cached: ChecklistCachedResponse, visa_option: Optional[RecommendationOption]) -> bool:
+    """The checklist was generated for a different version of the visa option."""
+    if not cached.option_hash or visa_option is None:
+        return False
+    return compute_option_hash(visa_option) != cached.option_hash
+
+
+def _step_title_key(item: Any) -> Optional[str]:
+    if not isinstance(item, dict) or not item.get("title"):
+        return None
+    return " ".join(re.sub(r"[^\w\s]", " ", str(item["title"]).casefold()).split())
+
+
+def _reconcile_progress(
+    old_checklist: List[dict], new_checklist: List[dict], old_progress: Dict[str, Any]
+) -> Dict[str, bool]:
+    """
+    Progress for `new_checklist`, carrying over completed steps by title.
+
+    Step ids are positional ("step-3"), so a regenerated checklist can move a
+    step to a different id; matching titles keeps the user's ticks on the
+    step they actually completed. Unmatched new steps start incomplete.
+    """
+    done_titles: Dict[str, List[bool]] = {}
+    for idx, item in enumerate(old_checklist if isinstance(old_checklist, list) else []):
+        title = _step_title_key(item)
+        if title is None:
+            continue
+        item_id = item.get("id") or f"step-{idx + 1}"
+        done_titles.setdefault(title, []).append(bool(old_progress.get(item_id)))
+
+    progress_json = _initial_progress(new_checklist)
+    for idx, item in enumerate(new_checklist if isinstance(new_checklist, list) else []):
+        title = _step_title_key(item)
+        if title is not None and done_titles.get(title):
+            progress_json[item.get("id") or f"step-{idx + 1}"] = done_titles[title].pop(0)
+    return progress_json
+
+
+def _initial_progress(checklist: List[dict]) -> Dict[str, bool]:
+    progress_json = {}
+    if isinstance(checklist, list):
+        for idx, item in enumerate(checklist):
+            # Use item.id if available, otherwise generate step ID
+            item_id = item.get("id") if isinstance(item, dict) else f"step-{idx + 1}"
+            progress_json[item_id] = False
+    return progress_json
+
+
+def _store_generated_checklist(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    option_hash: Optional[str],
+    content: checklist_store.StoredContent,
+    source: str = "ai",
+) -> ChecklistCachedResponse:
+    """Link the user to a shared checklist and initialise its progress (write phase)."""
+    checklist = content.checklist
+    new_cache = ChecklistCache(
+        user_id=user_id,
+        visa_type=visa_type,
+        option_hash=option_hash,
+        content_id=content.id,
+        source=source,
+    )
+    db.add(new_cache)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request stored this user's checklist first
+        # (uq_checklist_cache_user_visa); serve that one.
+        db.rollback()
+        existing = _find_cached_checklist(db, user_id, visa_type)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(new_cache)
+
+    # Prepare response data BEFORE progress saving (so we can return even if progress fails)
+    response_data = ChecklistCachedResponse(
+        checklist=checklist,
+        source=source,
+        option_hash=new_cache.option_hash,
+        cached_at=new_cache.updated_at or new_cache.created_at,
+    )
+
+    # After generating checklist, automatically save progress with all items set to incomplete
+    # Use a separate try/except to ensure checklist response is returned even if progress fails
+    try:
+        progress_json = _initial_progress(checklist)
+
+        # Check if progress already exists
+        existing_progress = db.query(ChecklistProgress).filter(
+            ChecklistProgress.user_id == user_id,
+            ChecklistProgress.visa_type == visa_type
+        ).first()
+
+        now = datetime.utcnow()
+        if existing_progress:
+            # Update existing progress
+            existing_progress.progress_json = progress_json
+            existing_progress.updated_at = now
+        else:
+            # Create new progress record
+            new_progress = ChecklistProgress(
+                user_id=user_id,
+                visa_type=visa_type,
+                progress_json=progress_json,
+                created_at=now,
+                updated_at=now
+            )
+            db.add(new_progress)
+
+        db.commit()
+        logger.info(
+            "Progress initialized successfully",
+            extra={
+                "user_id": user_id,
+                "visa_type": visa_type,
+                "items_count": len(progress_json),
+            },
+        )
+    except Exception as progress_error:
+        # Log error but don't fail the request - progress can be saved later
+        # Don't rollback - checklist is already committed and we want to return it
+        logger.warning(
+            f"Failed to initialize progress (non-fatal): {progress_error}",
+            extra={
+                "user_id": user_id,
+                "visa_type": visa_type,
+                "error": str(progress_error),
+            },
+        )
+
+    logger.info(
+        "Checklist generated and cached",
+        extra={
+            "user_id": user_id,
+            "visa_type": visa_type,
+            "source": source,
+            "checklist_items": len(checklist),
+        },
+    )
+    return response_data
+
+
+@app.post("/checklist", response_model=ChecklistCachedResponse)
+async def get_or_generate_checklist(
+    payload: ChecklistFetchRequest,
+    settings: Settings = Depends(get_settings),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+) -> ChecklistCachedResponse:
+    """
+    Return a cached checklist for a visa type. If checklist exists in DB, return it.
+    Only generate new checklist if it doesn't exist. After generation, automatically save progress.
+    """
+    visa_type = payload.visa_type
+    user_id = current_user.id
+
+    if not visa_type:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="visa_type is required",
+        )
+
+    cached, visa_option = await run_in_threadpool(
+        _checklist_read_phase, db, user_id, visa_type, payload.visa_option,
+        settings.checklist_stale_refresh_enabled,
+    )
+    if cached:
+        if settings.checklist_stale_refresh_enabled and _is_stale(cached, visa_option):
+            return await _revalidate_checklist(db, user_id, visa_type, cached, visa_option)
+        return cached
+
+    # Well-known programs are served from the curated catalog without an LLM call
+    catalog_hit = _catalog_checklist(settings, visa_type, visa_option)
+    if catalog_hit is not None:
+        content = await run_in_threadpool(_catalog_content, db, *catalog_hit)
+        option_hash = compute_option_hash(visa_option) if visa_option is not None else None
+        return await run_in_threadpool(
+            _store_generated_checklist, db, user_id, visa_type, option_hash, content, "catalog"
+        )
+
+    if visa_option is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Visa option not found; provide visa_option or generate recommendations first.",
+        )
+
+    if payload.enqueue:
+        return await _enqueue_generation(db, user_id, "checklist", {
+            "visa_type": visa_type,
+            "visa_option": visa_option.model_dump(mode="json", exclude_none=True),
+        })
+    return await produce_checklist(db, settings, current_user, visa_type, visa_option)
+
+
+def _catalog_checklist(
+    settings: Settings, visa_type: Optional[str], visa_option: Optional[RecommendationOption]
+) -> Optional[Tuple[str, List[dict]]]:
+    """Catalog code and curated checklist for the visa type, if it is a catalogued program."""
+    if not settings.checklist_catalog_enabled:
+        return None
+    return get_checklist_catalog().lookup(
+        visa_type, visa_option.visa_type if visa_option is not None else None
+    )
+
+
+async def _revalidate_checklist(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    cached: ChecklistCachedResponse,
+    visa_option: RecommendationOption,
+) -> ChecklistCachedResponse:
+    """Serve the stale checklist now and queue its regeneration (once per option)."""
+    option_hash = compute_option_hash(visa_option)
+
+    def queue_refresh() -> int:
+        try:
+            return jobs.enqueue_unique(db, user_id, "checklist_refresh", f"{visa_type}:{option_hash}", {
+                "visa_type": visa_type,
+                "option_hash": option_hash,
+                "visa_option": visa_option.model_dump(mode="json", exclude_none=True),
+            }).id
+        finally:
+            release_connection(db)
+
+    try:
+        job_id = await run_in_threadpool(queue_refresh)
+    except Exception as exc:
+        # The stale copy is still better than an error
+        logger.warning(
+            f"Failed to queue checklist refresh: {exc}",
+            extra={"user_id": user_id, "visa_type": visa_type},
+        )
+        job_id = None
+    logger.info(
+        "Serving stale checklist while it is regenerated",
+        extra={"user_id": user_id, "visa_type": visa_type, "job_id": job_id},
+    )
+    return cached.model_copy(update={"stale": True, "refresh_job_id": job_id})
+
+
+def _replace_checklist(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    option_hash: str,
+    content: checklist_store.StoredContent,
+    source: str,
+) -> Optional[ChecklistCachedResponse]:
+    """Point the user's checklist at new content and carry progress over by step title."""
+    row = (
+        db.query(ChecklistCache)
+        .options(joinedload(ChecklistCache.content))
+        .filter(ChecklistCache.user_id == user_id, ChecklistCache.visa_type == visa_type)
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        db.rollback()
+        return None
+    old_checklist = row.checklist
+    row.content_id = content.id
+    row.checklist_json = None
+    row.option_hash = option_hash
+    row.source = source
+
+    progress = (
+        db.query(ChecklistProgress)
+        .filter(ChecklistProgress.user_id == user_id, ChecklistProgress.visa_type == visa_type)
+        .with_for_update()
+        .first()
+    )
+    progress_json = _reconcile_progress(
+        old_checklist, content.checklist, progress.progress_json if progress else {}
+    )
+    if progress is None:
+        db.add(ChecklistProgress(user_id=user_id, visa_type=visa_type, progress_json=progress_json))
+    else:
+        progress.progress_json = progress_json
+        progress.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(row)
+
+    logger.info(
+        "Stale checklist refreshed",
+        extra={
+            "user_id": user_id,
+            "visa_type": visa_type,
+            "source": source,
+            "completed_carried_over": sum(1 for done in progress_json.values() if done),
+        },
+    )
+    return ChecklistCachedResponse(
+        checklist=content.checklist,
+        source=source,
+        option_hash=option_hash,
+        cached_at=row.updated_at or row.created_at,
+    )
+
+
+async def produce_checklist(
+    db: Session,
+    settings: Settings,
+    current_user: User,
+    visa_type: str,
+    visa_option: RecommendationOption,
+) -> ChecklistCachedResponse:
+    """Link the user to the shared checklist for this option, generating it if needed."""
+    user_id = current_user.id
+    option_hash = compute_option_hash(visa_option)
+    content, source = await _shared_checklist_content(db, settings, current_user, visa_option, option_hash)
+    return await run_in_threadpool(
+        _store_generated_checklist, db, user_id, visa_type, option_hash, content, source
+    )
+
+
+async def _shared_checklist_content(
+    db: Session,
+    settings: Settings,
+    current_user: User,
+    visa_option: RecommendationOption,
+    option_hash: str,
+    outline: Optional[bool] = None,
+) -> Tuple[checklist_store.StoredContent, str]:
+    """
+    Shared checklist content for `option_hash`, and whether it was reused or generated.
+
+    Users whose options hash the same share one stored checklist, and
+    concurrent generations of it (from any user) share one OpenAI call.
+    `outline` overrides CHECKLIST_TWO_PHASE_ENABLED for a new generation.
+    """
+    content = await run_in_threadpool(_lookup_checklist_content_released, db, option_hash)
+    if content is not None:
+        return content, "shared"
+
+    if outline is None:
+        outline = settings.checklist_two_phase_enabled
+
+    async def generate() -> checklist_store.StoredContent:
+        # Generate new checklist (no pooled connection is held while waiting)
+        try:
+            checklist = await generate_checklist_via_openai(
+                visa_option=visa_option,
+                settings=settings,
+                current_user=current_user,
+                outline=outline,
+            )
+        except HTTPException as exc:
+            logger.error(
+                "Checklist generation failed",
+                extra={
+                    "user_id": current_user.id,
+                    "visa_type": visa_option.visa_type,
+                    "error": exc.detail,
+                },
+            )
+            raise
+        content = await run_in_threadpool(
+            checklist_store.store, db, option_hash, checklist, "outline" if outline else "ai"
+        )
+        if outline and settings.checklist_background_detail_enabled:
+            await _queue_checklist_details(db, current_user.id, content, visa_option)
+        return content
+
+    async def recheck(waited_since: datetime) -> Optional[checklist_store.StoredContent]:
+        return await run_in_threadpool(_lookup_checklist_content_released, db, option_hash)
+
+    content = await generation_flight.do(f"checklist-content:{option_hash}", generate, recheck=recheck)
+    return content, "ai"
+
+
+async def _queue_checklist_details(
+    db: Session,
+    user_id: int,
+    content: checklist_store.StoredContent,
+    visa_option: RecommendationOption,
+) -> None:
+    """Fill in an outline's step details in the background."""
+    def queue() -> None:
+        try:
+            jobs.enqueue(db, user_id, "checklist_details", {
+                "content_id": content.id,
+                "visa_option": visa_option.model_dump(mode="json", exclude_none=True),
+            })
+        finally:
+            release_connection(db)
+
+    try:
+        await run_in_threadpool(queue)
+    except Exception as exc:
+        # Steps are still detailed on demand through /checklist/step
+        logger.warning(f"Failed to queue checklist details: {exc}", extra={"user_id": user_id})
+
+
+async def fill_checklist_step(
+    db: Session,
+    settings: Settings,
+    user_id: int,
+    content_id: int,
+    step_id: str,
+    visa_option: RecommendationOption,
+) -> Tuple[Optional[dict], str]:
+    """
+    Details of one step of a shared outline, generating them if still pending.
+
+    Returns the step (None if it does not exist) and whether it was already
+    detailed ("cache") or generated now ("ai"). A user expanding a step and
+    the background fill share one generation per step.
+    """
+    def load_step() -> Tuple[Optional[dict], List[dict]]:
+        try:
+            entry = db.get(ChecklistContent, content_id)
+            checklist = list(entry.checklist_json) if entry is not None else []
+        finally:
+            release_connection(db)
+        for idx, item in enumerate(checklist):
+            if checklist_store.step_id(item, idx) == step_id:
+                return item, checklist
+        return None, checklist
+
+    step, checklist = await run_in_threadpool(load_step)
+    if step is None or not step.get("detail_pending"):
+        return step, "cache"
+
+    async def generate() -> Optional[dict]:
+        detail = await generate_checklist_step_via_openai(visa_option, checklist, step, settings, user_id)
+        return await run_in_threadpool(checklist_store.update_step, db, content_id, step_id, detail)
+
+    async def recheck(waited_since: datetime) -> Optional[dict]:
+        current, _ = await run_in_threadpool(load_step)
+        return None if current is None or current.get("detail_pending") else current
+
+    filled = await generation_flight.do(
+        f"checklist-step:{content_id}:{step_id}", generate, recheck=recheck
+    )
+    return filled, "ai"
+
+
+def _lookup_checklist_content_released(
+    db: Session, option_hash: str
+) -> Optional[checklist_store.StoredContent]:
+    try:
+        return checklist_store.lookup(db, option_hash)
+    finally:
+        release_connection(db)
+
+
+def _catalog_content(db: Session, code: str, checklist: List[dict]) -> checklist_store.StoredContent:
+    """Shared content row for a catalog checklist, created on first use."""
+    key = checklist_store.catalog_content_key(code, get_checklist_catalog().version)
+    return checklist_store.lookup(db, key) or checklist_store.store(db, key, checklist, "catalog")
+
+
+@app.post("/recommendations/checklist", response_model=ChecklistResponse)
+async def generate_checklist(
+    request: ChecklistRequest,
+    settings: Settings = Depends(get_settings),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+) -> ChecklistResponse:
+    """
+    Generate a detailed step-by-step checklist for a visa recommendation using ChatGPT.
+    """
+    user_id = current_user.id
+    visa_option = request.visa_option
+    catalog_hit = _catalog_checklist(settings, visa_option.visa_type, visa_option)
+    if catalog_hit is not None:
+        return ChecklistResponse(checklist=catalog_hit[1])
+    # Shared with /checklist: options generated for any user are reused. Nothing
+    # is stored for the user here, so /checklist/step cannot expand an outline
+    # later: generate the full checklist, or detail a shared outline now.
+    content, _ = await _shared_checklist_content(
+        db, settings, current_user, visa_option, compute_option_hash(visa_option), outline=False
+    )
+    checklist = await _detail_pending_steps(settings, user_id, content, visa_option)
+    return ChecklistResponse(checklist=checklist)
+
+
+async def _detail_pending_steps(
+    settings: Settings,
+    user_id: int,
+    content: checklist_store.StoredContent,
+    visa_option: RecommendationOption,
+) -> List[dict]:
+    """The shared checklist with every "detail_pending" step generated."""
+    pending = checklist_store.pending_step_ids(content.checklist)
+    if not pending:
+        return content.checklist
+
+    async def fill(step_id: str) -> Optional[dict]:
+        # One session per step, since the fills run concurrently
+        step_db = SessionLocal()
+        try:
+            filled, _ = await fill_checklist_step(step_db, settings, user_id, content.id, step_id, visa_option)
+        finally:
+            step_db.close()
+        return filled
+
+    filled_steps = dict(zip(pending, await asyncio.gather(*(fill(step_id) for step_id in pending))))
+    return [
+        filled_steps.get(checklist_store.step_id(item, idx)) or item
+        for idx, item in enumerate(content.checklist)
+    ]
+
+def _checklist_step_read_phase(
+    db: Session,
+    user_id: int,
+    visa_type: str,
+    visa_option: Optional[RecommendationOption],
+) -> Tuple[Optional[ChecklistCache], Optional[RecommendationOption]]:
+    try:
+        row = (
+            db.query(ChecklistCache)
+            .options(joinedload(ChecklistCache.content))
+            .filter(ChecklistCache.user_id == user_id, ChecklistCache.visa_type == visa_type)
+            .first()
         )
+        if row is None:
+            return None, visa_option
+        return row, _resolve_visa_option(db, user_id, visa_type, visa_option)
+    finally:
+        release_connection(db)
 
 
-@app.post("/checklist", response_model=ChecklistCachedResponse)
-def get_or_generate_checklist(
-    payload: ChecklistFetchRequest,
+@app.post("/checklist/step", response_model=ChecklistStepResponse)
+async def get_checklist_step(
+    payload: ChecklistStepRequest,
     settings: Settings = Depends(get_settings),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
-) -> ChecklistCachedResponse:
+) -> ChecklistStepResponse:
     """
-    Return a cached checklist for a visa type. If checklist exists in DB, return it.
-    Only generate new checklist if it doesn't exist. After generation, automatically save progress.
+    Return one step of the user's checklist with its full details.
+
+    Steps of a two-phase checklist marked "detail_pending" are generated (and
+    stored for every user sharing the checklist) when first requested.
     """
-    visa_type = payload.visa_type
-    visa_option = payload.visa_option
+    row, visa_option = await run_in_threadpool(
+        _checklist_step_read_phase, db, current_user.id, payload.visa_type, payload.visa_option
+    )
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Checklist not found")
 
-    if not visa_type:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="visa_type is required",
-        )
+    checklist = row.checklist or []
+    step = next(
+        (item for idx, item in enumerate(checklist) if checklist_store.step_id(item, idx) == payload.step_id),
+        None,
+    )
+    if step is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Checklist step not found")
+    if not step.get("detail_pending") or row.content_id is None:
+        return ChecklistStepResponse(step=step, step_id=payload.step_id, source="cache")
 
-    # Check if checklist already exists in DB - if so, return it immediately
-    existing_cache = (
-        db.query(ChecklistCache)
-        .filter(
-            ChecklistCache.user_id == current_user.id,
-            ChecklistCache.visa_type == visa_type,
-        )
-        .first()
+    if visa_option is None:
+        visa_option = RecommendationOption(visa_type=payload.visa_type, reasoning="")
+    filled, source = await fill_checklist_step(
+        db, settings, current_user.id, row.content_id, payload.step_id, visa_option
+    )
+    if filled is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Checklist step not found")
+    return ChecklistStepResponse(step=filled, step_id=payload.step_id, source=source)
+
+
+# Background generation jobs
+async def _enqueue_generation(
+    db: Session, user_id: int, kind: str, payload: Dict[str, Any]
+) -> JSONResponse:
+    """Queue a generation and answer 202 with where to follow it."""
+    job = await run_in_threadpool(jobs.enqueue, db, user_id, kind, payload)
+    logger.info("Queued generation job", extra={"user_id": user_id, "job_id": job.id, "kind": kind})
+    accepted = JobAcceptedResponse(
+        job_id=job.id,
+        kind=kind,
+        status=job.status,
+        status_url=f"/jobs/{job.id}",
+        events_url=f"/jobs/{job.id}/events",
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=accepted.model_dump(),
+        headers={"Location": accepted.status_url},
     )
 
-    if existing_cache:
-        logger.info(
-            "Checklist found in DB, returning cached version",
-            extra={
-                "user_id": current_user.id,
-                "visa_type": visa_type,
-                "source": existing_cache.source,
-            },
-        )
-        return ChecklistCachedResponse(
-            checklist=existing_cache.checklist_json,
-            source=existing_cache.source or "cache",
-            option_hash=existing_cache.option_hash,
-            cached_at=existing_cache.updated_at or existing_cache.created_at,
-        )
 
-    # Checklist doesn't exist - need to generate it
-    # Resolve visa_option if not provided by looking up the latest recommendation
-    if visa_option is None:
-        latest_rec = (
-            db.query(Recommendation)
-            .filter(Recommendation.user_id == current_user.id)
-            .order_by(Recommendation.created_at.desc())
-            .first()
-        )
-        options = []
-        if latest_rec and latest_rec.output_data:
-            options = latest_rec.output_data.get("options", [])
-        if options:
-            match = next(
-                (
-                    opt
-                    for opt in options
-                    if str(opt.get("visa_type", "")).lower() == str(visa_type).lower()
-                ),
-                None,
-            )
-            if match:
-                try:
-                    visa_option = RecommendationOption(**match)
-                except Exception:
-                    visa_option = None
+async def _run_recommendation_job(job: jobs.ClaimedJob) -> Dict[str, Any]:
+    intake = IntakeData(**job.payload["intake"])
+    db = SessionLocal()
+    try:
+        result = await regenerate_recommendation(db, get_settings(), job.user_id, intake)
+    finally:
+        db.close()
+    return jsonable_encoder(result)
 
-    if visa_option is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Visa option not found; provide visa_option or generate recommendations first.",
-        )
 
+async def _run_checklist_job(job: jobs.ClaimedJob) -> Dict[str, Any]:
+    visa_type = job.payload["visa_type"]
+    visa_option = RecommendationOption(**job.payload["visa_option"])
+    db = SessionLocal()
+    try:
+        # Another request may have produced it while the job was queued
+        cached, _ = await run_in_threadpool(_checklist_read_phase, db, job.user_id, visa_type, visa_option)
+        if cached is None:
+            user = await run_in_threadpool(db.get, User, job.user_id)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            cached = await produce_checklist(db, get_settings(), user, visa_type, visa_option)
+    finally:
+        db.close()
+    return jsonable_encoder(cached)
+
+
+async def ensure_fresh_checklist(
+    db: Session,
+    settings: Settings,
+    user_id: int,
+    visa_type: str,
+    visa_option: RecommendationOption,
+) -> ChecklistCachedResponse:
+    """
+    The user's checklist for `visa_option`: the cached one if it was made for
+    this option, otherwise catalog, shared or newly generated content, with
+    progress carried over from the checklist it replaces.
+    """
     option_hash = compute_option_hash(visa_option)
+    cached, _ = await run_in_threadpool(_checklist_read_phase, db, user_id, visa_type, visa_option)
+    if cached is not None and cached.option_hash == option_hash:
+        return cached
+
+    catalog_hit = _catalog_checklist(settings, visa_type, visa_option)
+    if catalog_hit is not None:
+        content, source = await run_in_threadpool(_catalog_content, db, *catalog_hit), "catalog"
+    else:
+        user = await run_in_threadpool(db.get, User, user_id)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        content, source = await _shared_checklist_content(db, settings, user, visa_option, option_hash)
+
+    refreshed = None
+    if cached is not None:
+        refreshed = await run_in_threadpool(
+            _replace_checklist, db, user_id, visa_type, option_hash, content, source
+        )
+    if refreshed is None:
+        refreshed = await run_in_threadpool(
+            _store_generated_checklist, db, user_id, visa_type, option_hash, content, source
+        )
+    return refreshed
 
-    # Generate new checklist
+
+async def _run_checklist_refresh_job(job: jobs.ClaimedJob) -> Dict[str, Any]:
+    visa_option = RecommendationOption(**job.payload["visa_option"])
+    db = SessionLocal()
     try:
-        checklist = generate_checklist_via_openai(
-            visa_option=visa_option,
-            settings=settings,
-            current_user=current_user,
-        )
-    except HTTPException as exc:
-        logger.error(
-            "Checklist generation failed",
-            extra={
-                "user_id": current_user.id,
-                "visa_type": visa_type,
-                "error": exc.detail,
-            },
+        refreshed = await ensure_fresh_checklist(
+            db, get_settings(), job.user_id, job.payload["visa_type"], visa_option
         )
-        raise
+    finally:
+        db.close()
+    return jsonable_encoder(refreshed)
 
-    # Save checklist to cache
-    new_cache = ChecklistCache(
-        user_id=current_user.id,
-        visa_type=visa_type,
-        option_hash=option_hash,
-        checklist_json=checklist,
-        source="ai",
-    )
-    db.add(new_cache)
-    db.commit()
-    db.refresh(new_cache)
 
-    # Prepare response data BEFORE progress saving (so we can return even if progress fails)
-    response_data = ChecklistCachedResponse(
-        checklist=new_cache.checklist_json,
-        source="ai",
-        option_hash=new_cache.option_hash,
-        cached_at=new_cache.updated_at or new_cache.created_at,
+async def _run_checklist_details_job(job: jobs.ClaimedJob) -> Dict[str, Any]:
+    content_id = job.payload["content_id"]
+    visa_option = RecommendationOption(**job.payload["visa_option"])
+    settings = get_settings()
+    db = SessionLocal()
+    try:
+        entry = await run_in_threadpool(db.get, ChecklistContent, content_id)
+        pending = checklist_store.pending_step_ids(entry.checklist_json) if entry is not None else []
+        release_connection(db)
+        # One step at a time: these are background fills, users' expanded steps come first
+        for step_id in pending:
+            await fill_checklist_step(db, settings, job.user_id, content_id, step_id, visa_option)
+    finally:
+        db.close()
+    return {"content_id": content_id, "steps_filled": len(pending)}
+
+
+async def _warm_checklist(user_id: int, visa_option: RecommendationOption) -> None:
+    db = SessionLocal()
+    try:
+        warmed = await ensure_fresh_checklist(db, get_settings(), user_id, visa_option.visa_type, visa_option)
+    finally:
+        db.close()
+    logger.info(
+        "Checklist warmed",
+        extra={"user_id": user_id, "visa_type": visa_option.visa_type, "source": warmed.source},
     )
 
-    # After generating checklist, automatically save progress with all items set to incomplete
-    # Use a separate try/except to ensure checklist response is returned even if progress fails
+
+def _checklist_is_warm(db: Session, user_id: int, visa_option: RecommendationOption) -> bool:
+    """The user already has a checklist made for exactly this option."""
     try:
-        progress_json = {}
-        if isinstance(checklist, list):
-            for idx, item in enumerate(checklist):
-                # Use item.id if available, otherwise generate step ID
-                item_id = item.get("id") if isinstance(item, dict) else f"step-{idx + 1}"
-                progress_json[item_id] = False
+        cached = _find_cached_checklist(db, user_id, visa_option.visa_type)
+    finally:
+        release_connection(db)
+    return cached is not None and cached.option_hash == compute_option_hash(visa_option)
 
-        # Check if progress already exists
-        existing_progress = db.query(ChecklistProgress).filter(
-            ChecklistProgress.user_id == current_user.id,
-            ChecklistProgress.visa_type == visa_type
-        ).first()
 
-        now = datetime.utcnow()
-        if existing_progress:
-            # Update existing progress
-            existing_progress.progress_json = progress_json
-            existing_progress.updated_at = now
-        else:
-            # Create new progress record
-            new_progress = ChecklistProgress(
-                user_id=current_user.id,
-                visa_type=visa_type,
-                progress_json=progress_json,
-                created_at=now,
-                updated_at=now
-            )
-            db.add(new_progress)
+async def _checklist_needs_warming(user_id: int, visa_option: RecommendationOption) -> bool:
+    db = SessionLocal()
+    try:
+        return not await run_in_threadpool(_checklist_is_warm, db, user_id, visa_option)
+    finally:
+        db.close()
 
-        db.commit()
-        logger.info(
-            "Progress initialized successfully",
-            extra={
-                "user_id": current_user.id,
-                "visa_type": visa_type,
-                "items_count": len(progress_json),
-            },
-        )
-    except Exception as progress_error:
-        # Log error but don't fail the request - progress can be saved later
-        # Don't rollback - checklist is already committed and we want to return it
-        logger.warning(
-            f"Failed to initialize progress (non-fatal): {progress_error}",
-            extra={
-                "user_id": current_user.id,
-                "visa_type": visa_type,
-                "error": str(progress_error),
-            },
+
+def _warm_checklists(settings: Settings, user_id: int, response: RecommendationResponse) -> None:
+    """Generate the checklists of the top options in the background."""
+    checklist_warmer.schedule(settings, user_id, [
+        WarmItem(
+            needed=functools.partial(_checklist_needs_warming, user_id, option),
+            run=functools.partial(_warm_checklist, user_id, option),
         )
-        # Don't rollback - checklist is already committed
+        for option in response.options
+        if option.visa_type
+    ])
 
-    logger.info(
-        "Checklist generated and cached",
-        extra={
-            "user_id": current_user.id,
-            "visa_type": visa_type,
-            "source": "ai",
-            "checklist_items": len(checklist),
-        },
-    )
 
-    # Return response - this ensures checklist is returned even if progress saving failed
-    return response_data
+jobs.register_handler("recommendation", _run_recommendation_job)
+jobs.register_handler("checklist", _run_checklist_job)
+jobs.register_handler("checklist_refresh", _run_checklist_refresh_job)
+jobs.register_handler("checklist_details", _run_checklist_details_job)
 
 
-@app.post("/recommendations/checklist", response_model=ChecklistResponse)
-def generate_checklist(
-    request: ChecklistRequest,
+def _load_job_status(db: Session, job_id: int, user_id: int) -> Optional[JobStatusResponse]:
+    try:
+        job = jobs.get_job(db, job_id, user_id)
+        return JobStatusResponse.model_validate(job) if job else None
+    finally:
+        release_connection(db)
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(
+    job_id: int,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: Session = Depends(get_db),
+):
+    """Status, and once finished the result or error, of a queued generation."""
+    job = _load_job_status(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: int,
     settings: Settings = Depends(get_settings),
-    current_user: User = Depends(get_current_active_user),
-) -> ChecklistResponse:
+    current_user: Principal = Depends(get_current_active_principal),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
     """
-    Generate a detailed step-by-step checklist for a visa recommendation using ChatGPT.
+    Follow a queued generation as server-sent events.
+
+    Emits `status` whenever the status or attempt count changes, then a final
+    `succeeded` (with the result) or `failed` (with the error) event.
     """
-    visa_option = request.visa_option
-    checklist = generate_checklist_via_openai(
-        visa_option=visa_option,
-        settings=settings,
-        current_user=current_user,
+    user_id = current_user.id
+    job = await run_in_threadpool(_load_job_status, db, job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    async def event_stream():
+        current = job
+        last_seen = None
+        while current is not None:
+            seen = (current.status, current.attempts)
+            if seen != last_seen:
+                last_seen = seen
+                yield sse_event("status", {
+                    "job_id": current.id,
+                    "status": current.status,
+                    "attempts": current.attempts,
+                })
+            if current.status == jobs.JOB_SUCCEEDED:
+                yield sse_event("succeeded", {"job_id": current.id, "result": current.result})
+                return
+            if current.status == jobs.JOB_FAILED:
+                yield sse_event("failed", {"job_id": current.id, "error": current.error})
+                return
+            await asyncio.sleep(settings.job_poll_seconds)
+            # A fresh session per poll so no connection is held between polls
+            poll_db = SessionLocal()
+            try:
+                current = await run_in_threadpool(_load_job_status, poll_db, job_id, user_id)
+            finally:
+                poll_db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return ChecklistResponse(checklist=checklist)
+
 
 # Checklist Progress endpoints
 @app.get("/checklist/progress", response_model=Optional[ChecklistProgressResponse])
 def get_checklist_progress(
     visa_type: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -1189,7 +2156,7 @@ def get_checklist_progress(
 
 @app.get("/checklist/progress/all", response_model=List[ChecklistProgressResponse])
 def get_all_checklist_progress(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -1211,36 +2178,45 @@ def save_checklist_progress(
 ):
     """
     Save or update checklist progress for a visa type.
-    Creates a new record if none exists, or updates existing one.
+    Creates a new record if none exists, or replaces the existing one.
     """
-    # Check if progress already exists
-    existing = db.query(ChecklistProgress).filter(
-        ChecklistProgress.user_id == current_user.id,
-        ChecklistProgress.visa_type == progress_data.visa_type
-    ).first()
-    
     now = datetime.utcnow()
-    
-    if existing:
-        # Update existing progress
-        existing.progress_json = progress_data.progress_json
-        existing.updated_at = now
-        db.commit()
-        db.refresh(existing)
-        return existing
-    else:
-        # Create new progress record
-        new_progress = ChecklistProgress(
-            user_id=current_user.id,
-            visa_type=progress_data.visa_type,
-            progress_json=progress_data.progress_json,
-            created_at=now,
-            updated_at=now
-        )
-        db.add(new_progress)
-        db.commit()
-        db.refresh(new_progress)
-        return new_progress
+    progress = persistence.upsert_returning(
+        db,
+        ChecklistProgress,
+        {
+            "user_id": current_user.id,
+            "visa_type": progress_data.visa_type,
+            "progress_json": progress_data.progress_json,
+            "created_at": now,
+            "updated_at": now,
+        },
+        conflict=("user_id", "visa_type"),
+        update_columns=("progress_json", "updated_at"),
+    )
+    db.commit()
+    return progress
+
+
+@app.patch("/checklist/progress", response_model=ChecklistProgressResponse)
+async def update_checklist_progress_steps(
+    delta: ChecklistProgressDelta,
+    settings: Settings = Depends(get_settings),
+    current_user: User = Depends(get_current_active_user),
+) -> Dict[str, Any]:
+    """
+    Apply step-level toggles to checklist progress, e.g. {"step-3": true}.
+
+    Steps not in the request keep their value. Toggles arriving within
+    CHECKLIST_PROGRESS_COALESCE_MS of each other are written together; every
+    request in the burst gets the merged progress back.
+    """
+    return await progress_coalescer.apply(
+        current_user.id,
+        delta.visa_type,
+        delta.steps,
+        settings.checklist_progress_coalesce_ms / 1000.0,
+    )
 
 
 # Document endpoints
@@ -1273,7 +2249,7 @@ def create_document(
 
 @app.get("/documents", response_model=List[DocumentResponse])
 def get_documents(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db),
     status_filter: Optional[str] = None
 ):
@@ -1290,7 +2266,7 @@ def get_documents(
 @app.get("/documents/{document_id}", response_model=DocumentResponse)
 def get_document(
     document_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """Get a specific document by ID"""
@@ -1407,35 +2383,7 @@ def create_travel_agent_profile(
             detail="Only travel agents can access this endpoint"
         )
     
-    existing_profile = db.query(TravelAgentProfile).filter(
-        TravelAgentProfile.user_id == current_user.id
-    ).first()
-    
-    if existing_profile:
-        # Update existing profile
-        if profile_data.onboarding_data:
-            existing_data = existing_profile.onboarding_data or {}
-            new_data = profile_data.onboarding_data.model_dump(exclude_none=False)
-            merged_data = {**existing_data, **new_data}
-            existing_profile.onboarding_data = merged_data
-        existing_profile.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_profile)
-        return existing_profile
-    else:
-        # Create new profile
-        onboarding_dict = None
-        if profile_data.onboarding_data:
-            onboarding_dict = profile_data.onboarding_data.model_dump(exclude_none=False)
-        
-        new_profile = TravelAgentProfile(
-            user_id=current_user.id,
-            onboarding_data=onboarding_dict
-        )
-        db.add(new_profile)
-        db.commit()
-        db.refresh(new_profile)
-        return new_profile
+    return _upsert_onboarding_profile(db, TravelAgentProfile, current_user.id, profile_data.onboarding_data)
 
 
 @app.put("/travel-agents/profile", response_model=TravelAgentProfileResponse)
@@ -1451,31 +2399,7 @@ def update_travel_agent_profile(
             detail="Only travel agents can access this endpoint"
         )
     
-    profile = db.query(TravelAgentProfile).filter(
-        TravelAgentProfile.user_id == current_user.id
-    ).first()
-    
-    if not profile:
-        onboarding_dict = None
-        if profile_data.onboarding_data:
-            onboarding_dict = profile_data.onboarding_data.model_dump(exclude_none=False)
-        
-        profile = TravelAgentProfile(
-            user_id=current_user.id,
-            onboarding_data=onboarding_dict
-        )
-        db.add(profile)
-    else:
-        if profile_data.onboarding_data:
-            existing_data = profile.onboarding_data or {}
-            new_data = profile_data.onboarding_data.model_dump(exclude_none=False)
-            merged_data = {**existing_data, **new_data}
-            profile.onboarding_data = merged_data
-        profile.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(profile)
-    return profile
+    return _upsert_onboarding_profile(db, TravelAgentProfile, current_user.id, profile_data.onboarding_data)
 
 
 @app.get("/travel-agents/list", response_model=List[TravelAgentListItem])
@@ -1735,7 +2659,7 @@ def create_conversation(
 
 @app.get("/conversations", response_model=List[ConversationResponse])
 def get_conversations(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """Get all conversations for current user"""
@@ -1805,7 +2729,7 @@ def get_conversations(
 @app.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 def get_conversation(
     conversation_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """Get a specific conversation"""
@@ -1880,60 +2804,44 @@ def create_message(
     db: Session = Depends(get_db)
 ):
     """Send a message in a conversation"""
-    # Verify conversation exists and user has access
-    conversation = db.query(Conversation).filter(
-        Conversation.id == message_data.conversation_id
-    ).first()
-    
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversation not found"
-        )
-    
-    # Verify user is part of conversation
-    if current_user.role == UserRole.USER and conversation.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    elif current_user.role == UserRole.TRAVEL_AGENT and conversation.agent_id != current_user.id:
+    # Bump the conversation timestamp only if it exists and the user is part of it
+    now = datetime.utcnow()
+    criteria = [Conversation.id == message_data.conversation_id]
+    if current_user.role == UserRole.USER:
+        criteria.append(Conversation.user_id == current_user.id)
+    elif current_user.role == UserRole.TRAVEL_AGENT:
+        criteria.append(Conversation.agent_id == current_user.id)
+    conversation = persistence.update_returning(
+        db, Conversation, criteria, {"last_message_at": now, "updated_at": now}
+    )
+    if conversation is None:
+        exists = db.query(Conversation.id).filter(Conversation.id == message_data.conversation_id).first()
+        db.rollback()
+        if not exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
     
-    # Create message
-    message = Message(
-        conversation_id=message_data.conversation_id,
-        sender_id=current_user.id,
-        content=message_data.content,
-        is_read=False
-    )
-    db.add(message)
-    
-    # Update conversation timestamp
-    conversation.last_message_at = datetime.utcnow()
-    conversation.updated_at = datetime.utcnow()
-    
+    message = persistence.insert_returning(db, Message, {
+        "conversation_id": message_data.conversation_id,
+        "sender_id": current_user.id,
+        "content": message_data.content,
+        "is_read": False,
+    })
     db.commit()
-    db.refresh(message)
-    
-    return MessageResponse(
-        id=message.id,
-        conversation_id=message.conversation_id,
-        sender_id=message.sender_id,
-        content=message.content,
-        is_read=message.is_read,
-        created_at=message.created_at,
-        sender_name=current_user.name
-    )
+    
+    return MessageResponse(**message, sender_name=current_user.name)
 
 
 @app.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
 def get_messages(
     conversation_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100
@@ -1995,7 +2903,7 @@ def get_messages(
 @app.get("/users/{user_id}/profile-summary")
 def get_user_profile_summary(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: Session = Depends(get_db)
 ):
     """Get user profile summary for travel agents (limited info only)"""
@@ -2144,7 +3052,7 @@ JAPA is an innovative AI-powered migration assistant that helps users navigate t
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_with_assistant(
+async def chat_with_assistant(
     request: ChatRequest,
     settings: Settings = Depends(get_settings),
 ):
@@ -2165,11 +3073,11 @@ def chat_with_assistant(
     # Add current user message
     messages.append({"role": "user", "content": request.message})
     
-    # Get OpenAI client
+    # Get the shared OpenAI client
     client = get_openai_client(settings)
     
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=settings.openai_model,
             messages=messages,
             temperature=0.7,
@@ -2193,3 +3101,9 @@ def chat_with_assistant(
         response=response_content,
         conversation_history=updated_history
     )
+
+
+if get_settings().database_async:
+    from app.async_routes import install_async_routes
+
+    install_async_routes(app)
@@ -69,3 +69,179 @@ def ensure_profile_picture_column(engine: Engine) -> None:
     with engine.begin() as conn:
         conn.execute(text(alter_sql))
 
+
+
+def ensure_token_version_column(engine: Engine) -> None:
+    """
+    Ensure the `users.token_version` column exists.
+
+    This function is safe to call multiple times and is idempotent.
+    """
+    inspector = inspect(engine)
+    if "users" not in inspector.get_table_names():
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("users")]
+    if "token_version" in columns:
+        return
+
+    alter_sql = (
+        "ALTER TABLE users\n"
+        "ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;"
+    )
+    with engine.begin() as conn:
+        conn.execute(text(alter_sql))
+
+
+def ensure_recommendation_parser_version_column(engine: Engine) -> None:
+    """
+    Ensure the `recommendations.parser_version` column exists.
+
+    Existing rows keep NULL and are reparsed lazily on their next cached read
+    (or by backfill_recommendations.py).
+    """
+    inspector = inspect(engine)
+    if "recommendations" not in inspector.get_table_names():
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("recommendations")]
+    if "parser_version" in columns:
+        return
+
+    alter_sql = (
+        "ALTER TABLE recommendations\n"
+        "ADD COLUMN IF NOT EXISTS parser_version INTEGER NULL;"
+    )
+    with engine.begin() as conn:
+        conn.execute(text(alter_sql))
+
+
+def ensure_recommendation_schema_version_column(engine: Engine) -> None:
+    """
+    Ensure the `recommendations.schema_version` column exists.
+
+    Rows stored before the column existed keep NULL, which the parser treats
+    as the original (v1) wire format.
+    """
+    inspector = inspect(engine)
+    if "recommendations" not in inspector.get_table_names():
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("recommendations")]
+    if "schema_version" in columns:
+        return
+
+    alter_sql = (
+        "ALTER TABLE recommendations\n"
+        "ADD COLUMN IF NOT EXISTS schema_version INTEGER NULL;"
+    )
+    with engine.begin() as conn:
+        conn.execute(text(alter_sql))
+
+
+def ensure_checklist_cache_content_column(engine: Engine) -> None:
+    """
+    Ensure `checklist_cache.content_id` exists and `checklist_json` is nullable.
+
+    Per-user rows now reference shared `checklist_contents`; existing rows
+    keep their inline JSON until dedupe_checklists.py links them.
+    """
+    inspector = inspect(engine)
+    if "checklist_cache" not in inspector.get_table_names():
+        return
+
+    columns = {col["name"]: col for col in inspector.get_columns("checklist_cache")}
+    statements = []
+    if "content_id" not in columns:
+        statements.append(
+            "ALTER TABLE checklist_cache\n"
+            "ADD COLUMN IF NOT EXISTS content_id INTEGER NULL REFERENCES checklist_contents(id);"
+        )
+        statements.append(
+            "CREATE INDEX IF NOT EXISTS ix_checklist_cache_content_id ON checklist_cache (content_id);"
+        )
+    if not columns["checklist_json"].get("nullable", True) and engine.dialect.name == "postgresql":
+        statements.append("ALTER TABLE checklist_cache ALTER COLUMN checklist_json DROP NOT NULL;")
+    if not statements:
+        return
+
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def ensure_checklist_progress_unique_constraint(engine: Engine) -> None:
+    """
+    Ensure `checklist_progress` has one row per (user_id, visa_type).
+
+    Duplicate rows (possible before the constraint, from concurrent first
+    saves) are removed first, keeping the most recently updated one. The
+    constraint backs the ON CONFLICT upsert of PATCH /checklist/progress.
+    """
+    inspector = inspect(engine)
+    if "checklist_progress" not in inspector.get_table_names():
+        return
+
+    names = {c["name"] for c in inspector.get_unique_constraints("checklist_progress")}
+    names |= {i["name"] for i in inspector.get_indexes("checklist_progress") if i.get("unique")}
+    if "uq_checklist_progress_user_visa" in names:
+        return
+
+    dedupe_sql = (
+        "DELETE FROM checklist_progress\n"
+        "WHERE id NOT IN (\n"
+        "    SELECT id FROM (\n"
+        "        SELECT id, ROW_NUMBER() OVER (\n"
+        "            PARTITION BY user_id, visa_type\n"
+        "            ORDER BY COALESCE(updated_at, created_at) DESC, id DESC\n"
+        "        ) AS position\n"
+        "        FROM checklist_progress\n"
+        "    ) ranked\n"
+        "    WHERE position = 1\n"
+        ");"
+    )
+    if engine.dialect.name == "postgresql":
+        constraint_sql = (
+            "ALTER TABLE checklist_progress\n"
+            "ADD CONSTRAINT uq_checklist_progress_user_visa UNIQUE (user_id, visa_type);"
+        )
+    else:
+        # SQLite cannot add constraints to an existing table; a unique index serves ON CONFLICT
+        constraint_sql = (
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_checklist_progress_user_visa\n"
+            "ON checklist_progress (user_id, visa_type);"
+        )
+    with engine.begin() as conn:
+        conn.execute(text(dedupe_sql))
+        conn.execute(text(constraint_sql))
+
+
+def ensure_generation_job_dedupe_key(engine: Engine) -> None:
+    """
+    Ensure `generation_jobs.dedupe_key` exists with its partial unique index.
+
+    The index allows one queued or running job per (user_id, kind,
+    dedupe_key), so concurrent requests cannot enqueue the same work twice.
+    Existing rows have no key and are not constrained.
+    """
+    inspector = inspect(engine)
+    if "generation_jobs" not in inspector.get_table_names():
+        return
+
+    statements = []
+    columns = [col["name"] for col in inspector.get_columns("generation_jobs")]
+    if "dedupe_key" not in columns:
+        statements.append("ALTER TABLE generation_jobs\nADD COLUMN dedupe_key VARCHAR NULL;")
+    indexes = {index["name"] for index in inspector.get_indexes("generation_jobs")}
+    if "uq_generation_jobs_pending_key" not in indexes:
+        statements.append(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_generation_jobs_pending_key\n"
+            "ON generation_jobs (user_id, kind, dedupe_key)\n"
+            "WHERE status IN ('queued', 'running');"
+        )
+    if not statements:
+        return
+
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Text, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Text, UniqueConstraint, Index, Enum as SQLEnum, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -22,6 +22,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(SQLEnum(UserRole, name=ROLE_ENUM_NAME), default=UserRole.USER, nullable=False, index=True)
     is_active = Column(Boolean, default=True)
+    # Bumped whenever claims embedded in stateless tokens (email, role, active) change
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     profile_picture_url = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -56,12 +58,64 @@ class Recommendation(Base):
     input_data = Column(JSON, nullable=True)  # The intake JSON sent to OpenAI
     output_data = Column(JSON, nullable=True)  # The parsed recommendation response
     raw_response = Column(Text, nullable=True)  # Raw ChatGPT response string
+    parser_version = Column(Integer, nullable=True)  # app.parsing.PARSER_VERSION that produced output_data
+    schema_version = Column(Integer, nullable=True)  # wire format of raw_response; NULL = v1 (pre-versioning)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationship to user
     user = relationship("User")
 
 
+class RecommendationCache(Base):
+    """Model output shared across users with materially identical intakes."""
+    __tablename__ = "recommendation_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True, nullable=False)  # sha256 of normalized intake + prompt version + model
+    model = Column(String, nullable=False)
+    prompt_version = Column(Integer, nullable=False)
+    raw_response = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class GenerationJob(Base):
+    """Queued recommendation / checklist generation, claimed by workers with SKIP LOCKED."""
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        # At most one pending job per dedupe key; see jobs.enqueue_unique
+        Index(
+            "uq_generation_jobs_pending_key",
+            "user_id", "kind", "dedupe_key",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    kind = Column(String, nullable=False)  # recommendation | checklist
+    dedupe_key = Column(String, nullable=True)
+    status = Column(String, default="queued", nullable=False, index=True)  # queued | running | succeeded | failed
+    payload = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    max_attempts = Column(Integer, default=3, server_default="3", nullable=False)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # visibility timeout of a running job
+    locked_by = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    user = relationship("User")
+
+
 class Document(Base):
     __tablename__ = "documents"
 
@@ -84,6 +138,9 @@ class Document(Base):
 
 class ChecklistProgress(Base):
     __tablename__ = "checklist_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "visa_type", name="uq_checklist_progress_user_visa"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
@@ -96,6 +153,20 @@ class ChecklistProgress(Base):
     user = relationship("User")
 
 
+class ChecklistContent(Base):
+    """Checklist JSON shared by every user whose visa option hashes the same."""
+    __tablename__ = "checklist_contents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # compute_option_hash() of the option; catalog checklists use "catalog:<code>:v<version>"
+    option_hash = Column(String, unique=True, index=True, nullable=False)
+    checklist_json = Column(JSON, nullable=False)
+    source = Column(String, nullable=False)  # ai | outline | catalog | migrated
+    hit_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class ChecklistCache(Base):
     __tablename__ = "checklist_cache"
     __table_args__ = (
@@ -106,12 +177,21 @@ class ChecklistCache(Base):
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
     visa_type = Column(String, nullable=False, index=True)
     option_hash = Column(String, nullable=True, index=True)
-    checklist_json = Column(JSON, nullable=False)
-    source = Column(String, default="cache", nullable=False)  # cache | ai | cache_fallback
+    content_id = Column(Integer, ForeignKey("checklist_contents.id"), nullable=True, index=True)
+    # Only set on rows written before checklist_contents (or left inline by dedupe_checklists.py)
+    checklist_json = Column(JSON, nullable=True)
+    source = Column(String, default="cache", nullable=False)  # cache | ai | catalog | shared | cache_fallback
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User")
+    content = relationship("ChecklistContent")
+
+    @property
+    def checklist(self):
+        if self.content_id is not None and self.content is not None:
+            return self.content.checklist_json
+        return self.checklist_json
 
 
 class TravelAgentProfile(Base):
@@ -1,12 +1,186 @@
 """
 OAuth verification utilities for Google authentication.
 """
-from typing import Dict
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token as google_id_token
+import base64
+import json
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from google.auth import jwt as google_jwt
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from app.config import Settings
 
+logger = logging.getLogger("oauth")
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# A key source returns ({key_id: PEM certificate}, max_age_seconds or None).
+KeySource = Callable[[], Tuple[Dict[str, str], Optional[float]]]
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def parse_max_age(cache_control: Optional[str]) -> Optional[float]:
+    """Extract max-age (seconds) from a Cache-Control header value."""
+    if not cache_control:
+        return None
+    match = _MAX_AGE_RE.search(cache_control)
+    return float(match.group(1)) if match else None
+
+
+class HttpCertsSource:
+    """Fetches Google's signing certificates over a pooled HTTP session."""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 10.0) -> None:
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def __call__(self) -> Tuple[Dict[str, str], Optional[float]]:
+        response = self._session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json(), parse_max_age(response.headers.get("Cache-Control"))
+
+
+class StaticCertsSource:
+    """Serves a fixed set of certificates (e.g. a locally generated keypair)."""
+
+    def __init__(self, certs: Dict[str, str], max_age: Optional[float] = None) -> None:
+        self.certs = certs
+        self.max_age = max_age
+
+    def __call__(self) -> Tuple[Dict[str, str], Optional[float]]:
+        return dict(self.certs), self.max_age
+
+
+class GoogleCertsCache:
+    """
+    Caches Google's ID-token signing certificates.
+
+    Certificates are kept for the Cache-Control max-age Google sends with
+    them. Once they are close to expiry the stale set keeps being served while
+    a background thread refreshes it; a token signed with an unknown key id
+    (key rotation) forces a synchronous refresh, rate-limited by
+    `min_refresh_interval`. Refreshes are single-flight: callers that need
+    one while another is in progress wait for it and reuse its result, so a
+    burst of logins on a cold cache fetches the certificates once.
+    """
+
+    def __init__(
+        self,
+        source: KeySource,
+        default_max_age: float = 3600.0,
+        refresh_margin: float = 60.0,
+        min_refresh_interval: float = 30.0,
+    ) -> None:
+        self.source = source
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        # Held for the duration of a fetch from the source
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    def set_source(self, source: KeySource) -> None:
+        """Swap the key source and drop any cached certificates."""
+        with self._refresh_lock, self._lock:
+            self.source = source
+            self._certs = {}
+            self._expires_at = 0.0
+            self._last_refresh = 0.0
+
+    def _fetch(self) -> Dict[str, str]:
+        certs, max_age = self.source()
+        now = time.monotonic()
+        with self._lock:
+            self._certs = certs
+            self._expires_at = now + (max_age if max_age is not None else self.default_max_age)
+            self._last_refresh = now
+        return certs
+
+    def refresh(self) -> Dict[str, str]:
+        """Fetch certificates from the source and replace the cached set."""
+        with self._refresh_lock:
+            return self._fetch()
+
+    def _refresh_shared(self, seen_refresh: float) -> Dict[str, str]:
+        """Refresh, unless another caller completed one since `seen_refresh`."""
+        with self._refresh_lock:
+            with self._lock:
+                if self._certs and self._last_refresh != seen_refresh:
+                    return self._certs
+            return self._fetch()
+
+    def _refresh_in_background(self, seen_refresh: float) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self._refresh_shared(seen_refresh)
+            except Exception as exc:
+                logger.warning(f"Background Google certs refresh failed: {exc}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="google-certs-refresh", daemon=True).start()
+
+    def get_certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        """Return certificates able to verify a token signed with `key_id`."""
+        now = time.monotonic()
+        with self._lock:
+            certs = self._certs
+            expires_at = self._expires_at
+            last_refresh = self._last_refresh
+
+        if not certs or now >= expires_at:
+            return self._refresh_shared(last_refresh)
+        if key_id is not None and key_id not in certs:
+            if now - last_refresh >= self.min_refresh_interval:
+                return self._refresh_shared(last_refresh)
+            return certs
+        if now >= expires_at - self.refresh_margin:
+            self._refresh_in_background(last_refresh)
+        return certs
+
+
+google_certs = GoogleCertsCache(HttpCertsSource())
+
+
+def _unverified_key_id(token: str) -> Optional[str]:
+    """Read the `kid` header of a JWT without verifying it."""
+    try:
+        header_segment = token.split(".", 1)[0]
+        padded = header_segment + "=" * (-len(header_segment) % 4)
+        header = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Malformed token header")
+    return header.get("kid")
+
+
+def verify_id_token_with_cache(
+    token: str,
+    audience: str,
+    certs_cache: Optional[GoogleCertsCache] = None,
+) -> Dict[str, str]:
+    """Verify a Google ID token against cached signing certificates (blocking)."""
+    cache = certs_cache or google_certs
+    certs = cache.get_certs(_unverified_key_id(token))
+    return google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+
 
 async def verify_google_token(id_token: str, settings: Settings) -> Dict[str, str]:
     """
@@ -29,15 +203,15 @@ async def verify_google_token(id_token: str, settings: Settings) -> Dict[str, st
         )
     
     try:
-        # Verify the token
-        idinfo = google_id_token.verify_oauth2_token(
+        # Verify the token off the event loop; certs come from the shared cache
+        idinfo = await run_in_threadpool(
+            verify_id_token_with_cache,
             id_token,
-            google_requests.Request(),
-            settings.google_client_id
+            settings.google_client_id,
         )
         
         # Verify the issuer
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
             raise ValueError('Wrong issuer.')
         
         # Extract user information
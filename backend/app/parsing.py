@@ -0,0 +1,229 @@
+"""
+Parsing of model-produced recommendation JSON into RecommendationResponse.
+
+PARSER_VERSION is stored on each Recommendation row next to its parsed
+output_data; bump it whenever the parsing rules change so stored rows are
+reparsed lazily (or by backfill_recommendations.py).
+"""
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from app.schemas import RecommendationOption, RecommendationResponse
+
+logger = logging.getLogger("recommendations")
+
+PARSER_VERSION = 1
+
+
+def parse_recommendation_option(opt: Dict[str, Any]) -> RecommendationOption:
+    """Normalize one model-produced recommendation object."""
+    # Extract visa type from various possible field names
+    visa_type = (
+        opt.get("visa_type") or
+        opt.get("visa_name") or 
+        opt.get("visa_type_code") or 
+        opt.get("name") or
+        opt.get("title") or
+        "Visa option"
+    )
+
+    # Extract reasoning/description
+    reasoning = (
+        opt.get("reasoning") or
+        opt.get("match_summary") or
+        opt.get("eligibility_summary") or
+        opt.get("overview") or
+        opt.get("description") or
+        opt.get("summary") or
+        "See details"
+    )
+    # Replace "the applicant" / "applicant" with "you" / "your" for better user experience
+    if reasoning:
+        reasoning = reasoning.replace("the applicant", "you")
+        reasoning = reasoning.replace("The applicant", "You")
+        reasoning = reasoning.replace("applicant's", "your")
+        reasoning = reasoning.replace("Applicant's", "Your")
+        reasoning = reasoning.replace("applicant", "you")
+
+    # Extract likelihood/status
+    likelihood = (
+        opt.get("likelihood") or
+        opt.get("status") or
+        opt.get("eligibility") or
+        "possible"
+    )
+
+    # Extract timeline - prioritize processing_time from AI response
+    estimated_timeline = (
+        opt.get("processing_time") or
+        opt.get("estimated_timeline") or
+        opt.get("timeline") if isinstance(opt.get("timeline"), str) else None
+    )
+
+    # Extract costs
+    estimated_costs = (
+        opt.get("estimated_costs") or
+        opt.get("estimated_cost") or
+        opt.get("cost") or
+        opt.get("fees")
+    )
+
+    # Extract requirements / documents (separate from risk flags)
+    requirements = (
+        opt.get("requirements") or
+        opt.get("documents") or
+        []
+    )
+    if isinstance(requirements, str):
+        requirements = [requirements]
+
+    # Extract checklist (structured tasks)
+    checklist = opt.get("checklist") or []
+    if isinstance(checklist, dict):
+        checklist = [checklist]
+    if not isinstance(checklist, list):
+        checklist = []
+
+    # Extract risk flags / key points
+    risk_flags = (
+        opt.get("risk_flags") or
+        opt.get("quick_facts") or
+        opt.get("challenges") or
+        []
+    )
+    if isinstance(risk_flags, str):
+        risk_flags = [risk_flags]
+
+    # Extract next steps
+    next_steps = (
+        opt.get("next_steps") or
+        opt.get("success_boost") or
+        opt.get("improvement_actions") or
+        opt.get("action_items") or
+        []
+    )
+    if isinstance(next_steps, str):
+        next_steps = [next_steps]
+
+    return RecommendationOption(
+        visa_type=visa_type,
+        reasoning=reasoning,
+        likelihood=likelihood,
+        estimated_timeline=estimated_timeline,
+        estimated_costs=estimated_costs,
+        risk_flags=risk_flags if risk_flags else None,
+        next_steps=next_steps if next_steps else None,
+        checklist=checklist if checklist else None,
+        requirements=requirements if requirements else None,
+    )
+
+
+def extract_summary(data: Dict[str, Any]) -> str:
+    """Pick the overall summary out of a model response."""
+    return (
+        data.get("summary") or
+        data.get("insight_summary") or
+        data.get("overview") or
+        data.get("introduction") or
+        "Based on your profile, here are your visa recommendations."
+    )
+
+
+def _top_index(data: Dict[str, Any], count: int) -> int:
+    """Index of the strongest recommendation in a v2 response (0 when absent or invalid)."""
+    index = data.get("top_recommendation_index")
+    if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < count:
+        return 0
+    return index
+
+
+def parse_recommendation(raw: str, schema_version: Optional[int] = None) -> Optional[RecommendationResponse]:
+    """
+    Parse a model response in either wire format.
+
+    v1 responses repeat the strongest option as `top_recommendation`; v2
+    responses carry `top_recommendation_index` instead. Either way the
+    strongest option is returned first. `schema_version` is the version stored
+    with the row; when unknown the format is detected from the keys.
+    """
+    try:
+        data: Dict[str, Any] = json.loads(raw)
+    except json.JSONDecodeError:
+        logger.warning(f"Failed to parse JSON from ChatGPT response")
+        return None
+
+    logger.info(f"Parsing ChatGPT response with keys: {list(data.keys())}")
+    
+    # Try to find recommendations in various possible locations
+    recommendations_list = (
+        data.get("recommendations") or 
+        data.get("options") or 
+        data.get("visa_options") or
+        []
+    )
+    
+    is_v2 = schema_version == 2 or "top_recommendation_index" in data
+    if not is_v2 and not recommendations_list and "top_recommendation" in data:
+        # If only top_recommendation exists, use it as a single-item list
+        recommendations_list = [data["top_recommendation"]]
+    
+    recs = [
+        parse_recommendation_option(opt)
+        for opt in recommendations_list
+        if isinstance(opt, dict)
+    ]
+    if is_v2:
+        top = _top_index(data, len(recs))
+        if top:
+            recs.insert(0, recs.pop(top))
+    
+    logger.info(f"Parsed {len(recs)} recommendation options")
+    
+    summary = extract_summary(data)
+
+    return RecommendationResponse(
+        summary=summary,
+        options=recs,
+        notes=data.get("notes"),
+        raw_message=raw,
+    )
+
+
+def stored_output(parsed: RecommendationResponse) -> Dict[str, Any]:
+    """The parsed fields persisted in Recommendation.output_data."""
+    return {
+        "summary": parsed.summary,
+        "options": [opt.model_dump() for opt in parsed.options],
+        "notes": parsed.notes,
+    }
+
+
+def response_from_output(
+    output: Dict[str, Any],
+    raw: Optional[str],
+    source: str = "cache",
+) -> RecommendationResponse:
+    """Rebuild a RecommendationResponse from stored output_data without reparsing raw."""
+    return RecommendationResponse(
+        summary=output.get("summary") or "Cached recommendation",
+        options=[RecommendationOption(**opt) for opt in output.get("options") or []],
+        notes=output.get("notes"),
+        source=source,
+        raw_message=raw,
+    )
+
+
+def reparse_stored(raw: Optional[str], schema_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Reparse a stored raw response with the current parser.
+
+    Returns the new output_data, or None when the raw text yields no options
+    (the existing output_data should then be kept as is).
+    """
+    if not raw:
+        return None
+    parsed = parse_recommendation(raw, schema_version)
+    if not parsed or not parsed.options:
+        return None
+    return stored_output(parsed)
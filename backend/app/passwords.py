@@ -0,0 +1,140 @@
+"""
+Password hashing on a dedicated, bounded worker pool.
+
+bcrypt is deliberately slow (~250 ms per call at cost 12). Running it on the
+shared AnyIO threadpool lets a burst of logins starve every other sync
+endpoint, so hashing and verification get their own small executor with a
+hard cap on queued work; callers beyond the cap are rejected with a 503
+instead of piling up.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Callable, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import get_settings
+
+T = TypeVar("T")
+
+_settings = get_settings()
+
+# Pinning min/max rounds to the configured cost makes passlib flag any hash
+# created with a different cost as needing an update, which drives the
+# rehash-on-login path.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=_settings.bcrypt_rounds,
+    bcrypt__min_rounds=_settings.bcrypt_rounds,
+    bcrypt__max_rounds=_settings.bcrypt_rounds,
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password pool already has its maximum queued work."""
+
+
+class PasswordHasherPool:
+    """Size-limited executor for bcrypt work with a queue-depth limit."""
+
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        self._acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the work finishes (or is cancelled before it starts),
+        # not when the caller stops waiting: a cancelled request's hash keeps
+        # its worker busy until bcrypt returns.
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+password_pool = PasswordHasherPool(
+    max_workers=_settings.password_hash_workers,
+    max_queue=_settings.password_hash_max_queue,
+)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against a hash"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """Hash a password"""
+    return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if the stored hash uses a different bcrypt cost
+    than the one configured, return a replacement hash.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def _run_on_pool(fn: Callable[..., T], *args) -> T:
+    try:
+        return await password_pool.run(fn, *args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the dedicated bcrypt pool."""
+    return await _run_on_pool(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify (and possibly rehash) a password on the dedicated bcrypt pool."""
+    return await _run_on_pool(verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,181 @@
+"""
+Single-statement write helpers.
+
+Create/update handlers used to query the row with .first(), mutate it,
+commit and db.refresh() it: three or four round trips, and two concurrent
+first writes could both see "no row" and race on the insert. These helpers
+write with one INSERT ... ON CONFLICT ... RETURNING or UPDATE ... RETURNING
+statement instead and hand back the resulting row as a dict, which the
+from_attributes response models accept as is.
+
+Postgres gets the single statement for every helper. SQLite gets it
+except for JSON merges: its json_patch() drops keys whose new value is
+null, which onboarding data relies on keeping, so those fall back to a
+locked read-modify-write with the same result. Dialects without RETURNING
+fall back to the ORM.
+
+The helpers do not commit; callers commit once after their writes. From an
+AsyncSession they run through `await db.run_sync(helper, ...)`.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import JSON, case, cast, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+def _row_dict(row: Any) -> Dict[str, Any]:
+    return dict(row._mapping)
+
+
+def _instance_dict(instance: Any) -> Dict[str, Any]:
+    return {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
+
+
+def _dialect_insert(db: Session):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        return pg_insert
+    if name == "sqlite":
+        return sqlite_insert
+    return None
+
+
+def _json_merge_pg(table: Any, excluded: Any, column: str) -> Any:
+    """Shallow merge of the new object into the stored one (a non-object stored value counts as {})."""
+    existing = cast(table.c[column], JSONB)
+    base = case(
+        (func.jsonb_typeof(existing) == "object", existing),
+        else_=cast(literal("{}"), JSONB),
+    )
+    return cast(base.op("||")(cast(excluded[column], JSONB)), JSON)
+
+
+def upsert_returning(
+    db: Session,
+    model: Any,
+    values: Dict[str, Any],
+    conflict: Sequence[str],
+    update_columns: Sequence[str] = (),
+    merge_json: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """
+    Insert `values`, or on a conflict on the `conflict` columns overwrite
+    `update_columns` and shallow-merge the `merge_json` objects into the
+    stored ones ({**stored, **new}); return the resulting row.
+    """
+    table = model.__table__
+    dialect_insert = _dialect_insert(db)
+    name = db.get_bind().dialect.name
+    if dialect_insert is None or (merge_json and name != "postgresql"):
+        return _upsert_locked(db, model, values, conflict, update_columns, merge_json)
+
+    stmt = dialect_insert(table).values(**values)
+    set_ = {column: stmt.excluded[column] for column in update_columns}
+    for column in merge_json:
+        set_[column] = _json_merge_pg(table, stmt.excluded, column)
+    if set_:
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict), set_=set_)
+    else:
+        # Nothing to change; a no-op update still returns the existing row
+        first = conflict[0]
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict), set_={first: stmt.excluded[first]})
+    return _row_dict(db.execute(stmt.returning(*table.c)).one())
+
+
+def _upsert_locked(
+    db: Session,
+    model: Any,
+    values: Dict[str, Any],
+    conflict: Sequence[str],
+    update_columns: Sequence[str],
+    merge_json: Sequence[str],
+) -> Dict[str, Any]:
+    criteria = [getattr(model, column) == values[column] for column in conflict]
+    instance = db.query(model).filter(*criteria).with_for_update().first()
+    if instance is None:
+        instance = model(**values)
+        db.add(instance)
+    else:
+        for column in update_columns:
+            setattr(instance, column, values[column])
+        for column in merge_json:
+            stored = getattr(instance, column)
+            setattr(instance, column, {**(stored if isinstance(stored, dict) else {}), **values[column]})
+    db.flush()
+    db.refresh(instance)
+    return _instance_dict(instance)
+
+
+def insert_returning(
+    db: Session,
+    model: Any,
+    values: Dict[str, Any],
+    ignore_conflicts_on: Sequence[str] = (),
+) -> Optional[Dict[str, Any]]:
+    """
+    Insert a row and return it. With `ignore_conflicts_on`, a row that
+    conflicts on those columns is not inserted and None is returned.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect
+    dialect_insert = _dialect_insert(db)
+    if ignore_conflicts_on and dialect_insert is not None:
+        stmt = dialect_insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=list(ignore_conflicts_on)
+        )
+    elif not ignore_conflicts_on and dialect.insert_returning:
+        stmt = insert(table).values(**values)
+    else:
+        instance = model(**values)
+        try:
+            with db.begin_nested():
+                db.add(instance)
+        except IntegrityError:
+            if not ignore_conflicts_on:
+                raise
+            return None
+        db.refresh(instance)
+        return _instance_dict(instance)
+    row = db.execute(stmt.returning(*table.c)).first()
+    return _row_dict(row) if row is not None else None
+
+
+def update_returning(
+    db: Session,
+    model: Any,
+    criteria: Sequence[Any],
+    values: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """Update the row matching `criteria` and return it, or None if no row matched."""
+    table = model.__table__
+    stmt = update(table).where(*criteria).values(**values)
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(stmt.returning(*table.c)).first()
+        return _row_dict(row) if row is not None else None
+    if db.execute(stmt).rowcount == 0:
+        return None
+    row = db.execute(select(*table.c).where(*criteria)).first()
+    return _row_dict(row) if row is not None else None
+
+
+def upsert_onboarding_profile(
+    db: Session, model: Any, user_id: int, onboarding_data: Optional[Any]
+) -> Dict[str, Any]:
+    """
+    Create a user's (or agent's) profile row or merge new onboarding data into it.
+
+    Onboarding fields are stored including nulls so users can fill them in
+    later; new values overwrite stored ones key by key.
+    """
+    values: Dict[str, Any] = {"user_id": user_id, "updated_at": datetime.utcnow()}
+    merge_json: Tuple[str, ...] = ()
+    if onboarding_data:
+        values["onboarding_data"] = onboarding_data.model_dump(exclude_none=False)
+        merge_json = ("onboarding_data",)
+    return upsert_returning(
+        db, model, values, conflict=("user_id",), update_columns=("updated_at",), merge_json=merge_json
+    )
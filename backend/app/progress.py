@@ -0,0 +1,118 @@
+"""
+Delta updates of checklist progress, coalesced per user and visa type.
+
+PATCH /checklist/progress sends only the steps that were toggled. Toggles
+for the same user and visa type that arrive within a short window are
+merged in memory and written once, as a single INSERT ... ON CONFLICT
+(user_id, visa_type) DO UPDATE that merges the JSON in the database (see
+app/persistence.py), so a burst of checkbox clicks becomes one statement
+and one row version instead of a read and a full-blob rewrite per click.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app import persistence
+from app.database import SessionLocal
+from app.models import ChecklistProgress
+
+logger = logging.getLogger("checklists")
+
+
+def apply_progress_delta(
+    db: Session, user_id: int, visa_type: str, steps: Dict[str, bool]
+) -> Dict[str, Any]:
+    """Merge step toggles into the user's progress in one upsert and return the row."""
+    now = datetime.utcnow()
+    progress = persistence.upsert_returning(
+        db,
+        ChecklistProgress,
+        {
+            "user_id": user_id,
+            "visa_type": visa_type,
+            "progress_json": steps,
+            "created_at": now,
+            "updated_at": now,
+        },
+        conflict=("user_id", "visa_type"),
+        update_columns=("updated_at",),
+        merge_json=("progress_json",),
+    )
+    db.commit()
+    return progress
+
+
+class _PendingWrite:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.steps: Dict[str, bool] = {}
+        self.future: asyncio.Future = loop.create_future()
+
+
+class ProgressCoalescer:
+    """Merges toggles per (user_id, visa_type) for `window` seconds, then writes once."""
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[int, str], _PendingWrite] = {}
+        self._flushing: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.writes = 0
+
+    async def apply(
+        self, user_id: int, visa_type: str, steps: Dict[str, bool], window: float
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+        key = (user_id, visa_type)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = _PendingWrite(asyncio.get_running_loop())
+            self._pending[key] = pending
+            asyncio.get_running_loop().call_later(max(window, 0.0), self._start_flush, key, pending)
+        # Later toggles of the same step win
+        pending.steps.update(steps)
+        # Followers must not cancel the shared write if their client disconnects
+        return await asyncio.shield(pending.future)
+
+    def _start_flush(self, key: Tuple[int, str], pending: _PendingWrite) -> None:
+        task = asyncio.ensure_future(self._flush(key, pending))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, key: Tuple[int, str], pending: _PendingWrite) -> None:
+        # Toggles arriving from here on start the next batch
+        if self._pending.get(key) is pending:
+            del self._pending[key]
+        user_id, visa_type = key
+        with self._lock:
+            self.writes += 1
+        db = SessionLocal()
+        try:
+            row = await run_in_threadpool(apply_progress_delta, db, user_id, visa_type, dict(pending.steps))
+        except Exception as exc:
+            logger.warning(
+                f"Failed to save checklist progress: {exc}",
+                extra={"user_id": user_id, "visa_type": visa_type},
+            )
+            pending.future.set_exception(exc)
+        else:
+            pending.future.set_result(row)
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "requests": self.requests,
+                "writes": self.writes,
+                "requests_per_write": round(self.requests / self.writes, 2) if self.writes else 0.0,
+            }
+
+
+progress_coalescer = ProgressCoalescer()
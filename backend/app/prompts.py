@@ -0,0 +1,300 @@
+"""
+Prompt construction for recommendation and checklist generations.
+
+The instructions and output schemas are static, so they are rendered once at
+import time; each call only serializes the user-specific payload. Payloads
+are compacted before serialization: None, empty strings, empty lists and
+empty objects are dropped and JSON is emitted without whitespace.
+
+Prompt size is estimated offline with `estimate_tokens` and logged per call.
+A prompt over PROMPT_TOKEN_BUDGET first has its longest free-text values
+shortened; if it still does not fit the request is rejected with 413.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.config import get_settings
+from app.schemas import IntakeData, RecommendationOption
+
+logger = logging.getLogger("prompts")
+
+# Bump whenever the recommendation prompt changes in a way that alters model
+# output; it is part of the shared recommendation cache key.
+RECOMMENDATION_PROMPT_VERSION = 3
+
+# Output format the recommendation prompt asks for, stored on each
+# Recommendation row. v1 repeated the strongest recommendation in full as
+# `top_recommendation`; v2 points at it with `top_recommendation_index`.
+RECOMMENDATION_SCHEMA_VERSION = 2
+
+# Successive caps applied to free-text values while a prompt is over budget
+TRIM_STEPS = (1000, 400, 160)
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact(value: Any) -> Any:
+    """Recursively drop None, blank strings, and empty lists / objects."""
+    if isinstance(value, dict):
+        items = {key: compact(item) for key, item in value.items()}
+        return {key: item for key, item in items.items() if not _is_empty(item)}
+    if isinstance(value, list):
+        items = [compact(item) for item in value]
+        return [item for item in items if not _is_empty(item)]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+# Words, runs of digits (three per token), and single punctuation marks; a
+# close offline stand-in for the BPE tokenizers used by the chat models.
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate model token count of `text` without a tokenizer download."""
+    count = 0
+    for match in _TOKEN_RE.finditer(text):
+        piece = match.group()
+        # Long words split into several BPE pieces (~4 characters each)
+        count += (len(piece) + 3) // 4 if piece.isalpha() else 1
+    return count
+
+
+def _trim_strings(value: Any, limit: int) -> Any:
+    if isinstance(value, dict):
+        return {key: _trim_strings(item, limit) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_trim_strings(item, limit) for item in value]
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit].rstrip() + "…"
+    return value
+
+
+def _fit_to_budget(kind: str, prefix: str, payload: Dict[str, Any], suffix: str = "") -> str:
+    """Render prefix + compact payload + suffix, shortening free text in the payload if over the token budget."""
+    budget = get_settings().prompt_token_budget
+    prompt = prefix + compact_json(payload) + suffix
+    tokens = estimate_tokens(prompt)
+    for limit in TRIM_STEPS:
+        if budget <= 0 or tokens <= budget:
+            break
+        payload = _trim_strings(payload, limit)
+        prompt = prefix + compact_json(payload) + suffix
+        tokens = estimate_tokens(prompt)
+
+    logger.info("Built prompt", extra={
+        "prompt_kind": kind,
+        "prompt_chars": len(prompt),
+        "prompt_tokens_estimated": tokens,
+        "prompt_token_budget": budget,
+    })
+    if budget > 0 and tokens > budget:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Input is too large to process ({tokens} tokens, limit {budget}). Shorten free-text answers and try again.",
+        )
+    return prompt
+
+
+_RECOMMENDATION_SCHEMA = {
+    "current_score": "0-100",
+    "boosted_score": "0-100",
+    "insight_summary": "short paragraph on your readiness",
+    "recommendations": [{
+        "visa_name": "string",
+        "visa_type_code": "string",
+        "country": "string",
+        "category": "immigration|work|study|investment|family",
+        "score": "0-100",
+        "boosted_score": "0-100",
+        "status": "eligible|possible|unlikely|not_eligible",
+        "estimated_cost": "string, e.g. '$1,500' or 'Varies'",
+        "processing_time": "required, e.g. '2-4 weeks', '3-6 months'",
+        "eligibility_summary": "1-2 sentences on match level",
+        "improvement_actions": ["string"],
+        "overview": "summary of the visa/program",
+        "who_is_it_for": ["string"],
+        "quick_facts": ["string"],
+        "requirements": ["string"],
+        "benefits": ["string"],
+        "success_boost": ["action to increase eligibility"],
+        "match_summary": "why you fit or don't fit",
+        "timeline": [{"stage": "string", "description": "string", "duration": "string"}],
+        "checklist": [{
+            "title": "string",
+            "description": "string",
+            "documents": ["string"],
+            "owner": "applicant|JAPA",
+            "due_in": "string",
+            "guidance": "string",
+        }],
+        "tips": ["string"],
+        "resources": ["string"],
+        "call_to_actions": [{"label": "string", "action_type": "string", "href": "string|null"}],
+    }],
+    "top_recommendation_index": "0-based index of the strongest recommendation",
+}
+
+_RECOMMENDATION_PREFIX = (
+    "You are JAPA Visa Strategist, an expert immigration recommender. Analyze the user's "
+    "eligibility and recommend the top immigration or visa pathways.\n"
+    "Rules:\n"
+    "1. Return ONLY valid JSON matching the schema; never omit a field.\n"
+    "2. Use null, \"\" or \"unknown\" for uncertain information; do not invent facts.\n"
+    "3. Scores are integers 0-100.\n"
+    "4. At most 3 recommendations, strongest first.\n"
+    "5. In all text fields address the user as 'you'/'your', never 'the applicant'.\n"
+    f"Schema:{compact_json(_RECOMMENDATION_SCHEMA)}\n"
+    "User intake JSON:"
+)
+
+
+def _prescreen_suffix(prescreen: Optional[Dict[str, Any]]) -> str:
+    """Programs ranked by app.eligibility, appended after the intake."""
+    if not prescreen:
+        return ""
+    suffix = ""
+    if prescreen.get("candidates"):
+        suffix += (
+            "\nPre-screened programs (local rules, best first; prefer these unless a clearly "
+            f"better pathway exists):{compact_json(prescreen['candidates'])}"
+        )
+    if prescreen.get("excluded"):
+        suffix += f"\nDo not recommend (hard requirement not met):{compact_json(prescreen['excluded'])}"
+    return suffix
+
+
+def build_recommendation_prompt(intake: IntakeData, prescreen: Optional[Dict[str, Any]] = None) -> str:
+    payload = compact(intake.model_dump(exclude_none=True, exclude_defaults=True))
+    return _fit_to_budget("recommendation", _RECOMMENDATION_PREFIX, payload, _prescreen_suffix(prescreen))
+
+
+def build_destination_prompt(
+    intake: IntakeData,
+    destination: str,
+    prescreen: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Recommendation prompt scoped to one of the intake's preferred destinations."""
+    payload = compact(intake.model_dump(exclude_none=True, exclude_defaults=True))
+    payload["preferred_destinations"] = destination
+    payload.pop("alternative_countries", None)
+    prefix = _RECOMMENDATION_PREFIX.replace(
+        "User intake JSON:",
+        f"Only recommend pathways for {compact_json(destination)}.\nUser intake JSON:",
+    )
+    return _fit_to_budget("recommendation_destination", prefix, payload, _prescreen_suffix(prescreen))
+
+
+_CHECKLIST_SCHEMA = {
+    "checklist": [{
+        "title": "step title",
+        "description": "what needs to be done",
+        "guidance": "tips and warnings",
+        "documents": ["string"],
+        "owner": "applicant|JAPA",
+        "due_in": "timing, e.g. 'Before application submission'",
+        "estimated_duration": "integer days",
+    }],
+}
+
+_CHECKLIST_PREFIX = (
+    "You are an expert immigration advisor. Write a step-by-step application checklist "
+    "(8-12 steps) for the visa option below, specific to that visa and covering: "
+    "eligibility review, document gathering, form completion, submission, follow-up, "
+    "interview preparation if applicable, and post-approval steps. Each step must be "
+    "actionable and address the user as 'you'.\n"
+    "estimated_duration is a realistic number of days for that step alone (simple documents "
+    "3-7, complex documents 14-28, forms 1-14, submission 1-2, waiting periods per the visa's "
+    "processing time, interview preparation 7-14).\n"
+    f"Return ONLY JSON matching:{compact_json(_CHECKLIST_SCHEMA)}\n"
+    "Visa option JSON:"
+)
+
+# Fields of a visa option that inform its checklist
+CHECKLIST_OPTION_FIELDS = (
+    "visa_type",
+    "reasoning",
+    "likelihood",
+    "estimated_timeline",
+    "estimated_costs",
+    "requirements",
+    "next_steps",
+)
+
+
+def build_checklist_prompt(visa_option: RecommendationOption) -> str:
+    payload = compact(visa_option.model_dump(include=set(CHECKLIST_OPTION_FIELDS), exclude_none=True))
+    return _fit_to_budget("checklist", _CHECKLIST_PREFIX, payload)
+
+
+# Two-phase checklists: a short outline first, each step's details on demand
+_CHECKLIST_OUTLINE_SCHEMA = {
+    "checklist": [{
+        "title": "step title",
+        "owner": "applicant|JAPA",
+        "due_in": "timing, e.g. 'Before application submission'",
+        "estimated_duration": "integer days",
+    }],
+}
+
+_CHECKLIST_OUTLINE_PREFIX = _CHECKLIST_PREFIX.replace(
+    f"Return ONLY JSON matching:{compact_json(_CHECKLIST_SCHEMA)}",
+    "Give only each step's title and timing; details are written separately.\n"
+    f"Return ONLY JSON matching:{compact_json(_CHECKLIST_OUTLINE_SCHEMA)}",
+)
+
+CHECKLIST_DETAIL_FIELDS = ("description", "guidance", "documents")
+
+_CHECKLIST_STEP_SCHEMA = {
+    "description": "what needs to be done",
+    "guidance": "tips and warnings",
+    "documents": ["string"],
+}
+
+_CHECKLIST_STEP_PREFIX = (
+    "You are an expert immigration advisor. Below is a visa option, its application "
+    "checklist outline, and one step of that outline. Write the details of that step "
+    "only, specific to the visa, actionable, and addressing the user as 'you'.\n"
+    f"Return ONLY JSON matching:{compact_json(_CHECKLIST_STEP_SCHEMA)}\n"
+    "Input JSON:"
+)
+
+
+def build_checklist_outline_prompt(visa_option: RecommendationOption) -> str:
+    payload = compact(visa_option.model_dump(include=set(CHECKLIST_OPTION_FIELDS), exclude_none=True))
+    return _fit_to_budget("checklist_outline", _CHECKLIST_OUTLINE_PREFIX, payload)
+
+
+def build_checklist_step_prompt(
+    visa_option: RecommendationOption, outline: List[str], step_title: str
+) -> str:
+    payload = compact({
+        "visa_option": visa_option.model_dump(include=set(CHECKLIST_OPTION_FIELDS), exclude_none=True),
+        "outline": outline,
+        "step": step_title,
+    })
+    return _fit_to_budget("checklist_step", _CHECKLIST_STEP_PREFIX, payload)
+
+
+def log_usage(kind: str, prompt: str, usage: Optional[Any], **extra: Any) -> None:
+    """Log the model-reported token usage next to the offline estimate."""
+    if usage is None:
+        return
+    logger.info("Model token usage", extra={
+        "prompt_kind": kind,
+        "prompt_tokens_estimated": estimate_tokens(prompt),
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        **extra,
+    })
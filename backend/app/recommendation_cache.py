@@ -0,0 +1,189 @@
+"""
+Content-addressed recommendation cache shared across users.
+
+Intakes are normalized (empty values dropped, text case-folded, lists sorted,
+money amounts reduced to bands) and hashed together with the prompt template
+version and model name. Users whose intakes normalize to the same payload get
+the stored model output instead of a fresh OpenAI call.
+"""
+import hashlib
+import json
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import persistence
+from app.models import RecommendationCache
+from app.schemas import IntakeData
+
+# Amounts (USD or budget currency) are compared by band, not exact value
+MONEY_FIELDS = {
+    "max_budget_usd",
+    "budget_amount",
+    "liquid_assets_usd",
+    "total_assets_usd",
+    "annual_income_usd",
+    "salary_usd",
+}
+MONEY_BANDS = (0, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+YEAR_FIELDS = {"total_experience_years", "experience_years_in_position"}
+
+
+def _money_band(value: float) -> str:
+    lower = MONEY_BANDS[0]
+    for bound in MONEY_BANDS:
+        if value >= bound:
+            lower = bound
+    upper_index = MONEY_BANDS.index(lower) + 1
+    upper = MONEY_BANDS[upper_index] if upper_index < len(MONEY_BANDS) else "inf"
+    return f"{lower}-{upper}"
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        text = " ".join(value.split()).casefold()
+        return text or None
+    if isinstance(value, list):
+        items = [_normalize_value(item) for item in value]
+        items = [item for item in items if item is not None]
+        if not items:
+            return None
+        return sorted({json.dumps(item, sort_keys=True) for item in items})
+    if isinstance(value, dict):
+        normalized = {
+            str(key).casefold(): _normalize_value(item) for key, item in value.items()
+        }
+        normalized = {key: item for key, item in normalized.items() if item is not None}
+        return normalized or None
+    return value
+
+
+def normalize_intake(intake: IntakeData) -> Dict[str, Any]:
+    """Canonical form of an intake used for cache keying."""
+    normalized: Dict[str, Any] = {}
+    for field, value in intake.model_dump(exclude_none=True).items():
+        if field in MONEY_FIELDS and isinstance(value, (int, float)) and math.isfinite(value):
+            normalized[field] = _money_band(float(value))
+            continue
+        if field in YEAR_FIELDS and isinstance(value, (int, float)) and math.isfinite(value):
+            normalized[field] = int(value)
+            continue
+        value = _normalize_value(value)
+        if value is not None:
+            normalized[field] = value
+    return normalized
+
+
+def intake_cache_key(intake: IntakeData, prompt_version: int, model: str) -> str:
+    payload = {
+        "intake": normalize_intake(intake),
+        "prompt_version": prompt_version,
+        "model": model,
+    }
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class CacheCounters:
+    """In-process lookup counters; persistent hit counts live on the rows."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+counters = CacheCounters()
+
+
+def lookup(db: Session, cache_key: str) -> Optional[str]:
+    """Return the cached raw model response for `cache_key`, counting the hit."""
+    now = datetime.now(timezone.utc)
+    entry = (
+        db.query(RecommendationCache)
+        .filter(
+            RecommendationCache.cache_key == cache_key,
+            RecommendationCache.expires_at > now,
+        )
+        .first()
+    )
+    if entry is None:
+        counters.incr("misses")
+        return None
+    raw_response = entry.raw_response
+    db.query(RecommendationCache).filter(RecommendationCache.id == entry.id).update(
+        {
+            RecommendationCache.hit_count: RecommendationCache.hit_count + 1,
+            RecommendationCache.last_hit_at: now,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    counters.incr("hits")
+    return raw_response
+
+
+def store(
+    db: Session,
+    cache_key: str,
+    model: str,
+    prompt_version: int,
+    raw_response: str,
+    ttl_seconds: int,
+) -> None:
+    """
+    Insert or refresh the cache entry for `cache_key`.
+
+    A single upsert, so two workers storing the same key at once both
+    succeed (the later write wins) instead of one hitting the unique
+    constraint.
+    """
+    now = datetime.now(timezone.utc)
+    persistence.upsert_returning(
+        db,
+        RecommendationCache,
+        {
+            "cache_key": cache_key,
+            "model": model,
+            "prompt_version": prompt_version,
+            "raw_response": raw_response,
+            "hit_count": 0,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+        },
+        conflict=("cache_key",),
+        update_columns=("model", "prompt_version", "raw_response", "hit_count", "expires_at"),
+    )
+    db.commit()
+    counters.incr("stores")
+
+
+def stats(db: Session) -> Dict[str, Any]:
+    """Lookup counters plus stored entry and lifetime hit totals."""
+    entries, total_hits = db.query(
+        func.count(RecommendationCache.id),
+        func.coalesce(func.sum(RecommendationCache.hit_count), 0),
+    ).one()
+    return {
+        **counters.snapshot(),
+        "entries": entries,
+        "lifetime_hits": int(total_hits),
+    }
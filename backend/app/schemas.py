@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -156,6 +156,7 @@ class RecommendationRequest(BaseModel):
     intake_id: Optional[str] = Field(default=None, description="Existing intake id to reuse")
     intake: Optional[IntakeData] = Field(default=None, description="Inline intake payload")
     use_cached: bool = Field(default=True, description="If true, return stored recommendation instead of calling ChatGPT")
+    enqueue: bool = Field(default=False, description="If true (with use_cached=False), queue the generation and return a job id")
     # Note: When use_cached=False and no intake_id/intake provided,
     # the backend will automatically fetch from the user's profile (onboarding_data)
 
@@ -316,6 +317,7 @@ class ChecklistResponse(BaseModel):
 class ChecklistFetchRequest(BaseModel):
     visa_type: str
     visa_option: Optional[RecommendationOption] = None
+    enqueue: bool = Field(default=False, description="If true, queue a needed generation and return a job id")
 
 
 class ChecklistCachedResponse(BaseModel):
@@ -323,6 +325,21 @@ class ChecklistCachedResponse(BaseModel):
     source: str = Field(default="cache")
     option_hash: Optional[str] = None
     cached_at: Optional[datetime] = None
+    # Generated for an older version of the visa option; a refresh is queued
+    stale: bool = False
+    refresh_job_id: Optional[int] = None
+
+
+class ChecklistStepRequest(BaseModel):
+    visa_type: str
+    step_id: str
+    visa_option: Optional[RecommendationOption] = None
+
+
+class ChecklistStepResponse(BaseModel):
+    step: dict
+    step_id: str
+    source: str = Field(default="cache")  # cache | ai
 
 
 # Checklist Progress schemas
@@ -335,6 +352,11 @@ class ChecklistProgressUpdate(BaseModel):
     progress_json: dict  # { "step-1": true, "step-2": false, ... }
 
 
+class ChecklistProgressDelta(BaseModel):
+    visa_type: str
+    steps: Dict[str, bool] = Field(..., min_length=1)  # only the toggled steps, e.g. { "step-3": true }
+
+
 class ChecklistProgressResponse(BaseModel):
     id: int
     user_id: int
@@ -545,3 +567,57 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     conversation_history: List[ChatMessage]
+
+
+# Background generation job schemas
+class JobAcceptedResponse(BaseModel):
+    job_id: int
+    kind: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatusResponse(BaseModel):
+    id: int
+    kind: str
+    status: str  # queued | running | succeeded | failed
+    attempts: int
+    max_attempts: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+# Eligibility pre-scoring schemas
+class EligibilityWhatIfRequest(BaseModel):
+    intake_id: Optional[str] = Field(default=None, description="Existing intake id to start from")
+    intake: Optional[IntakeData] = Field(default=None, description="Inline intake to start from")
+    changes: Dict[str, Any] = Field(default_factory=dict, description="Intake fields to override, e.g. {\"max_budget_usd\": 20000}")
+    destination: Optional[str] = Field(default=None, description="Only score programs in this country")
+    # When neither intake_id nor intake is given, the user's onboarding data is used
+
+
+class EligibilityProgramResult(BaseModel):
+    code: str
+    name: str
+    country: str
+    category: str
+    score: int
+    status: str  # eligible | possible | unlikely | not_eligible
+    reasons: List[str] = Field(default_factory=list)
+    baseline_score: Optional[int] = None
+    baseline_status: Optional[str] = None
+    score_change: Optional[int] = None
+
+
+class EligibilityWhatIfResponse(BaseModel):
+    programs: List[EligibilityProgramResult]
+    changed_fields: List[str]
+    programs_version: int
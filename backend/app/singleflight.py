@@ -0,0 +1,233 @@
+"""
+Single-flight coalescing of duplicate generations.
+
+Concurrent calls for the same key share one in-flight coroutine: the first
+caller (the leader) runs it and every other caller in the process awaits the
+leader's result.
+
+Across uvicorn workers the leader also takes a Postgres advisory lock derived
+from the key. A leader in another worker that finds the lock taken waits for
+it to be released and then runs `recheck`, which reads what the first worker
+stored (cached checklist, freshly written recommendation row). Only when
+recheck finds nothing does it generate itself. Lock connections come from a
+separate small pool (SINGLE_FLIGHT_LOCK_POOL_SIZE, no overflow) so a long
+generation never holds a connection from the request pool and a burst of
+distinct keys cannot open connections without bound; a leader that finds the
+lock pool exhausted generates without the cross-worker lock.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.config import get_settings
+from app.database import DATABASE_URL, engine
+
+logger = logging.getLogger("singleflight")
+
+T = TypeVar("T")
+
+# How long a leader waits for a free lock connection before going unlocked
+LOCK_POOL_TIMEOUT_SECONDS = 1.0
+
+
+def advisory_lock_id(key: str) -> int:
+    """Map a key onto the signed 64-bit id space of pg advisory locks."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        distributed: bool,
+        wait_seconds: float,
+        poll_seconds: float,
+        lock_pool_size: int = 5,
+    ) -> None:
+        self.distributed = distributed
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self.lock_pool_size = lock_pool_size
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._lock_engine: Optional[Engine] = None
+        self._engine_lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+        self.lock_timeouts = 0
+        self.recheck_hits = 0
+        self.lock_pool_exhausted = 0
+
+    def _get_lock_engine(self) -> Engine:
+        with self._engine_lock:
+            if self._lock_engine is None:
+                self._lock_engine = create_engine(
+                    DATABASE_URL,
+                    pool_size=max(1, self.lock_pool_size),
+                    max_overflow=0,
+                    pool_timeout=LOCK_POOL_TIMEOUT_SECONDS,
+                    pool_recycle=get_settings().db_pool_recycle,
+                    pool_pre_ping=True,
+                )
+            return self._lock_engine
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        recheck: Optional[Callable[[datetime], Awaitable[Optional[T]]]] = None,
+    ) -> T:
+        """
+        Run `fn` once per key across concurrent callers.
+
+        `recheck(waited_since)` is only used across workers: it is called after
+        waiting on another worker's lock, with the database time at which the
+        wait began, and returns that worker's stored result (or None).
+        Without a recheck there is nothing to hand over between workers, so
+        coalescing is in-process only.
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled (client went away); take over
+                # unless it is this caller that is being cancelled.
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; don't let an unretrieved exception warn
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await self._lead(key, fn, recheck)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _lead(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        recheck: Optional[Callable[[datetime], Awaitable[Optional[T]]]],
+    ) -> T:
+        if recheck is None or not self.distributed or engine.dialect.name != "postgresql":
+            return await fn()
+
+        lock_id = advisory_lock_id(key)
+        conn, waited_since = await self._acquire(key, lock_id)
+        try:
+            if waited_since is not None:
+                result = await recheck(waited_since)
+                if result is not None:
+                    self.recheck_hits += 1
+                    return result
+            return await fn()
+        finally:
+            if conn is not None:
+                await run_in_threadpool(self._release, conn, lock_id)
+
+    async def _acquire(
+        self, key: str, lock_id: int
+    ) -> Tuple[Optional[Connection], Optional[datetime]]:
+        """
+        Take the advisory lock for `lock_id`, polling while another worker holds it.
+
+        Returns the connection holding the lock (None if the wait timed out or
+        no lock connection was free, and the caller proceeds unlocked) and the
+        time the wait began, or None if there was no wait.
+        """
+        try:
+            conn = await run_in_threadpool(self._get_lock_engine().connect)
+        except PoolTimeoutError:
+            self.lock_pool_exhausted += 1
+            logger.warning("Advisory lock pool exhausted; generating without the lock", extra={"key": key})
+            return None, None
+        waited_since: Optional[datetime] = None
+        deadline = time.monotonic() + self.wait_seconds
+        try:
+            while True:
+                acquired, db_now = await run_in_threadpool(self._try_lock, conn, lock_id)
+                if acquired:
+                    return conn, waited_since
+                if waited_since is None:
+                    waited_since = db_now
+                    self.lock_waits += 1
+                if time.monotonic() >= deadline:
+                    self.lock_timeouts += 1
+                    logger.warning(
+                        "Timed out waiting for in-flight generation in another worker",
+                        extra={"key": key},
+                    )
+                    await run_in_threadpool(conn.close)
+                    return None, waited_since
+                await asyncio.sleep(self.poll_seconds)
+        except BaseException:
+            await run_in_threadpool(conn.close)
+            raise
+
+    @staticmethod
+    def _try_lock(conn: Connection, lock_id: int) -> Tuple[bool, datetime]:
+        row = conn.execute(
+            text("SELECT pg_try_advisory_lock(:lock_id), now()"), {"lock_id": lock_id}
+        ).one()
+        conn.commit()
+        return bool(row[0]), row[1]
+
+    @staticmethod
+    def _release(conn: Connection, lock_id: int) -> None:
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+            conn.commit()
+        except Exception:
+            # Never hand a connection that may still hold the lock back to the
+            # pool; dropping its database session releases the lock
+            conn.invalidate()
+            raise
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "distributed": self.distributed and engine.dialect.name == "postgresql",
+            "lock_waits": self.lock_waits,
+            "lock_timeouts": self.lock_timeouts,
+            "recheck_hits": self.recheck_hits,
+            "lock_pool_size": self.lock_pool_size,
+            "lock_pool_exhausted": self.lock_pool_exhausted,
+        }
+
+
+_settings = get_settings()
+generation_flight = SingleFlight(
+    distributed=_settings.single_flight_distributed,
+    wait_seconds=_settings.single_flight_wait_seconds,
+    poll_seconds=_settings.single_flight_poll_seconds,
+    lock_pool_size=_settings.single_flight_lock_pool_size,
+)
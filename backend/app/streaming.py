@@ -0,0 +1,125 @@
+"""
+Incremental parsing of streamed recommendation JSON and SSE formatting.
+
+The model streams one JSON document token by token. RecommendationStreamParser
+tracks just enough JSON structure (strings, nesting, object keys) to notice
+when the top-level summary string or an element of the top-level
+recommendations array has closed, and hands those values out immediately
+instead of waiting for the whole document.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+SUMMARY_KEYS = ("summary", "insight_summary")
+LIST_KEYS = ("recommendations", "options", "visa_options")
+
+
+class _Frame:
+    __slots__ = ("kind", "expecting_key", "key")
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind  # "{" or "["
+        self.expecting_key = kind == "{"
+        self.key: Optional[str] = None
+
+
+class RecommendationStreamParser:
+    """
+    Feed streamed text chunks; get back ("summary", str) and
+    ("recommendation", dict) events as soon as each value is complete.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._capture_start: Optional[int] = None
+        self._capture_depth = 0
+        self._summary_emitted = False
+        self.recommendations_emitted = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        events: List[Tuple[str, Any]] = []
+        text = self.text
+        while self._pos < len(text):
+            idx = self._pos
+            ch = text[idx]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(idx, events)
+                continue
+
+            if not self._stack and ch != "{":
+                # Skip anything before the document starts (e.g. a ```json fence)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = idx
+            elif ch in "{[":
+                self._on_open(ch, idx)
+            elif ch in "}]":
+                self._on_close(idx, events)
+            elif ch == ":" and self._stack and self._stack[-1].kind == "{":
+                self._stack[-1].expecting_key = False
+            elif ch == "," and self._stack and self._stack[-1].kind == "{":
+                self._stack[-1].expecting_key = True
+                self._stack[-1].key = None
+        return events
+
+    def _on_string(self, end: int, events: List[Tuple[str, Any]]) -> None:
+        frame = self._stack[-1] if self._stack else None
+        if frame is None or frame.kind != "{":
+            return
+        try:
+            value = json.loads(self.text[self._string_start:end + 1])
+        except json.JSONDecodeError:
+            return
+        if frame.expecting_key:
+            frame.key = value
+        elif len(self._stack) == 1 and frame.key in SUMMARY_KEYS and not self._summary_emitted:
+            self._summary_emitted = True
+            events.append(("summary", value))
+
+    def _on_open(self, ch: str, idx: int) -> None:
+        # An object opening directly inside the top-level recommendations array
+        if (
+            ch == "{"
+            and self._capture_start is None
+            and len(self._stack) == 2
+            and self._stack[1].kind == "["
+            and self._stack[0].key in LIST_KEYS
+        ):
+            self._capture_start = idx
+            self._capture_depth = len(self._stack) + 1
+        self._stack.append(_Frame(ch))
+
+    def _on_close(self, idx: int, events: List[Tuple[str, Any]]) -> None:
+        if self._capture_start is not None and len(self._stack) == self._capture_depth:
+            try:
+                obj = json.loads(self.text[self._capture_start:idx + 1])
+            except json.JSONDecodeError:
+                obj = None
+            self._capture_start = None
+            if isinstance(obj, dict):
+                self.recommendations_emitted += 1
+                events.append(("recommendation", obj))
+        if self._stack:
+            self._stack.pop()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,127 @@
+"""
+Speculative checklist warming after a recommendation is generated.
+
+Most users open the checklists of the top few recommended options right
+after /recommendations returns. The warmer generates those checklists in
+background tasks so the later /checklist calls are cache hits. Warming is
+bounded in two ways: a semaphore caps concurrent warm generations per
+process, and each user has an hourly budget of warmed options so repeated
+regenerations cannot turn into a stream of speculative OpenAI calls. An
+option whose checklist is already warm is skipped without touching the
+budget, so regenerating the same recommendation does not use it up.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from app.config import Settings
+
+logger = logging.getLogger("checklists")
+
+BUDGET_WINDOW_SECONDS = 3600.0
+MAX_TRACKED_USERS = 10_000
+
+WarmTask = Callable[[], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class WarmItem:
+    # Whether the checklist still has to be generated
+    needed: Callable[[], Awaitable[bool]]
+    run: WarmTask
+
+
+class ChecklistWarmer:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spent: Dict[int, Deque[float]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.scheduled = 0
+        self.warmed = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.already_warm = 0
+
+    def _take_budget(self, user_id: int, per_hour: int) -> bool:
+        """Reserve one warming from the user's hourly budget; False when it is spent."""
+        now = time.monotonic()
+        with self._lock:
+            spent = self._spent.setdefault(user_id, deque())
+            while spent and now - spent[0] > BUDGET_WINDOW_SECONDS:
+                spent.popleft()
+            granted = len(spent) < per_hour
+            if granted:
+                spent.append(now)
+                self.scheduled += 1
+            else:
+                self.over_budget += 1
+            if len(self._spent) > MAX_TRACKED_USERS:
+                # Forget users with nothing spent in the window
+                for uid in [uid for uid, times in self._spent.items() if not times or now - times[-1] > BUDGET_WINDOW_SECONDS]:
+                    del self._spent[uid]
+            return granted
+
+    def schedule(self, settings: Settings, user_id: int, items: List[WarmItem]) -> int:
+        """Check and warm the top options in the background; returns how many were started."""
+        if not settings.checklist_warm_enabled or not items:
+            return 0
+        items = items[: settings.checklist_warm_max_options]
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, settings.checklist_warm_concurrency))
+        for item in items:
+            background = asyncio.create_task(
+                self._run(user_id, item, settings.checklist_warm_per_user_per_hour)
+            )
+            self._tasks.add(background)
+            background.add_done_callback(self._tasks.discard)
+        return len(items)
+
+    async def _run(self, user_id: int, item: WarmItem, per_hour: int) -> None:
+        async with self._semaphore:
+            try:
+                if not await item.needed():
+                    with self._lock:
+                        self.already_warm += 1
+                    return
+                # Only a generation that actually starts is charged
+                if not self._take_budget(user_id, per_hour):
+                    logger.info("Checklist warming over budget", extra={"user_id": user_id})
+                    return
+                await item.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                with self._lock:
+                    self.failed += 1
+                logger.warning(f"Checklist warming failed: {exc}", extra={"user_id": user_id})
+                return
+        with self._lock:
+            self.warmed += 1
+
+    async def stop(self) -> None:
+        """Cancel warm tasks still running (they are only speculative)."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._tasks),
+                "scheduled": self.scheduled,
+                "warmed": self.warmed,
+                "failed": self.failed,
+                "over_budget": self.over_budget,
+                "already_warm": self.already_warm,
+                "tracked_users": len(self._spent),
+            }
+
+
+checklist_warmer = ChecklistWarmer()
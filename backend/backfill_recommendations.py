@@ -0,0 +1,75 @@
+"""
+Backfill script: reparse stored recommendations with the current parser.
+
+Rows whose parser_version differs from app.parsing.PARSER_VERSION (including
+rows written before the column existed) get their output_data rebuilt from
+raw_response, in id-ordered batches with one commit per batch. Cached reads
+already do this lazily; run this after bumping PARSER_VERSION to avoid
+paying the reparse on users' first request.
+
+    python backfill_recommendations.py --batch-size 500
+"""
+import argparse
+
+from sqlalchemy import or_
+
+from app.database import SessionLocal, engine
+from app.migrations import (
+    ensure_recommendation_parser_version_column,
+    ensure_recommendation_schema_version_column,
+)
+from app.models import Recommendation
+from app.parsing import PARSER_VERSION, reparse_stored
+
+
+def backfill_recommendations(batch_size: int = 500, dry_run: bool = False) -> None:
+    """Reparse outdated recommendation rows in batches"""
+    ensure_recommendation_parser_version_column(engine)
+    ensure_recommendation_schema_version_column(engine)
+
+    db = SessionLocal()
+    last_id = 0
+    scanned = updated = unparseable = 0
+    try:
+        while True:
+            rows = db.query(Recommendation).filter(
+                Recommendation.id > last_id,
+                Recommendation.raw_response.isnot(None),
+                or_(
+                    Recommendation.parser_version.is_(None),
+                    Recommendation.parser_version != PARSER_VERSION,
+                ),
+            ).order_by(Recommendation.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for row in rows:
+                scanned += 1
+                output = reparse_stored(row.raw_response, row.schema_version)
+                # Unparseable rows keep their output_data but are stamped too,
+                # so neither this script nor cached reads retry them
+                row.parser_version = PARSER_VERSION
+                if output is None:
+                    unparseable += 1
+                    continue
+                row.output_data = output
+                updated += 1
+
+            last_id = rows[-1].id
+            if dry_run:
+                db.rollback()
+            else:
+                db.commit()
+            print(f"Processed up to id {last_id}: {updated} updated, {unparseable} unparseable")
+
+        print(f"\nBackfill completed! Scanned {scanned}, updated {updated}, kept the output of {unparseable} unparseable.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reparse stored recommendations with the current parser")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Reparse without writing changes")
+    args = parser.parse_args()
+    backfill_recommendations(batch_size=args.batch_size, dry_run=args.dry_run)
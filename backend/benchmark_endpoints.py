@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for read endpoints against a running API server.
+
+Run the server once with DATABASE_ASYNC=false and once with DATABASE_ASYNC=true,
+then compare the numbers, e.g.:
+
+    python benchmark_endpoints.py --token <jwt> --concurrency 200 --requests 4000 \
+        /conversations /travel-agents/list
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+
+async def run_path(client: httpx.AsyncClient, path: str, total: int, concurrency: int) -> None:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+    lock = asyncio.Lock()
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while True:
+            async with lock:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(f"{path}")
+    print(f"  requests:   {len(latencies)} ({errors} errors) in {elapsed:.2f}s")
+    print(f"  throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"  latency:    p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Endpoint paths to benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", default=None, help="Bearer token for authenticated endpoints")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per path")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits, timeout=60) as client:
+        for path in args.paths:
+            await run_path(client, path, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
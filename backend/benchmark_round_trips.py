@@ -0,0 +1,122 @@
+"""
+Database round trips per request for the create/update endpoints.
+
+Drives the app in-process with FastAPI's TestClient against DATABASE_URL
+(point it at a scratch database) and counts the statements and commits each
+request sends to the database. Run it on the commit before the upsert write
+path and on the current one to compare, e.g.:
+
+    DATABASE_URL=postgresql://localhost/visa_bench python benchmark_round_trips.py --requests 20
+
+Each endpoint is called once to create its row and then --requests times to
+update it; the numbers printed are per-request averages of the updates.
+Authentication lookups are included, so only differences between runs are
+meaningful.
+"""
+import argparse
+import statistics
+import uuid
+from typing import Callable, Dict, List
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app
+
+
+class RoundTripCounter:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.commits = 0
+
+
+def register_credentials(client: TestClient, role: str) -> Dict[str, str]:
+    """Register a fresh user; returns the /auth/login form for it."""
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = "bench-password"
+    response = client.post("/auth/register", json={"email": email, "name": "Bench", "password": password, "role": role})
+    response.raise_for_status()
+    return {"username": email, "password": password}
+
+
+def register(client: TestClient, role: str) -> Dict[str, str]:
+    form = register_credentials(client, role)
+    token = client.post("/auth/login", data=form).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def measure(counter: RoundTripCounter, name: str, call: Callable[[], object], total: int) -> None:
+    statements: List[int] = []
+    commits: List[int] = []
+    errors = 0
+    for _ in range(total):
+        counter.reset()
+        response = call()
+        if response.status_code >= 400:
+            errors += 1
+        statements.append(counter.statements)
+        commits.append(counter.commits)
+    print(f"{name}")
+    print(f"  requests:   {total} ({errors} errors)")
+    print(f"  statements: {statistics.mean(statements):.1f} per request")
+    print(f"  commits:    {statistics.mean(commits):.1f} per request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per endpoint")
+    args = parser.parse_args()
+
+    counter = RoundTripCounter()
+    with TestClient(app) as client:
+        counter.reset()
+        register(client, "USER")
+        print("POST /auth/register + login")
+        print(f"  statements: {counter.statements}, commits: {counter.commits}")
+
+        user = register(client, "USER")
+        agent = register(client, "TRAVEL_AGENT")
+        agent_id = client.get("/auth/me", headers=agent).json()["id"]
+
+        profile = {"onboarding_data": {"nationality": "Nigerian"}}
+        client.post("/profile", json=profile, headers=user)
+        measure(counter, "POST /profile", lambda: client.post("/profile", json=profile, headers=user), args.requests)
+        measure(counter, "PUT /profile", lambda: client.put("/profile", json=profile, headers=user), args.requests)
+
+        agent_profile = {"onboarding_data": None}
+        client.post("/travel-agents/profile", json=agent_profile, headers=agent)
+        measure(
+            counter,
+            "PUT /travel-agents/profile",
+            lambda: client.put("/travel-agents/profile", json=agent_profile, headers=agent),
+            args.requests,
+        )
+
+        progress = {"visa_type": "bench", "progress_json": {"step-1": True, "step-2": False}}
+        measure(
+            counter,
+            "PUT /checklist/progress",
+            lambda: client.put("/checklist/progress", json=progress, headers=user),
+            args.requests,
+        )
+
+        conversation = client.post("/conversations", json={"agent_id": agent_id}, headers=user).json()
+        message = {"conversation_id": conversation["id"], "content": "Round trip benchmark"}
+        measure(counter, "POST /messages", lambda: client.post("/messages", json=message, headers=user), args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Database round trips per request with legacy versus stateless access tokens.
+
+Logs the same user and travel agent in twice, once with STATELESS_TOKENS off
+(email-only tokens, so every request loads the user row) and once with it
+on (id/role/active/version claims), then calls the claims-authorized agent
+and messaging endpoints with each token and counts the statements sent to
+the database. Runs in-process against DATABASE_URL; point it at a scratch
+database:
+
+    DATABASE_URL=postgresql://localhost/visa_bench python benchmark_stateless_tokens.py --requests 50
+
+By default the principal cache is cleared before every request, which shows
+the cost of a cold lookup; --warm-principal-cache keeps it, which is what a
+process serving one user repeatedly sees.
+"""
+import argparse
+import statistics
+from typing import Dict, List
+
+from fastapi.testclient import TestClient
+
+from app.auth import principal_cache
+from app.config import get_settings
+from app.main import app
+from benchmark_round_trips import RoundTripCounter, register_credentials
+
+
+def average_statements(
+    client: TestClient,
+    counter: RoundTripCounter,
+    path: str,
+    headers: Dict[str, str],
+    total: int,
+    warm: bool,
+) -> float:
+    statements: List[int] = []
+    for _ in range(total):
+        if not warm:
+            principal_cache.clear()
+        counter.reset()
+        response = client.get(path, headers=headers)
+        response.raise_for_status()
+        statements.append(counter.statements)
+    return statistics.mean(statements)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests per endpoint and token format")
+    parser.add_argument("--warm-principal-cache", action="store_true")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    counter = RoundTripCounter()
+    with TestClient(app) as client:
+        tokens: Dict[bool, Dict[str, Dict[str, str]]] = {}
+        credentials = {}
+        for role in ("USER", "TRAVEL_AGENT"):
+            credentials[role] = register_credentials(client, role)
+        for stateless in (False, True):
+            settings.stateless_tokens = stateless
+            tokens[stateless] = {
+                role: {"Authorization": f"Bearer {client.post('/auth/login', data=form).json()['access_token']}"}
+                for role, form in credentials.items()
+            }
+        settings.stateless_tokens = False
+
+        user, agent = tokens[False]["USER"], tokens[False]["TRAVEL_AGENT"]
+        agent_id = client.get("/auth/me", headers=agent).json()["id"]
+        conversation = client.post("/conversations", json={"agent_id": agent_id}, headers=user).json()
+        client.post("/messages", json={"conversation_id": conversation["id"], "content": "Hello"}, headers=user)
+
+        endpoints = [
+            ("USER", "/conversations"),
+            ("USER", f"/conversations/{conversation['id']}"),
+            ("USER", f"/conversations/{conversation['id']}/messages"),
+            ("USER", "/checklist/progress/all"),
+            ("TRAVEL_AGENT", "/conversations"),
+            ("TRAVEL_AGENT", f"/conversations/{conversation['id']}/messages"),
+        ]
+        print(f"{'endpoint':<48} {'role':<13} {'legacy':>8} {'stateless':>10}")
+        for role, path in endpoints:
+            legacy = average_statements(client, counter, path, tokens[False][role], args.requests, args.warm_principal_cache)
+            stateless = average_statements(client, counter, path, tokens[True][role], args.requests, args.warm_principal_cache)
+            print(f"GET {path:<44} {role:<13} {legacy:>8.1f} {stateless:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Output-size benchmark of the recommendation wire formats (v1 vs v2).
+
+Takes a corpus of recorded v1 model responses, either exported to a file or
+read straight from the recommendations table, and rewrites each one into the
+v2 format (top_recommendation replaced by top_recommendation_index). It then
+compares estimated output tokens and the decode time those tokens cost at a
+given generation speed. It also checks that both formats parse to the same
+options in the same order.
+
+    python benchmark_wire_format.py --from-db --limit 500
+    python benchmark_wire_format.py responses.jsonl --tokens-per-second 70
+
+A corpus file holds one raw response per line (JSON strings or objects), or
+is a JSON array of them.
+"""
+import argparse
+import json
+import statistics
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.parsing import parse_recommendation
+from app.prompts import estimate_tokens
+
+
+def load_corpus_file(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    try:
+        items = json.loads(text)
+        if not isinstance(items, list):
+            items = [items]
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [item if isinstance(item, str) else json.dumps(item, indent=2) for item in items]
+
+
+def load_corpus_db(limit: int) -> List[str]:
+    from app.database import SessionLocal
+    from app.models import Recommendation
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Recommendation.raw_response).filter(
+            Recommendation.raw_response.isnot(None),
+            Recommendation.schema_version.is_(None) | (Recommendation.schema_version == 1),
+        ).order_by(Recommendation.id.desc()).limit(limit).all()
+        return [row[0] for row in rows]
+    finally:
+        db.close()
+
+
+def to_v2(raw: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Rewrite a v1 response as v2, keeping the original whitespace style."""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or "top_recommendation" not in data:
+        return None
+    recommendations = data.get("recommendations") or []
+    top = data.pop("top_recommendation")
+    index = next((i for i, rec in enumerate(recommendations) if rec == top), 0)
+    data["top_recommendation_index"] = index
+    indent = 2 if "\n" in raw.strip() else None
+    return data, json.dumps(data, indent=indent, ensure_ascii=False)
+
+
+def same_options(v1_raw: str, v2_raw: str) -> bool:
+    v1 = parse_recommendation(v1_raw, 1)
+    v2 = parse_recommendation(v2_raw, 2)
+    if not v1 or not v2:
+        return False
+    return [opt.visa_type for opt in v1.options] == [opt.visa_type for opt in v2.options]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", help="File of recorded v1 responses")
+    parser.add_argument("--from-db", action="store_true", help="Read v1 responses from the recommendations table")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=60.0,
+        help="Model decode speed used to convert output tokens into wall time",
+    )
+    args = parser.parse_args()
+
+    if args.from_db:
+        corpus = load_corpus_db(args.limit)
+    elif args.corpus:
+        corpus = load_corpus_file(args.corpus)
+    else:
+        parser.error("pass a corpus file or --from-db")
+
+    v1_tokens: List[int] = []
+    v2_tokens: List[int] = []
+    skipped = mismatched = 0
+    for raw in corpus:
+        converted = to_v2(raw)
+        if converted is None:
+            skipped += 1
+            continue
+        _, v2_raw = converted
+        if not same_options(raw, v2_raw):
+            mismatched += 1
+        v1_tokens.append(estimate_tokens(raw))
+        v2_tokens.append(estimate_tokens(v2_raw))
+
+    if not v1_tokens:
+        print(f"No v1 responses with top_recommendation found ({skipped} skipped)")
+        sys.exit(1)
+
+    total_v1 = sum(v1_tokens)
+    total_v2 = sum(v2_tokens)
+    tps = args.tokens_per_second
+    print(f"responses:         {len(v1_tokens)} ({skipped} skipped, {mismatched} parse mismatches)")
+    print(f"output tokens v1:  mean {statistics.mean(v1_tokens):.0f}, median {statistics.median(v1_tokens):.0f}")
+    print(f"output tokens v2:  mean {statistics.mean(v2_tokens):.0f}, median {statistics.median(v2_tokens):.0f}")
+    print(f"reduction:         {(1 - total_v2 / total_v1) * 100:.1f}% of output tokens")
+    print(
+        f"decode time @ {tps:g} tok/s: v1 {statistics.mean(v1_tokens) / tps:.1f}s, "
+        f"v2 {statistics.mean(v2_tokens) / tps:.1f}s per generation"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Migration script: move inline checklists into the shared checklist_contents table.
+
+Per-user checklist_cache rows written before checklist_contents existed carry
+their own copy of the checklist JSON. For each option hash the oldest row's
+checklist becomes the shared content, and every row of that hash with an
+identical checklist is pointed at it and has its inline copy cleared. Rows
+whose checklist differs in any way keep their copy: step ids are positional
+(step-1..N), so matching ids alone would re-point a user's ChecklistProgress
+at someone else's steps. Rows without an option hash are keyed by a hash of
+their content, so only identical checklists are merged.
+
+    python dedupe_checklists.py --batch-size 500
+"""
+import argparse
+import hashlib
+import json
+from typing import Any, Dict, Tuple
+
+from app.database import SessionLocal, engine
+from app.migrations import ensure_checklist_cache_content_column
+from app.models import Base, ChecklistCache, ChecklistContent
+
+
+def _checklist_digest(checklist: Any) -> str:
+    serialized = json.dumps(checklist, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _content_key(row: ChecklistCache) -> str:
+    if row.option_hash:
+        return row.option_hash
+    return "content:" + _checklist_digest(row.checklist_json)
+
+
+def dedupe_checklists(batch_size: int = 500, dry_run: bool = False) -> None:
+    """Link inline checklist_cache rows to shared content, oldest row first"""
+    Base.metadata.create_all(bind=engine, tables=[ChecklistContent.__table__])
+    ensure_checklist_cache_content_column(engine)
+
+    db = SessionLocal()
+    last_id = 0
+    scanned = linked = kept = created = 0
+    # content key -> (content id, checklist digest) of the shared row
+    shared: Dict[str, Tuple[int, str]] = {}
+    try:
+        while True:
+            rows = db.query(ChecklistCache).filter(
+                ChecklistCache.id > last_id,
+                ChecklistCache.content_id.is_(None),
+                ChecklistCache.checklist_json.isnot(None),
+            ).order_by(ChecklistCache.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for row in rows:
+                scanned += 1
+                key = _content_key(row)
+                digest = _checklist_digest(row.checklist_json)
+                if key not in shared:
+                    content = db.query(ChecklistContent).filter(ChecklistContent.option_hash == key).first()
+                    if content is None:
+                        content = ChecklistContent(
+                            option_hash=key,
+                            checklist_json=row.checklist_json,
+                            source="migrated",
+                        )
+                        db.add(content)
+                        db.flush()
+                        created += 1
+                    shared[key] = (content.id, _checklist_digest(content.checklist_json))
+
+                content_id, shared_digest = shared[key]
+                if digest != shared_digest:
+                    kept += 1
+                    continue
+                row.content_id = content_id
+                row.checklist_json = None
+                linked += 1
+
+            last_id = rows[-1].id
+            if dry_run:
+                db.rollback()
+                # Nothing was written, so ids flushed in this batch are not real
+                shared.clear()
+            else:
+                db.commit()
+            print(f"Processed up to id {last_id}: {linked} linked, {kept} kept inline, {created} shared contents")
+
+        print(
+            f"\nDedupe completed! Scanned {scanned}, linked {linked} to {created} new shared "
+            f"contents, kept {kept} inline."
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline checklists into shared checklist_contents")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing changes")
+    args = parser.parse_args()
+    dedupe_checklists(batch_size=args.batch_size, dry_run=args.dry_run)
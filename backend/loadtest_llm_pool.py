@@ -0,0 +1,172 @@
+"""
+Load test: database connections held while recommendation generations wait
+on the model.
+
+Runs the app in-process with the OpenAI client pointed at a local stand-in
+that answers every chat completion after --llm-delay seconds. It fires
+--concurrency simultaneous POST /recommendations generations (distinct
+intakes, so nothing is coalesced or served from the shared cache). While
+they run, it samples how many DB connections are checked out and times a
+cheap endpoint. With the read / LLM / write split, checkouts stay near zero
+while completions are in flight instead of rising with the number of
+waiting generations.
+
+    DATABASE_URL=postgresql://localhost/visa_bench DB_POOL_SIZE=5 DB_MAX_OVERFLOW=0 \\
+        BCRYPT_ROUNDS=4 python loadtest_llm_pool.py --concurrency 20 --llm-delay 3
+
+Run it on the commit before the connection release and on the current one
+to compare; with a pool smaller than --concurrency the old code also shows
+the cheap endpoint queueing behind the generations.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+from openai import AsyncOpenAI
+
+from app import llm
+from app.config import get_settings
+from app.database import pool_metrics
+from app.main import app
+
+
+class StandInOpenAI:
+    """Answers chat completions after a fixed delay, counting calls in flight."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.in_flight = 0
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        content = json.dumps({
+            "top_recommendation_index": 0,
+            "recommendations": [
+                {
+                    "visa_type": "Skilled Worker",
+                    "reasoning": "Stand-in recommendation for the load test.",
+                    "likelihood": "high",
+                },
+            ],
+        })
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stand-in",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+
+def checked_out() -> int:
+    snapshot = pool_metrics.snapshot()
+    return snapshot["checkouts"] - snapshot["checkins"]
+
+
+async def register(client: httpx.AsyncClient) -> Dict[str, str]:
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    password = "load-password"
+    response = await client.post("/auth/register", json={"email": email, "name": "Load", "password": password})
+    response.raise_for_status()
+    response = await client.post("/auth/login", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run(concurrency: int, llm_delay: float, sample_interval: float) -> None:
+    settings = get_settings()
+    settings.recommendation_cache_enabled = False
+    settings.checklist_warm_enabled = False
+    stand_in = StandInOpenAI(llm_delay)
+    llm._client = AsyncOpenAI(
+        api_key="stand-in",
+        base_url="http://openai.stand-in/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(stand_in)),
+        max_retries=0,
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+        users = [await register(client) for _ in range(concurrency)]
+        probe_user = users[0]
+        baseline = checked_out()
+
+        samples: List[int] = []
+        probe_latencies: List[float] = []
+        done = asyncio.Event()
+
+        async def sample() -> None:
+            while not done.is_set():
+                if stand_in.in_flight:
+                    samples.append(checked_out() - baseline)
+                await asyncio.sleep(sample_interval)
+
+        async def probe() -> None:
+            while not done.is_set():
+                if stand_in.in_flight:
+                    started = time.perf_counter()
+                    await client.get("/checklist/progress/all", headers=probe_user)
+                    probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(sample_interval * 5)
+
+        async def generate(idx: int, headers: Dict[str, str]) -> int:
+            intake: Dict[str, Any] = {
+                "nationality": f"Loadtestia-{idx}",
+                "preferred_destinations": "United Kingdom",
+            }
+            response = await client.post(
+                "/recommendations",
+                json={"use_cached": False, "intake": intake},
+                headers=headers,
+            )
+            return response.status_code
+
+        watchers = [asyncio.create_task(sample()), asyncio.create_task(probe())]
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(generate(idx, headers) for idx, headers in enumerate(users)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*watchers)
+
+    failed = sum(1 for code in statuses if code >= 400)
+    print(f"generations:        {len(statuses)} ({failed} failed) in {elapsed:.2f}s")
+    print(f"LLM calls:          {stand_in.calls}, {llm_delay:.1f}s each")
+    if samples:
+        print(
+            f"checked out during LLM wait: max {max(samples)}, "
+            f"mean {statistics.mean(samples):.2f} ({len(samples)} samples)"
+        )
+    if probe_latencies:
+        probe_latencies.sort()
+        print(
+            f"GET /checklist/progress/all during LLM wait: p50 "
+            f"{statistics.median(probe_latencies) * 1000:.1f} ms, max {probe_latencies[-1] * 1000:.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20, help="Simultaneous generations")
+    parser.add_argument("--llm-delay", type=float, default=3.0, help="Seconds the stand-in takes per completion")
+    parser.add_argument("--sample-interval", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.llm_delay, args.sample_interval))
+
+
+if __name__ == "__main__":
+    main()
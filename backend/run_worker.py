@@ -0,0 +1,41 @@
+"""
+Standalone worker for queued recommendation / checklist generations.
+
+Run any number of these next to (or instead of) the in-process workers,
+e.g. with JOB_WORKERS=0 on the API processes:
+
+    python run_worker.py --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.jobs import JobWorker
+
+# Importing the app registers the job handlers
+import app.main  # noqa: F401
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Process queued generation jobs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=max(settings.job_workers, 1),
+        help="Jobs run concurrently by this process",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    worker = JobWorker(settings, args.concurrency)
+    print(f"Worker {worker.worker_id} processing jobs with concurrency {args.concurrency}")
+    try:
+        asyncio.run(worker.run_forever())
+    except KeyboardInterrupt:
+        print("Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
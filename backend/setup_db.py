@@ -5,8 +5,8 @@ Alternatively, tables are created automatically when the FastAPI app starts.
 """
 from app.database import engine, Base
 from app.models import (
-    User, UserProfile, Recommendation, Document, ChecklistProgress, ChecklistCache,
-    TravelAgentProfile, Conversation, Message
+    User, UserProfile, Recommendation, RecommendationCache, GenerationJob, Document, ChecklistProgress,
+    ChecklistContent, ChecklistCache, TravelAgentProfile, Conversation, Message
 )
 from app.migrations import ensure_role_column
 
@@ -19,6 +19,7 @@ if __name__ == "__main__":
     print("  - users (with role field)")
     print("  - user_profiles")
     print("  - recommendations")
+    print("  - recommendation_cache")
     print("  - documents")
     print("  - checklist_progress")
     print("  - checklist_cache")
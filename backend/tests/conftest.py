@@ -0,0 +1,31 @@
+"""
+Test configuration.
+
+The app reads its settings and creates its engines at import time, so the
+environment is pinned here, before any test module imports `app`: tests run
+against a throwaway SQLite database and never reach a real OpenAI key.
+"""
+import os
+import tempfile
+
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="visa-agent-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["DATABASE_ASYNC"] = "false"
+os.environ["SECRET_KEY"] = "test-secret-key"
+os.environ["OPENAI_API_KEY"] = "test-key"
+os.environ.setdefault("ENV", "test")
+
+
+@pytest.fixture
+def db():
+    """A session on the test database, with every table created."""
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
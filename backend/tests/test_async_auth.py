@@ -0,0 +1,88 @@
+"""The DATABASE_ASYNC routes authenticate on the async session, not the sync pool."""
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import async_routes
+from app.auth import create_access_token, principal_cache
+from app.database import DATABASE_URL, async_database_url, get_async_db, pool_metrics
+from app.models import User, UserRole
+
+
+def _build_app(session_factory) -> FastAPI:
+    app = FastAPI()
+    app.include_router(async_routes.router)
+
+    async def override_async_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = override_async_db
+    return app
+
+
+def _make_user(db, is_active: bool = True) -> User:
+    user = User(
+        email=f"async-{uuid.uuid4().hex[:8]}@example.com",
+        name="Async Test",
+        hashed_password="unused",
+        role=UserRole.USER,
+        is_active=is_active,
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+async def _request(method: str, path: str, token: str, **kwargs) -> httpx.Response:
+    engine = create_async_engine(async_database_url(DATABASE_URL))
+    try:
+        app = _build_app(async_sessionmaker(engine, expire_on_commit=False))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def cold_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+def test_legacy_token_is_resolved_without_the_sync_pool(db):
+    user = _make_user(db)
+    token = create_access_token({"sub": user.email})
+    checkouts = pool_metrics.snapshot()["checkouts"]
+
+    response = asyncio.run(_request("GET", "/conversations", token))
+
+    assert response.status_code == 200
+    assert response.json() == []
+    assert pool_metrics.snapshot()["checkouts"] == checkouts
+
+
+def test_profile_write_loads_the_user_row(db):
+    user = _make_user(db, is_active=False)
+    # Claims say active, but the row says otherwise: a write must not trust the claims
+    token = create_access_token({"sub": user.email, "uid": user.id, "role": "USER", "act": True, "ver": 0})
+
+    response = asyncio.run(_request("PUT", "/profile", token, json={"onboarding_data": None}))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+def test_unknown_subject_is_rejected(db):
+    token = create_access_token({"sub": "nobody@example.com"})
+
+    response = asyncio.run(_request("GET", "/conversations", token))
+
+    assert response.status_code == 401
@@ -0,0 +1,37 @@
+"""Stored recommendations are reparsed at most once per parser version."""
+import uuid
+
+from app import main
+from app.models import Recommendation, User
+from app.parsing import PARSER_VERSION
+
+
+def test_unparseable_row_is_only_reparsed_once(db, monkeypatch):
+    user = User(email=f"reparse-{uuid.uuid4().hex[:8]}@example.com", name="Reparse", hashed_password="x")
+    db.add(user)
+    db.commit()
+    row = Recommendation(
+        user_id=user.id,
+        input_data={},
+        raw_response="not a recommendation",
+        output_data=None,
+        parser_version=None,
+    )
+    db.add(row)
+    db.commit()
+
+    calls = []
+    real_reparse = main.reparse_stored
+
+    def reparse(raw, schema_version=None):
+        calls.append(raw)
+        return real_reparse(raw, schema_version)
+
+    monkeypatch.setattr(main, "reparse_stored", reparse)
+
+    main._load_cached_recommendation(db, user.id)
+    main._load_cached_recommendation(db, user.id)
+
+    assert len(calls) == 1
+    db.refresh(row)
+    assert row.parser_version == PARSER_VERSION
@@ -0,0 +1,17 @@
+from app.checklist_catalog import get_catalog
+
+
+def test_country_specific_names_resolve():
+    catalog = get_catalog()
+
+    assert catalog.resolve(["UK Skilled Worker Visa"]) == "uk-skilled-worker"
+    assert catalog.resolve(["Express Entry (Federal Skilled Worker)"]) == "canada-express-entry"
+
+
+def test_ambiguous_names_do_not_resolve():
+    catalog = get_catalog()
+
+    # No country: could be any country's skilled worker route
+    assert catalog.resolve(["Skilled Worker Visa"]) is None
+    # A different Express Entry program from the catalogued FSW checklist
+    assert catalog.resolve(["Canadian Experience Class"]) is None
@@ -0,0 +1,36 @@
+"""PATCH /checklist/progress checks the user row, not just the token's claims."""
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.auth import create_access_token, principal_cache, token_claims_for
+from app.config import get_settings
+from app.main import app
+from app.models import User, UserRole
+
+
+def test_deactivated_user_cannot_patch_progress_with_a_stateless_token(db, monkeypatch):
+    monkeypatch.setattr(get_settings(), "stateless_tokens", True)
+    monkeypatch.setattr(get_settings(), "checklist_progress_coalesce_ms", 0)
+    user = User(
+        email=f"progress-{uuid.uuid4().hex[:8]}@example.com",
+        name="Progress",
+        hashed_password="unused",
+        role=UserRole.USER,
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    headers = {"Authorization": f"Bearer {create_access_token(token_claims_for(user))}"}
+    body = {"visa_type": "Work", "steps": {"step-1": True}}
+
+    with TestClient(app) as client:
+        assert client.patch("/checklist/progress", json=body, headers=headers).status_code == 200
+
+        # Deactivated by another process: this one saw no ORM event
+        db.execute(text("UPDATE users SET is_active = false WHERE id = :id"), {"id": user.id})
+        db.commit()
+        principal_cache.clear()
+
+        assert client.patch("/checklist/progress", json=body, headers=headers).status_code == 400
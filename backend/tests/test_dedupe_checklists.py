@@ -0,0 +1,33 @@
+import uuid
+
+from app.models import ChecklistCache, User
+from dedupe_checklists import dedupe_checklists
+
+
+def make_user(db) -> User:
+    user = User(email=f"dedupe-{uuid.uuid4().hex[:12]}@example.com", name="Dedupe", hashed_password="x")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def test_only_identical_checklists_share_content(db):
+    option_hash = f"option-{uuid.uuid4().hex}"
+    original = [{"id": "step-1", "title": "Book biometrics"}, {"id": "step-2", "title": "Pay the fee"}]
+    # Same positional step ids, different steps
+    regenerated = [{"id": "step-1", "title": "Get a police certificate"}, {"id": "step-2", "title": "Book biometrics"}]
+    rows = [
+        ChecklistCache(user_id=make_user(db).id, visa_type="Work", option_hash=option_hash, checklist_json=checklist)
+        for checklist in (original, original, regenerated)
+    ]
+    db.add_all(rows)
+    db.commit()
+
+    dedupe_checklists()
+
+    db.expire_all()
+    first, same, different = rows
+    assert first.content_id is not None and first.checklist_json is None
+    assert same.content_id == first.content_id
+    assert different.content_id is None
+    assert different.checklist_json == regenerated
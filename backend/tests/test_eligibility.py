@@ -0,0 +1,58 @@
+from app.eligibility import get_program_table, prompt_candidates, score_programs
+from app.schemas import IntakeData
+
+
+def by_code(intake: IntakeData):
+    return {result.code: result for result in get_program_table().score(intake)}
+
+
+def test_age_past_points_limit_lowers_score_without_excluding():
+    young = by_code(IntakeData(age=30))["CA-EE-FSW"]
+    older = by_code(IntakeData(age=47))["CA-EE-FSW"]
+
+    assert older.status != "not_eligible"
+    assert older.score < young.score
+    assert "Age reduces the points awarded by this program" in older.reasons
+
+
+def test_statutory_age_limit_still_excludes():
+    result = by_code(IntakeData(age=50))["AU-SKILLED-189"]
+
+    assert result.status == "not_eligible"
+
+
+def test_criminal_record_flags_review_instead_of_excluding():
+    results = by_code(IntakeData(criminal_records=True))
+
+    assert all(result.status != "not_eligible" for result in results.values())
+    clean = by_code(IntakeData(criminal_records=False))
+    for code, result in results.items():
+        assert "Criminal record needs a case-by-case admissibility review" in result.reasons
+        assert result.score < clean[code].score
+
+
+def countries(destination):
+    return {result.country for result in score_programs(IntakeData(), destination)}
+
+
+def test_destination_aliases_resolve_to_the_programs_country():
+    for alias in ("US", "USA", "U.S.", "United States of America", "the United States"):
+        assert countries(alias) == {"United States"}
+    for alias in ("UK", "GB", "Britain", "United Kingdom"):
+        assert countries(alias) == {"United Kingdom"}
+
+
+def test_short_codes_do_not_match_inside_other_country_names():
+    # "us" is a substring of "australia"
+    assert "Australia" not in countries("US")
+
+
+def test_unknown_destination_matches_nothing():
+    assert countries("Japan") == set()
+
+
+def test_prompt_candidates_only_list_the_destinations():
+    prescreen = prompt_candidates(IntakeData(), 20, ["Canada"])
+
+    assert prescreen["candidates"]
+    assert all(candidate["code"].startswith("CA-") for candidate in prescreen["candidates"])
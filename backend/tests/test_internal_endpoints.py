@@ -0,0 +1,44 @@
+"""The /internal/* metrics endpoints are only served with the internal token."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import Settings, get_settings
+from app.main import app
+
+PATHS = [route.path for route in app.routes if getattr(route, "path", "").startswith("/internal/")]
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.pop(get_settings, None)
+
+
+def _configure(token: str) -> None:
+    app.dependency_overrides[get_settings] = lambda: Settings(internal_api_token=token)
+
+
+def test_every_internal_endpoint_is_guarded():
+    assert "/internal/pool" in PATHS
+    for route in app.routes:
+        if getattr(route, "path", "").startswith("/internal/"):
+            assert any(dep.call.__name__ == "require_internal_token" for dep in route.dependant.dependencies)
+
+
+def test_not_served_without_a_configured_token(client):
+    _configure("")
+    assert client.get("/internal/pool", headers={"X-Internal-Token": ""}).status_code == 404
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Internal-Token": "wrong"}])
+def test_rejects_missing_or_wrong_token(client, headers):
+    _configure("s3cret")
+    assert client.get("/internal/pool", headers=headers).status_code == 403
+
+
+def test_serves_with_the_token(client):
+    _configure("s3cret")
+    response = client.get("/internal/pool", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "checkouts" in response.json()
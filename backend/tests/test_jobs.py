@@ -0,0 +1,60 @@
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import jobs
+from app.models import GenerationJob, User
+
+
+@pytest.fixture
+def user_id(db):
+    # Registers the job handlers
+    import app.main  # noqa: F401
+
+    user = User(email=f"jobs-{uuid.uuid4().hex[:12]}@example.com", name="Jobs", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def test_enqueue_unique_reuses_the_pending_job(db, user_id):
+    first = jobs.enqueue_unique(db, user_id, "checklist_refresh", "Work:abc", {"n": 1})
+    second = jobs.enqueue_unique(db, user_id, "checklist_refresh", "Work:abc", {"n": 2})
+
+    assert second.id == first.id
+    assert db.query(GenerationJob).filter(GenerationJob.user_id == user_id).count() == 1
+
+
+def test_index_rejects_a_second_pending_job(db, user_id):
+    jobs.enqueue(db, user_id, "checklist_refresh", {}, dedupe_key="Work:abc")
+
+    # What a concurrent request that missed the first job would do
+    with pytest.raises(IntegrityError):
+        jobs.enqueue(db, user_id, "checklist_refresh", {}, dedupe_key="Work:abc")
+    db.rollback()
+
+
+def test_lost_race_returns_the_winners_job(db, user_id, monkeypatch):
+    winner = jobs.enqueue(db, user_id, "checklist_refresh", {}, dedupe_key="Work:abc")
+    # The check ran before the winner committed
+    real_find_pending = jobs.find_pending
+    calls = []
+
+    def find_pending(*args):
+        calls.append(args)
+        return None if len(calls) == 1 else real_find_pending(*args)
+
+    monkeypatch.setattr(jobs, "find_pending", find_pending)
+
+    assert jobs.enqueue_unique(db, user_id, "checklist_refresh", "Work:abc", {}).id == winner.id
+
+
+def test_finished_jobs_do_not_block_a_new_one(db, user_id):
+    first = jobs.enqueue_unique(db, user_id, "checklist_refresh", "Work:abc", {})
+    first.status = jobs.JOB_SUCCEEDED
+    db.commit()
+
+    second = jobs.enqueue_unique(db, user_id, "checklist_refresh", "Work:abc", {})
+
+    assert second.id != first.id
@@ -0,0 +1,203 @@
+"""Google ID-token verification against a locally generated keypair (no network)."""
+import asyncio
+import datetime
+import threading
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+from app import oauth
+from app.config import Settings
+from app.oauth import GoogleCertsCache, StaticCertsSource, verify_id_token_with_cache
+
+AUDIENCE = "test-client-id.apps.googleusercontent.com"
+
+
+class Keypair:
+    def __init__(self, key_id: str) -> None:
+        self.key_id = key_id
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(self.private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(self.private_key, hashes.SHA256())
+        )
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+
+    def sign(self, **claims) -> str:
+        pem = self.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        signer = crypt.RSASigner.from_string(pem, key_id=self.key_id)
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": AUDIENCE,
+            "iat": now,
+            "exp": now + 600,
+            "email": "ada@example.com",
+            "name": "Ada",
+            **claims,
+        }
+        return google_jwt.encode(signer, payload).decode()
+
+
+class CountingSource:
+    """Key source that records how often it was called."""
+
+    def __init__(self, certs, max_age=None, delay: float = 0.0) -> None:
+        self.certs = certs
+        self.max_age = max_age
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return dict(self.certs), self.max_age
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def key_a():
+    return Keypair("key-a")
+
+
+@pytest.fixture(scope="module")
+def key_b():
+    return Keypair("key-b")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(oauth.time, "monotonic", fake)
+    return fake
+
+
+def test_verifies_token_signed_by_local_keypair(key_a):
+    cache = GoogleCertsCache(StaticCertsSource({key_a.key_id: key_a.cert_pem}))
+
+    claims = verify_id_token_with_cache(key_a.sign(), AUDIENCE, cache)
+
+    assert claims["email"] == "ada@example.com"
+
+
+def test_rejects_token_for_another_audience(key_a):
+    cache = GoogleCertsCache(StaticCertsSource({key_a.key_id: key_a.cert_pem}))
+
+    with pytest.raises(ValueError):
+        verify_id_token_with_cache(key_a.sign(aud="someone-else"), AUDIENCE, cache)
+
+
+def test_verify_google_token_uses_pluggable_source(monkeypatch, key_a):
+    cache = GoogleCertsCache(StaticCertsSource({key_a.key_id: key_a.cert_pem}))
+    monkeypatch.setattr(oauth, "google_certs", cache)
+    settings = Settings(google_client_id=AUDIENCE)
+
+    info = asyncio.run(oauth.verify_google_token(key_a.sign(), settings))
+    assert info["email"] == "ada@example.com"
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(oauth.verify_google_token(key_a.sign(iss="evil.example.com"), settings))
+    assert excinfo.value.status_code == 401
+
+
+def test_rotated_key_forces_refresh(clock, key_a, key_b):
+    source = CountingSource({key_a.key_id: key_a.cert_pem}, max_age=3600)
+    cache = GoogleCertsCache(source, min_refresh_interval=30)
+    verify_id_token_with_cache(key_a.sign(), AUDIENCE, cache)
+    assert source.calls == 1
+
+    # Google rotates to key-b
+    source.certs = {key_b.key_id: key_b.cert_pem}
+    clock.now += 60
+    claims = verify_id_token_with_cache(key_b.sign(), AUDIENCE, cache)
+
+    assert claims["email"] == "ada@example.com"
+    assert source.calls == 2
+
+
+def test_unknown_key_refresh_is_rate_limited(clock, key_a, key_b):
+    source = CountingSource({key_a.key_id: key_a.cert_pem}, max_age=3600)
+    cache = GoogleCertsCache(source, min_refresh_interval=30)
+    cache.get_certs(key_a.key_id)
+
+    clock.now += 5
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            verify_id_token_with_cache(key_b.sign(), AUDIENCE, cache)
+
+    assert source.calls == 1
+
+
+def test_expired_certs_are_refetched_honoring_max_age(clock, key_a):
+    source = CountingSource({key_a.key_id: key_a.cert_pem}, max_age=120)
+    cache = GoogleCertsCache(source, refresh_margin=10)
+    cache.get_certs(key_a.key_id)
+
+    clock.now += 100
+    cache.get_certs(key_a.key_id)
+    assert source.calls == 1
+
+    clock.now += 30
+    cache.get_certs(key_a.key_id)
+    assert source.calls == 2
+
+
+def test_near_expiry_serves_cached_certs_and_refreshes_in_background(clock, key_a):
+    source = CountingSource({key_a.key_id: key_a.cert_pem}, max_age=120)
+    cache = GoogleCertsCache(source, refresh_margin=30)
+    cache.get_certs(key_a.key_id)
+
+    clock.now += 100
+    certs = cache.get_certs(key_a.key_id)
+
+    assert key_a.key_id in certs
+    deadline = time.time() + 2
+    while source.calls < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert source.calls == 2
+
+
+def test_cold_cache_fetches_once_for_concurrent_callers(key_a):
+    source = CountingSource({key_a.key_id: key_a.cert_pem}, delay=0.1)
+    cache = GoogleCertsCache(source)
+    results = []
+
+    def login() -> None:
+        results.append(cache.get_certs(key_a.key_id))
+
+    threads = [threading.Thread(target=login) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert source.calls == 1
+    assert all(key_a.key_id in certs for certs in results)
@@ -0,0 +1,173 @@
+"""
+LLM-calling endpoints against a local stand-in for the OpenAI API.
+
+The shared client is built by app.llm as in production, with its network
+transport swapped for an httpx.MockTransport that plays the OpenAI side.
+"""
+import asyncio
+import json
+import uuid
+from typing import Callable, List
+
+import httpx
+import pytest
+
+from app import llm
+from app.auth import create_access_token
+from app.config import Settings, get_settings
+from app.main import app
+from app.models import User, UserRole
+
+RECOMMENDATION = {
+    "summary": "You have strong options.",
+    "top_recommendation_index": 0,
+    "recommendations": [
+        {"visa_type": "Skilled Worker", "reasoning": "Matches your job offer.", "likelihood": "high"},
+        {"visa_type": "Graduate", "reasoning": "Follows your degree.", "likelihood": "medium"},
+    ],
+}
+
+
+def completion(content: str) -> httpx.Response:
+    return httpx.Response(200, json={
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stand-in",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    })
+
+
+def streamed_completion(content: str, chunk_size: int = 16) -> httpx.Response:
+    lines = []
+    for start in range(0, len(content), chunk_size):
+        chunk = {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "stand-in",
+            "choices": [{"index": 0, "delta": {"content": content[start:start + chunk_size]}, "finish_reason": None}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return httpx.Response(
+        200,
+        headers={"content-type": "text/event-stream"},
+        content="".join(lines).encode(),
+    )
+
+
+class StandIn:
+    """Replays the queued responses (or exceptions) and records the requests."""
+
+    def __init__(self) -> None:
+        self.requests: List[dict] = []
+        self.responses: List[Callable[[], httpx.Response]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(request.content))
+        respond = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return respond()
+
+
+@pytest.fixture
+def stand_in():
+    fake = StandIn()
+    llm._client = llm.create_openai_client(get_settings(), transport=httpx.MockTransport(fake))
+    yield fake
+    asyncio.run(llm.close_openai_client())
+
+
+@pytest.fixture
+def auth_headers(db):
+    user = User(
+        email=f"llm-{uuid.uuid4().hex[:8]}@example.com",
+        name="LLM Test",
+        hashed_password="unused",
+        role=UserRole.USER,
+    )
+    db.add(user)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+
+def _intake() -> dict:
+    # Unique per test so nothing is served from the shared recommendation cache
+    return {"nationality": f"Testland-{uuid.uuid4().hex[:8]}", "preferred_destinations": "United Kingdom"}
+
+
+async def _post(path: str, headers: dict, body: dict) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        return await client.post(path, json=body, headers=headers)
+
+
+def test_shared_client_is_created_once_and_closed():
+    settings = Settings(openai_api_key="test-key")
+    asyncio.run(llm.close_openai_client())
+
+    first = llm.get_openai_client(settings)
+    assert llm.get_openai_client(settings) is first
+
+    asyncio.run(llm.close_openai_client())
+    assert llm._client is None
+
+
+def test_recommendation_is_generated_through_the_stand_in(stand_in, auth_headers):
+    stand_in.responses = [lambda: completion(json.dumps(RECOMMENDATION))]
+
+    response = asyncio.run(_post("/recommendations", auth_headers, {"use_cached": False, "intake": _intake()}))
+
+    assert response.status_code == 200
+    assert [option["visa_type"] for option in response.json()["options"]] == ["Skilled Worker", "Graduate"]
+    assert len(stand_in.requests) == 1
+    assert stand_in.requests[0]["model"] == get_settings().openai_model
+
+
+def test_transient_server_errors_are_retried(stand_in, auth_headers):
+    stand_in.responses = [
+        lambda: httpx.Response(500, json={"error": {"message": "overloaded"}}),
+        lambda: completion(json.dumps(RECOMMENDATION)),
+    ]
+
+    response = asyncio.run(_post("/recommendations", auth_headers, {"use_cached": False, "intake": _intake()}))
+
+    assert response.status_code == 200
+    assert len(stand_in.requests) == 2
+
+
+def test_timeouts_are_retried_then_reported_as_bad_gateway(stand_in, auth_headers):
+    def timeout() -> httpx.Response:
+        raise httpx.ReadTimeout("stand-in timed out")
+
+    stand_in.responses = [timeout]
+
+    response = asyncio.run(_post("/recommendations", auth_headers, {"use_cached": False, "intake": _intake()}))
+
+    assert response.status_code == 502
+    # The first attempt plus the client's retries
+    assert len(stand_in.requests) == 1 + llm._client.max_retries
+
+
+def test_streamed_recommendation_emits_events_as_options_complete(stand_in, auth_headers):
+    stand_in.responses = [lambda: streamed_completion(json.dumps(RECOMMENDATION))]
+
+    response = asyncio.run(_post("/recommendations/stream", auth_headers, {"use_cached": False, "intake": _intake()}))
+
+    assert response.status_code == 200
+    events = [
+        line[len("event: "):]
+        for line in response.text.splitlines()
+        if line.startswith("event: ")
+    ]
+    assert events == ["summary", "recommendation", "recommendation", "done"]
+    assert stand_in.requests[0]["stream"] is True
+
+
+def test_streaming_failure_is_reported_as_an_error_event(stand_in, auth_headers):
+    stand_in.responses = [lambda: httpx.Response(400, json={"error": {"message": "bad request"}})]
+
+    response = asyncio.run(_post("/recommendations/stream", auth_headers, {"use_cached": False, "intake": _intake()}))
+
+    assert "event: error" in response.text
@@ -0,0 +1,43 @@
+"""The bcrypt pool's admission limit tracks work actually running on it."""
+import asyncio
+import threading
+
+import pytest
+
+from app.passwords import PasswordHasherBusy, PasswordHasherPool
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_work_finishes():
+    pool = PasswordHasherPool(max_workers=1, max_queue=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_hash() -> str:
+        started.set()
+        release.wait(5)
+        return "hash"
+
+    async def scenario() -> None:
+        caller = asyncio.create_task(pool.run(slow_hash))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+        # The worker is still hashing for the cancelled request
+        assert pool.stats()["in_flight"] == 1
+        with pytest.raises(PasswordHasherBusy):
+            await pool.run(lambda: "other")
+
+        release.set()
+        for _ in range(100):
+            if pool.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await pool.run(lambda: "other") == "other"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
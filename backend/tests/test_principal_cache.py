@@ -0,0 +1,63 @@
+"""Cached principals are evicted when a user write commits, not when it flushes."""
+import uuid
+
+from app.auth import principal_cache, _snapshot_user
+from app.models import User, UserRole
+
+
+def _make_user(db) -> User:
+    user = User(
+        email=f"cache-{uuid.uuid4().hex[:8]}@example.com",
+        name="Cache Test",
+        hashed_password="unused",
+        role=UserRole.USER,
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    principal_cache.put(user.email, _snapshot_user(user))
+    return user
+
+
+def test_flush_does_not_evict_until_commit(db):
+    user = _make_user(db)
+
+    user.is_active = False
+    db.flush()
+    assert principal_cache.get(user.email) is not None
+
+    db.commit()
+    assert principal_cache.get(user.email) is None
+
+
+def test_rolled_back_write_does_not_evict(db):
+    user = _make_user(db)
+
+    user.name = "Renamed"
+    db.flush()
+    db.rollback()
+
+    assert principal_cache.get(user.email) is not None
+
+
+def test_email_change_evicts_previous_email(db):
+    user = _make_user(db)
+    previous = user.email
+
+    user.email = f"renamed-{previous}"
+    db.commit()
+
+    assert principal_cache.get(previous) is None
+
+
+def test_row_loaded_before_an_invalidation_is_not_cached(db):
+    user = _make_user(db)
+    principal_cache.invalidate(user.email)
+
+    generation = principal_cache.generation
+    stale_row = _snapshot_user(user)
+    user.is_active = False
+    db.commit()
+    principal_cache.put(user.email, stale_row, generation)
+
+    assert principal_cache.get(user.email) is None
@@ -0,0 +1,40 @@
+"""Writes to the shared recommendation cache never fail the request that made them."""
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+
+from app import main, recommendation_cache
+from app.database import SessionLocal
+from app.models import RecommendationCache
+
+
+def _key() -> str:
+    return f"test-{uuid.uuid4().hex}"
+
+
+def test_store_refreshes_an_entry_written_concurrently(db):
+    key = _key()
+    # Another worker stored the same key after this one's lookup missed
+    other = SessionLocal()
+    try:
+        recommendation_cache.store(other, key, "gpt-test", 1, '{"first": true}', 60)
+    finally:
+        other.close()
+
+    recommendation_cache.store(db, key, "gpt-test", 1, '{"second": true}', 60)
+
+    rows = db.query(RecommendationCache).filter(RecommendationCache.cache_key == key).all()
+    assert len(rows) == 1
+    assert rows[0].raw_response == '{"second": true}'
+    assert rows[0].hit_count == 0
+
+
+def test_failed_cache_write_is_logged_not_raised(db, monkeypatch, caplog):
+    def conflict(*args, **kwargs):
+        raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+    monkeypatch.setattr(recommendation_cache, "store", conflict)
+
+    main._store_shared_recommendation(db, 1, _key(), "gpt-test", "{}", 60)
+
+    assert "Failed to store shared recommendation" in caplog.text
@@ -0,0 +1,65 @@
+"""/recommendations/checklist stores nothing per user, so it never returns steps left to expand."""
+import asyncio
+import uuid
+
+from app import checklist_store, main
+from app.config import Settings
+from app.models import User
+from app.schemas import ChecklistRequest, RecommendationOption
+
+
+def _option() -> RecommendationOption:
+    return RecommendationOption(visa_type=f"Long-tail Work Visa {uuid.uuid4().hex[:8]}", reasoning="Test")
+
+
+def _user(db) -> User:
+    user = User(email=f"checklist-{uuid.uuid4().hex[:12]}@example.com", name="Checklist", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _settings() -> Settings:
+    return Settings(
+        openai_api_key="test-key",
+        checklist_catalog_enabled=False,
+        checklist_two_phase_enabled=True,
+        checklist_background_detail_enabled=False,
+    )
+
+
+def test_generates_a_full_checklist_in_two_phase_mode(db, monkeypatch):
+    outlines = []
+
+    async def generate(visa_option, settings, current_user, outline=False):
+        outlines.append(outline)
+        return [{"id": "step-1", "title": "Apply", "description": "Submit the form"}]
+
+    monkeypatch.setattr(main, "generate_checklist_via_openai", generate)
+    option = _option()
+
+    response = asyncio.run(main.generate_checklist(ChecklistRequest(visa_option=option), _settings(), _user(db), db))
+
+    assert outlines == [False]
+    assert checklist_store.pending_step_ids(response.checklist) == []
+
+
+def test_details_a_shared_outline_before_returning_it(db, monkeypatch):
+    option = _option()
+    outline = [
+        {"id": "step-1", "title": "Apply", "detail_pending": True},
+        {"id": "step-2", "title": "Travel", "detail_pending": True},
+    ]
+    checklist_store.store(db, main.compute_option_hash(option), outline, "outline")
+
+    async def generate_step(visa_option, checklist, step, settings, user_id):
+        return {"description": f"How to {step['title'].lower()}"}
+
+    monkeypatch.setattr(main, "generate_checklist_step_via_openai", generate_step)
+
+    response = asyncio.run(main.generate_checklist(ChecklistRequest(visa_option=option), _settings(), _user(db), db))
+
+    assert checklist_store.pending_step_ids(response.checklist) == []
+    assert [step["title"] for step in response.checklist] == ["Apply", "Travel"]
+    assert response.checklist[1]["description"] == "How to travel"
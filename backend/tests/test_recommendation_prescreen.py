@@ -0,0 +1,46 @@
+"""Pre-screened candidates in recommendation prompts stay within the intake's destinations."""
+import asyncio
+import re
+
+from app import main
+from app.config import Settings
+from app.schemas import IntakeData
+
+
+def _settings() -> Settings:
+    return Settings(openai_api_key="test-key", eligibility_prefilter_enabled=True, eligibility_max_candidates=20)
+
+
+def candidate_codes(prompt: str):
+    return set(re.findall(r'"code":"([A-Z]{2})-', prompt.split("Pre-screened programs", 1)[-1]))
+
+
+def test_single_prompt_lists_only_preferred_destinations():
+    intake = IntakeData(preferred_destinations="Canada")
+
+    prompt = main.build_recommendation_prompt(intake, main._prescreen(_settings(), intake))
+
+    assert candidate_codes(prompt) == {"CA"}
+
+
+def test_no_destinations_means_no_candidate_block():
+    assert main._prescreen(_settings(), IntakeData()) is None
+
+
+def test_fanout_prompts_list_only_their_own_country(monkeypatch):
+    prompts = {}
+
+    async def complete(settings, prompt, user_id):
+        destination = re.search(r"Only recommend pathways for \"([^\"]+)\"", prompt).group(1)
+        prompts[destination] = prompt
+        return '{"recommendations": []}'
+
+    monkeypatch.setattr(main, "_complete_recommendation", complete)
+    destinations = ["US", "UK", "USA"]
+    intake = IntakeData(preferred_destinations=", ".join(destinations))
+
+    asyncio.run(main._complete_fanout(_settings(), intake, destinations, user_id=1))
+
+    assert candidate_codes(prompts["US"]) == {"US"}
+    assert candidate_codes(prompts["USA"]) == {"US"}
+    assert candidate_codes(prompts["UK"]) == {"UK"}
@@ -0,0 +1,59 @@
+"""Cross-worker single-flight: bounded lock connections and intake-specific rechecks."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from app import main, singleflight
+from app.models import Recommendation, User, UserRole
+from app.prompts import RECOMMENDATION_PROMPT_VERSION
+from app.recommendation_cache import intake_cache_key
+from app.schemas import IntakeData
+from app.singleflight import SingleFlight
+
+MODEL = "gpt-test"
+
+
+def test_lock_connections_come_from_a_bounded_pool(monkeypatch):
+    monkeypatch.setattr(singleflight, "LOCK_POOL_TIMEOUT_SECONDS", 0.05)
+    flight = SingleFlight(distributed=True, wait_seconds=1, poll_seconds=0.01, lock_pool_size=1)
+    lock_engine = flight._get_lock_engine()
+    assert lock_engine.pool.size() == 1
+
+    held = lock_engine.connect()
+    try:
+        conn, waited_since = asyncio.run(flight._acquire("busy-key", 42))
+    finally:
+        held.close()
+        lock_engine.dispose()
+
+    # No free lock connection: the leader goes ahead without the lock
+    assert conn is None and waited_since is None
+    assert flight.stats()["lock_pool_exhausted"] == 1
+
+
+def _store(db, user_id: int, intake: IntakeData, summary: str) -> None:
+    db.add(Recommendation(
+        user_id=user_id,
+        input_data=intake.model_dump(exclude_none=True),
+        output_data={"summary": summary, "options": [], "notes": None},
+        raw_response="{}",
+    ))
+    db.commit()
+
+
+def test_recheck_only_returns_the_same_intake(db):
+    user = User(email=f"sf-{uuid.uuid4().hex[:8]}@example.com", name="SF", hashed_password="x", role=UserRole.USER)
+    db.add(user)
+    db.commit()
+    since = datetime.utcnow() - timedelta(minutes=1)
+    wanted = IntakeData(nationality="Kenyan", preferred_destinations="Canada")
+    other = IntakeData(nationality="Kenyan", preferred_destinations="Germany")
+    wanted_key = intake_cache_key(wanted, RECOMMENDATION_PROMPT_VERSION, MODEL)
+
+    _store(db, user.id, other, "for another intake")
+    assert main._recommendation_stored_since(db, user.id, since, wanted_key, MODEL) is None
+
+    _store(db, user.id, wanted, "for this intake")
+    _store(db, user.id, other, "newer, for another intake")
+    result = main._recommendation_stored_since(db, user.id, since, wanted_key, MODEL)
+    assert result is not None and result.summary == "for this intake"
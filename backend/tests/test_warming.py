@@ -0,0 +1,48 @@
+"""Checklist warming only spends a user's budget on generations that start."""
+import asyncio
+
+from app.config import Settings
+from app.warming import ChecklistWarmer, WarmItem
+
+
+def _settings(per_hour: int) -> Settings:
+    return Settings(
+        checklist_warm_enabled=True,
+        checklist_warm_max_options=3,
+        checklist_warm_concurrency=2,
+        checklist_warm_per_user_per_hour=per_hour,
+    )
+
+
+def _item(needed: bool, runs: list) -> WarmItem:
+    async def check() -> bool:
+        return needed
+
+    async def run() -> None:
+        runs.append(needed)
+
+    return WarmItem(needed=check, run=run)
+
+
+async def _schedule(warmer: ChecklistWarmer, settings: Settings, items) -> None:
+    warmer.schedule(settings, 1, items)
+    await asyncio.gather(*list(warmer._tasks))
+
+
+def test_already_warm_options_do_not_use_the_budget():
+    warmer = ChecklistWarmer()
+    runs = []
+
+    async def regenerate_twice() -> None:
+        # The first regeneration warms everything; the second finds it warm
+        await _schedule(warmer, _settings(per_hour=2), [_item(True, runs), _item(True, runs)])
+        await _schedule(warmer, _settings(per_hour=2), [_item(False, runs), _item(False, runs)])
+        await _schedule(warmer, _settings(per_hour=2), [_item(True, runs)])
+
+    asyncio.run(regenerate_twice())
+
+    stats = warmer.stats()
+    assert stats["already_warm"] == 2
+    assert stats["scheduled"] == 2
+    assert stats["over_budget"] == 1
+    assert runs == [True, True]